@@ -0,0 +1,62 @@
+"""
+Runs the benchmark suite with the default arguments of every benchmark.
+
+Run from the repository root, against a throwaway redis-server:
+`python -m benchmarks --spawn-redis --output results.json`
+Then compare two runs with `python -m benchmarks.compare base.json results.json`.
+"""
+
+import argparse
+import json
+import sys
+
+from benchmarks import dispatch, enqueue, latency, memory, throughput
+from benchmarks.common import environment, optional_redis, print_table, str_list
+
+BENCHMARKS = {
+    "enqueue": enqueue,
+    "dispatch": dispatch,
+    "throughput": throughput,
+    "latency": latency,
+    "memory": memory,
+}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--only",
+        type=str_list,
+        default=list(BENCHMARKS),
+        help=f"Comma separated, among: {', '.join(BENCHMARKS)}.",
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--spawn-redis", action="store_true")
+    args = parser.parse_args()
+    unknown = set(args.only) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    document = {"environment": environment(), "benchmarks": {}}
+    with optional_redis(args.spawn_redis):
+        for name in args.only:
+            module = BENCHMARKS[name]
+            benchmark_parser = argparse.ArgumentParser()
+            module.add_benchmark_arguments(benchmark_parser)
+            benchmark_args = benchmark_parser.parse_args([])
+            print(f"\n# {name}")
+            rows = module.run(benchmark_args)
+            print_table(rows)
+            document["benchmarks"][name] = {
+                "arguments": vars(benchmark_args),
+                "results": rows,
+            }
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(document, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Helpers shared by the benchmarks.
+
+Every benchmark prints a table and, with `--output`, writes its results as JSON
+along with the environment they were measured in, so runs on different commits
+can be compared. With `--spawn-redis` a throwaway `redis-server` is started
+for the run instead of using the one in `RAPIDQ_BROKER_URL`.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+from urllib.parse import urlparse
+
+from rapidq.broker import Broker, get_broker, reset_broker
+from rapidq.broker.memory_broker import MemoryBroker
+from rapidq.broker.redis_broker import RedisBroker
+from rapidq.broker.redis_streams_broker import RedisStreamsBroker
+from rapidq.broker.sqlite_broker import SqliteBroker
+from rapidq.message import Message
+
+Row = dict[str, Any]
+
+# brokers the benchmarks can compare, see `make_broker`.
+BROKERS: tuple[str, ...] = ("redis", "streams", "memory", "sqlite")
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the arguments every benchmark takes."""
+    parser.add_argument(
+        "--output", help="Write the results as JSON to this file, - for stdout."
+    )
+    parser.add_argument(
+        "--spawn-redis",
+        action="store_true",
+        help="Run against a throwaway redis-server started for the benchmark.",
+    )
+
+
+def int_list(value: str) -> list[int]:
+    """Parse a comma separated list of numbers, eg: `1,2,4`."""
+    try:
+        return [int(item) for item in value.split(",")]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid list of numbers: {value!r}")
+
+
+def str_list(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",")]
+
+
+def make_broker(name: str) -> Broker:
+    """
+    Returns a new broker of the given kind, `streams` uses the same Redis as `redis`,
+    `memory` keeps the queues in-process, `sqlite` in a database of the temp dir.
+    """
+    if name == "redis":
+        return RedisBroker()
+    if name == "streams":
+        url = urlparse(os.environ.get("RAPIDQ_BROKER_URL", RedisBroker.DEFAULT_URL))
+        return RedisStreamsBroker(
+            {"url": url._replace(scheme=f"{url.scheme}+streams").geturl()}
+        )
+    if name == "memory":
+        return MemoryBroker({"url": MemoryBroker.DEFAULT_URL})
+    if name == "sqlite":
+        path = os.path.join(tempfile.gettempdir(), "rapidq-benchmark.db")
+        return SqliteBroker({"url": f"sqlite:///{path}"})
+    raise RuntimeError(f"broker must be in {list(BROKERS)}")
+
+
+def percentile(values: list[float], percent: float) -> float:
+    index = min(len(values) - 1, int(len(values) * percent / 100))
+    return sorted(values)[index]
+
+
+def make_payload(size: int) -> str:
+    """Returns a task argument of `size` bytes."""
+    return "x" * size
+
+
+def make_message(task_name: str, payload: str) -> Message:
+    """Builds a message the way `BackGroundTask.enqueue` does."""
+    return Message(
+        task_name=task_name,
+        queue_name="default",
+        args=(payload,),
+        kwargs={},
+        enqueued_at=time.time(),
+    )
+
+
+def environment() -> dict[str, Any]:
+    """Describes where the results were measured."""
+    commit = None
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "time": time.time(),
+        "serializer": os.environ.get("RAPIDQ_BROKER_SERIALIZER"),
+        "layout": os.environ.get("RAPIDQ_BROKER_LAYOUT"),
+    }
+
+
+def print_table(rows: list[Row]) -> None:
+    if not rows:
+        return
+    columns = list(rows[0])
+    cells = [[format_cell(row.get(column)) for column in columns] for row in rows]
+    widths = [
+        max(len(column), *(len(line[index]) for line in cells))
+        for index, column in enumerate(columns)
+    ]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+
+
+def format_cell(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def write_results(
+    path: str | None, benchmark: str, args: argparse.Namespace, rows: list[Row]
+) -> None:
+    """Writes the results of a benchmark as JSON, if asked to."""
+    if not path:
+        return
+    document = {
+        "benchmark": benchmark,
+        "environment": environment(),
+        "arguments": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "spawn_redis")
+        },
+        "results": rows,
+    }
+    if path == "-":
+        json.dump(document, sys.stdout, indent=2)
+        print()
+        return
+    with open(path, "w") as output:
+        json.dump(document, output, indent=2)
+
+
+@contextmanager
+def redis_server() -> Iterator[str]:
+    """
+    Runs a redis-server without persistence on a free port, and points
+    `RAPIDQ_BROKER_URL` at it, for this process and the ones it starts.
+    """
+    executable = shutil.which("redis-server")
+    if executable is None:
+        raise RuntimeError("redis-server not found, needed by --spawn-redis")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    with tempfile.TemporaryDirectory() as directory:
+        server = subprocess.Popen(
+            [
+                executable,
+                "--port",
+                str(port),
+                "--bind",
+                "127.0.0.1",
+                "--save",
+                "",
+                "--appendonly",
+                "no",
+                "--dir",
+                directory,
+            ],
+            stdout=subprocess.DEVNULL,
+        )
+        url = f"redis://127.0.0.1:{port}/0"
+        previous = os.environ.get("RAPIDQ_BROKER_URL")
+        os.environ["RAPIDQ_BROKER_URL"] = url
+        reset_broker()
+        try:
+            deadline = time.time() + 10
+            while not get_broker().is_alive():
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError("redis-server did not start")
+                time.sleep(0.05)
+            yield url
+        finally:
+            server.terminate()
+            server.wait()
+            if previous is None:
+                os.environ.pop("RAPIDQ_BROKER_URL", None)
+            else:
+                os.environ["RAPIDQ_BROKER_URL"] = previous
+            reset_broker()
+
+
+@contextmanager
+def optional_redis(spawn: bool) -> Iterator[None]:
+    if not spawn:
+        yield
+        return
+    with redis_server():
+        yield
+
+
+@contextmanager
+def rapidq_running(*arguments: str) -> Iterator[subprocess.Popen]:
+    """
+    Runs `rapidq benchmarks.tasks` with the given arguments, once its workers
+    are ready to take tasks.
+    """
+    # imported here, the tasks module creates an application.
+    from benchmarks.tasks import wait_ready
+
+    process = subprocess.Popen(
+        [sys.executable, "-m", "rapidq", "benchmarks.tasks", *arguments],
+        stdout=subprocess.DEVNULL,
+        env=os.environ,
+    )
+    try:
+        wait_ready(process)
+        yield process
+    finally:
+        # SIGINT lets the master stop its workers before exiting.
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
@@ -0,0 +1,78 @@
+"""
+Compares the results of two benchmark runs.
+
+Takes two JSON files written with `--output`, by the suite or by a single
+benchmark, and prints the change of every measurement found in both.
+Exits with 1 if any of them got worse by more than `--threshold` percent.
+`python -m benchmarks.compare base.json results.json --threshold 10`
+"""
+
+import argparse
+import json
+import sys
+from typing import Any
+
+# measurements, by suffix. Higher is better only for rates.
+HIGHER_IS_BETTER = ("_per_second",)
+LOWER_IS_BETTER = ("_per_message", "_ms", "_mib")
+
+
+def load(path: str) -> dict[str, list[dict[str, Any]]]:
+    """Returns the result rows of a file, by benchmark."""
+    with open(path) as results:
+        document = json.load(results)
+    if "benchmarks" in document:
+        return {
+            name: benchmark["results"]
+            for name, benchmark in document["benchmarks"].items()
+        }
+    return {document["benchmark"]: document["results"]}
+
+
+def is_measurement(column: str) -> bool:
+    return column.endswith(HIGHER_IS_BETTER + LOWER_IS_BETTER)
+
+
+def row_key(row: dict[str, Any]) -> tuple:
+    """What a row was measured with, everything but its measurements."""
+    return tuple(
+        (column, value)
+        for column, value in row.items()
+        if not is_measurement(column) and column != "done"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    base, head = load(args.base), load(args.head)
+    regressions = 0
+    for name, rows in head.items():
+        base_rows = {row_key(row): row for row in base.get(name, [])}
+        for row in rows:
+            base_row = base_rows.get(row_key(row))
+            if base_row is None:
+                continue
+            setup = " ".join(f"{column}={value}" for column, value in row_key(row))
+            for column, value in row.items():
+                if not is_measurement(column) or not base_row.get(column):
+                    continue
+                change = (value - base_row[column]) / base_row[column] * 100
+                worse = -change if column.endswith(HIGHER_IS_BETTER) else change
+                flag = ""
+                if worse > args.threshold:
+                    flag = "  REGRESSION"
+                    regressions += 1
+                print(
+                    f"{name} {setup} {column}: {base_row[column]:.2f} -> {value:.2f}"
+                    f" ({change:+.1f}%){flag}"
+                )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""
+Dispatch overhead benchmark.
+
+Measures the time the master spends per message in relay mode: popping the
+messages from the broker, working out the worker credits and putting the
+messages on the worker queues. The master runs in this process without
+starting the worker processes, a thread drains the queue of each worker
+and hands the credit back the way a worker does.
+With `--broker memory` this is the cost of RapidQ alone.
+Run from the repository root:
+`python -m benchmarks.dispatch --messages 20000 --workers 1,4,16`
+"""
+
+import argparse
+import queue
+import sys
+import threading
+import time
+from multiprocessing import Event, Queue, Value
+
+from benchmarks.common import (
+    BROKERS,
+    Row,
+    add_arguments,
+    int_list,
+    make_broker,
+    make_message,
+    make_payload,
+    optional_redis,
+    print_table,
+    str_list,
+    write_results,
+)
+from rapidq import RapidQ
+from rapidq.broker import Broker
+from rapidq.constants import DEFAULT_QUEUE_NAME, WorkerState
+from rapidq.log import LogConfig
+from rapidq.worker.process_worker import Worker
+
+
+def create_master(broker: Broker, workers: int, prefetch: int) -> RapidQ:
+    """A master with workers whose processes are never started."""
+    master = RapidQ(workers=workers, prefetch={"*": prefetch})
+    master.broker = broker
+    master.process_counter = Value("i", 0)
+    master.idle_event = Event()
+    master.workers = {}
+    master.log_queue = Queue()
+    master.log_config = LogConfig(levels={"*": "WARNING"})
+    master.create_workers()
+    for worker in master.workers.values():
+        worker.state.value = WorkerState.IDLE
+    master.boot_complete = True
+    return master
+
+
+def drain(worker: Worker, stop: threading.Event) -> None:
+    """Takes the messages off the queue of a worker, as if it ran them."""
+    while not stop.is_set():
+        try:
+            worker.task_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        worker.release_credit()
+
+
+def measure(
+    broker: Broker, workers: int, prefetch: int, messages: int, payload: str
+) -> float:
+    """Returns the microseconds spent dispatching each message."""
+    broker.flush()
+    broker.enqueue_messages(
+        make_message("benchmark-count", payload) for _ in range(messages)
+    )
+    master = create_master(broker, workers, prefetch)
+    stop = threading.Event()
+    drainers = [
+        threading.Thread(target=drain, args=(worker, stop), daemon=True)
+        for worker in master.workers.values()
+    ]
+    for drainer in drainers:
+        drainer.start()
+
+    dispatched = 0
+    elapsed = 0.0
+    try:
+        while dispatched < messages:
+            master.idle_event.clear()
+            credits = master.worker_credits(DEFAULT_QUEUE_NAME)
+            if not credits:
+                # the drainers are behind, which is not the master's time.
+                master.idle_event.wait(0.1)
+                continue
+            started = time.perf_counter()
+            popped = broker.pop_messages(
+                count=sum(credits.values()), queue_name=DEFAULT_QUEUE_NAME
+            )
+            unassigned = master.assign_messages(popped, credits)
+            elapsed += time.perf_counter() - started
+            if not popped:
+                break
+            master.requeue(unassigned)
+            dispatched += len(popped) - len(unassigned)
+    finally:
+        stop.set()
+        for drainer in drainers:
+            drainer.join()
+        for worker in master.workers.values():
+            worker.task_queue.cancel_join_thread()
+        broker.flush()
+    return elapsed / max(dispatched, 1) * 1e6
+
+
+def run(args: argparse.Namespace) -> list[Row]:
+    rows = []
+    for broker_name in args.broker:
+        broker = make_broker(broker_name)
+        for size in args.payload_sizes:
+            payload = make_payload(size)
+            for workers in args.workers:
+                rows.append(
+                    {
+                        "broker": broker_name,
+                        "payload_bytes": size,
+                        "workers": workers,
+                        "prefetch": args.prefetch,
+                        "messages": args.messages,
+                        "us_per_message": measure(
+                            broker, workers, args.prefetch, args.messages, payload
+                        ),
+                    }
+                )
+    return rows
+
+
+def add_benchmark_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--workers", type=int_list, default=[1, 4, 16])
+    parser.add_argument("--prefetch", type=int, default=8)
+    parser.add_argument("--payload-sizes", type=int_list, default=[64, 4096, 65536])
+    parser.add_argument(
+        "--broker",
+        type=str_list,
+        default=["redis", "streams", "memory", "sqlite"],
+        help=f"Comma separated, among: {', '.join(BROKERS)}.",
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_benchmark_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    with optional_redis(args.spawn_redis):
+        rows = run(args)
+    print_table(rows)
+    write_results(args.output, "dispatch", args, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
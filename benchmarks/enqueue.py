@@ -0,0 +1,95 @@
+"""
+Enqueue throughput benchmark.
+
+Measures how many messages per second a producer enqueues, one at a time with
+`enqueue_message` and in batches with `enqueue_messages`, for each payload size.
+`--broker memory` keeps the queues in-process, to tell the cost of the broker
+round trips from the cost of building and serializing the messages.
+Run from the repository root:
+`python -m benchmarks.enqueue --messages 20000 --payload-sizes 64,4096`
+"""
+
+import argparse
+import sys
+import time
+
+from benchmarks.common import (
+    BROKERS,
+    Row,
+    add_arguments,
+    int_list,
+    make_broker,
+    make_message,
+    make_payload,
+    optional_redis,
+    print_table,
+    str_list,
+    write_results,
+)
+from rapidq.broker import Broker
+
+
+def measure(broker: Broker, messages: int, payload: str, batched: bool) -> float:
+    """Returns the messages enqueued per second."""
+    broker.flush()
+    started = time.perf_counter()
+    if batched:
+        broker.enqueue_messages(
+            make_message("benchmark-count", payload) for _ in range(messages)
+        )
+    else:
+        for _ in range(messages):
+            broker.enqueue_message(make_message("benchmark-count", payload))
+    elapsed = time.perf_counter() - started
+    broker.flush()
+    return messages / elapsed
+
+
+def run(args: argparse.Namespace) -> list[Row]:
+    rows = []
+    for broker_name in args.broker:
+        broker = make_broker(broker_name)
+        for size in args.payload_sizes:
+            payload = make_payload(size)
+            for batched in (False, True):
+                # enqueueing one at a time is much slower, keep it short.
+                messages = args.messages if batched else max(1, args.messages // 5)
+                rows.append(
+                    {
+                        "broker": broker_name,
+                        "payload_bytes": size,
+                        "mode": "batch" if batched else "single",
+                        "messages": messages,
+                        "messages_per_second": measure(
+                            broker, messages, payload, batched
+                        ),
+                    }
+                )
+    return rows
+
+
+def add_benchmark_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--payload-sizes", type=int_list, default=[64, 4096, 65536])
+    parser.add_argument(
+        "--broker",
+        type=str_list,
+        default=["redis", "streams", "memory", "sqlite"],
+        help=f"Comma separated, among: {', '.join(BROKERS)}.",
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_benchmark_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    with optional_redis(args.spawn_redis):
+        rows = run(args)
+    print_table(rows)
+    write_results(args.output, "enqueue", args, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+Idle-to-busy latency benchmark.
+
+Starts RapidQ with a few workers, then enqueues tasks one at a time with a pause
+in between, so every task arrives at an idle master and idle workers.
+Each task reports how long it took from `enqueue` to the start of its execution.
+
+Needs Redis, configured with `RAPIDQ_BROKER_URL` as usual.
+Run from the repository root:
+`python -m benchmarks.latency --tasks 200 --workers 2`
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+from benchmarks.common import (
+    Row,
+    add_arguments,
+    int_list,
+    make_payload,
+    optional_redis,
+    percentile,
+    print_table,
+    rapidq_running,
+    write_results,
+)
+
+
+def measure(
+    workers: int, tasks: int, payload: str, consume_mode: str, gap: float
+) -> list[float]:
+    """Returns the latency of every task that finished, in milliseconds."""
+    from benchmarks.tasks import LATENCY_KEY, record_latency, redis_client
+
+    client = redis_client()
+    client.delete(LATENCY_KEY)
+    with rapidq_running("-w", str(workers), "--consume-mode", consume_mode):
+        for _ in range(tasks):
+            # perf_counter is system wide on Linux/macOS/Windows, so it can be
+            # compared across the processes of the same host.
+            record_latency.enqueue(time.perf_counter(), payload)
+            time.sleep(gap)
+
+        deadline = time.time() + 10
+        while client.llen(LATENCY_KEY) < tasks and time.time() < deadline:
+            time.sleep(0.1)
+    latencies = [float(value) * 1000 for value in client.lrange(LATENCY_KEY, 0, -1)]
+    client.delete(LATENCY_KEY)
+    return latencies
+
+
+def run(args: argparse.Namespace) -> list[Row]:
+    rows = []
+    for size in args.payload_sizes:
+        payload = make_payload(size)
+        for workers in args.workers:
+            latencies = measure(
+                workers, args.tasks, payload, args.consume_mode, args.gap
+            )
+            if not latencies:
+                raise RuntimeError(
+                    "No task finished, is RapidQ able to reach the broker?"
+                )
+            rows.append(
+                {
+                    "payload_bytes": size,
+                    "workers": workers,
+                    "consume_mode": args.consume_mode,
+                    "tasks": args.tasks,
+                    "done": len(latencies),
+                    "mean_ms": statistics.mean(latencies),
+                    "p50_ms": percentile(latencies, 50),
+                    "p90_ms": percentile(latencies, 90),
+                    "p99_ms": percentile(latencies, 99),
+                    "max_ms": max(latencies),
+                }
+            )
+    return rows
+
+
+def add_benchmark_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--tasks", type=int, default=200)
+    parser.add_argument("--workers", type=int_list, default=[2])
+    parser.add_argument("--payload-sizes", type=int_list, default=[64])
+    parser.add_argument("--consume-mode", default="relay")
+    parser.add_argument(
+        "--gap", type=float, default=0.05, help="Seconds to wait between tasks."
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_benchmark_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    with optional_redis(args.spawn_redis):
+        rows = run(args)
+    print_table(rows)
+    write_results(args.output, "latency", args, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
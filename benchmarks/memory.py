@@ -0,0 +1,119 @@
+"""
+Memory per worker benchmark.
+
+Starts RapidQ with each number of workers, runs a batch of tasks with each
+payload size, then reads the memory of every worker process: its resident
+set (RSS) and its proportional share (PSS), which splits the pages shared
+with other processes between them, so it shows what `--preload` saves.
+Needs Redis and Linux, run from the repository root:
+`python -m benchmarks.memory --workers 1,4,16 --preload`
+"""
+
+import argparse
+import os
+import sys
+
+from benchmarks.common import (
+    Row,
+    add_arguments,
+    int_list,
+    make_payload,
+    optional_redis,
+    print_table,
+    rapidq_running,
+    write_results,
+)
+
+
+def worker_pids(master_pid: int) -> list[int]:
+    with open(f"/proc/{master_pid}/task/{master_pid}/children") as children:
+        return [int(pid) for pid in children.read().split()]
+
+
+def memory_of(pid: int) -> tuple[int, int]:
+    """Returns the RSS and PSS of a process, in bytes."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0]) * 1024
+    return values["Rss"], values["Pss"]
+
+
+def measure(
+    workers: int, tasks: int, payload: str, preload: bool
+) -> tuple[float, float]:
+    """Returns the mean RSS and PSS of the workers, in MiB."""
+    from benchmarks.tasks import DONE_KEY, count, redis_client, wait_count
+
+    client = redis_client()
+    arguments = ["-w", str(workers)]
+    if preload:
+        arguments.append("--preload")
+    with rapidq_running(*arguments) as process:
+        client.delete(DONE_KEY)
+        count.enqueue_many((payload,) for _ in range(tasks))
+        wait_count(tasks)
+        # not the resource tracker, nor any other helper process.
+        pids = [
+            pid
+            for pid in worker_pids(process.pid)
+            if "resource_tracker" not in read_cmdline(pid)
+        ]
+        sizes = [memory_of(pid) for pid in pids]
+    rss = sum(size[0] for size in sizes) / len(sizes) / 1024 / 1024
+    pss = sum(size[1] for size in sizes) / len(sizes) / 1024 / 1024
+    return rss, pss
+
+
+def read_cmdline(pid: int) -> str:
+    try:
+        with open(f"/proc/{pid}/cmdline") as cmdline:
+            return cmdline.read()
+    except OSError:
+        return ""
+
+
+def run(args: argparse.Namespace) -> list[Row]:
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        raise RuntimeError("the memory benchmark reads /proc, it only runs on Linux")
+    rows = []
+    for size in args.payload_sizes:
+        payload = make_payload(size)
+        for workers in args.workers:
+            rss, pss = measure(workers, args.tasks, payload, args.preload)
+            rows.append(
+                {
+                    "payload_bytes": size,
+                    "workers": workers,
+                    "preload": args.preload,
+                    "tasks": args.tasks,
+                    "rss_mib": rss,
+                    "pss_mib": pss,
+                }
+            )
+    return rows
+
+
+def add_benchmark_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--tasks", type=int, default=1000)
+    parser.add_argument("--workers", type=int_list, default=[1, 4, 16])
+    parser.add_argument("--payload-sizes", type=int_list, default=[64, 65536])
+    parser.add_argument("--preload", action="store_true")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_benchmark_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    with optional_redis(args.spawn_redis):
+        rows = run(args)
+    print_table(rows)
+    write_results(args.output, "memory", args, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
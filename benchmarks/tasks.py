@@ -0,0 +1,69 @@
+"""
+The application run by the benchmarks that need worker processes.
+
+Tasks report back through the Redis client of the broker, so these
+benchmarks need the `RedisBroker`.
+"""
+
+import subprocess
+import time
+
+from rapidq import RapidQ
+from rapidq.broker import get_broker
+
+READY_KEY = "rapidq.benchmark.ready"
+DONE_KEY = "rapidq.benchmark.done"
+LATENCY_KEY = "rapidq.benchmark.latency"
+
+app = RapidQ()
+
+
+@app.task(name="benchmark-ping")
+def ping() -> None:
+    get_broker().client.set(READY_KEY, 1)
+
+
+@app.task(name="benchmark-count")
+def count(payload: str) -> None:
+    get_broker().client.incr(DONE_KEY)
+
+
+@app.task(name="benchmark-latency")
+def record_latency(sent_at: float, payload: str = "") -> None:
+    latency = time.perf_counter() - sent_at
+    get_broker().client.rpush(LATENCY_KEY, latency)
+
+
+def redis_client():
+    """Returns the Redis client the results are collected with."""
+    client = getattr(get_broker(), "client", None)
+    if client is None:
+        raise RuntimeError("this benchmark needs RAPIDQ_BROKER_URL to point at Redis")
+    return client
+
+
+def wait_ready(process: subprocess.Popen, timeout: float = 30) -> None:
+    """Waits until a worker ran a task, so the application is up."""
+    client = redis_client()
+    client.delete(READY_KEY)
+    ping.enqueue()
+    deadline = time.time() + timeout
+    while not client.get(READY_KEY):
+        if process.poll() is not None:
+            raise RuntimeError(f"rapidq exited with code {process.returncode}")
+        if time.time() > deadline:
+            raise RuntimeError("rapidq did not start in time")
+        time.sleep(0.05)
+
+
+def wait_count(expected: int, timeout: float = 60) -> int:
+    """Waits until `expected` count tasks are done, returns how many are."""
+    client = redis_client()
+    deadline = time.time() + timeout
+    done = 0
+    while time.time() < deadline:
+        done = int(client.get(DONE_KEY) or 0)
+        if done >= expected:
+            break
+        time.sleep(0.005)
+    return done
@@ -0,0 +1,94 @@
+"""
+End-to-end throughput benchmark.
+
+Starts RapidQ with each number of workers, queues a batch of tasks that only
+count themselves, and measures how many tasks per second are run, from the
+first one done to the last one. The counting costs a Redis round trip per task.
+Needs Redis, run from the repository root:
+`python -m benchmarks.throughput --tasks 5000 --workers 1,2,4`
+"""
+
+import argparse
+import sys
+import time
+
+from benchmarks.common import (
+    Row,
+    add_arguments,
+    int_list,
+    make_payload,
+    optional_redis,
+    print_table,
+    rapidq_running,
+    write_results,
+)
+
+
+def measure(
+    workers: int, tasks: int, payload: str, consume_mode: str, prefetch: int
+) -> tuple[float, int]:
+    """Returns the tasks run per second, and how many were run."""
+    from benchmarks.tasks import DONE_KEY, count, redis_client, wait_count
+
+    client = redis_client()
+    with rapidq_running(
+        "-w",
+        str(workers),
+        "--consume-mode",
+        consume_mode,
+        "--prefetch",
+        str(prefetch),
+    ):
+        client.delete(DONE_KEY)
+        count.enqueue_many((payload,) for _ in range(tasks))
+        wait_count(1)
+        started = time.perf_counter()
+        done = wait_count(tasks)
+        elapsed = time.perf_counter() - started
+    return (done - 1) / elapsed, done
+
+
+def run(args: argparse.Namespace) -> list[Row]:
+    rows = []
+    for size in args.payload_sizes:
+        payload = make_payload(size)
+        for workers in args.workers:
+            tasks_per_second, done = measure(
+                workers, args.tasks, payload, args.consume_mode, args.prefetch
+            )
+            rows.append(
+                {
+                    "payload_bytes": size,
+                    "workers": workers,
+                    "consume_mode": args.consume_mode,
+                    "prefetch": args.prefetch,
+                    "tasks": args.tasks,
+                    "done": done,
+                    "tasks_per_second": tasks_per_second,
+                }
+            )
+    return rows
+
+
+def add_benchmark_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--tasks", type=int, default=5000)
+    parser.add_argument("--workers", type=int_list, default=[1, 2, 4])
+    parser.add_argument("--payload-sizes", type=int_list, default=[64, 4096, 65536])
+    parser.add_argument("--consume-mode", default="relay")
+    parser.add_argument("--prefetch", type=int, default=8)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_benchmark_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    with optional_redis(args.spawn_redis):
+        rows = run(args)
+    print_table(rows)
+    write_results(args.output, "throughput", args, rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
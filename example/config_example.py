@@ -1,2 +1,16 @@
+# "pickle" (default), "json" or "binary".
 RAPIDQ_BROKER_SERIALIZER = "pickle"
 RAPIDQ_BROKER_URL = "redis://localhost:6379/0"
+# "keyed" (default) or "inline". Inline pushes the whole message onto the queue.
+RAPIDQ_BROKER_LAYOUT = "keyed"
+# "none" (default), "zlib" or "lzma". Only messages above the threshold (bytes) are compressed.
+RAPIDQ_COMPRESSION = "none"
+RAPIDQ_COMPRESSION_THRESHOLD = 16384
+RAPIDQ_COMPRESSION_LEVEL = 6
+# "none" (default), "filesystem", "shared_memory" or the dotted path of a BlobStore subclass.
+# Arguments above the threshold (bytes) are stored there instead of inside the message.
+RAPIDQ_BLOB_STORE = "none"
+RAPIDQ_BLOB_THRESHOLD = 1048576
+# "none" (default) or "redis". Results are kept for RAPIDQ_RESULT_TTL seconds.
+RAPIDQ_RESULT_BACKEND = "none"
+RAPIDQ_RESULT_TTL = 3600
@@ -1,4 +1,5 @@
 from rapidq import framework_inits  # noqa
 from rapidq.master import RapidQ
+from rapidq.result import AsyncResult, gather
 
 __version__ = "0.4.0"
@@ -0,0 +1,65 @@
+import math
+
+from rapidq.constants import DEFAULT_SCALE_COOLDOWN, DEFAULT_SCALE_UP_DELAY
+
+
+class Autoscaler:
+    """
+    Sizes the worker pool between `min_workers` and `max_workers`.
+    The pool grows when messages keep waiting while every worker is busy,
+    and idle workers are stopped once nothing waited for `cooldown` seconds.
+    """
+
+    def __init__(
+        self,
+        min_workers: int,
+        max_workers: int,
+        cooldown: float = DEFAULT_SCALE_COOLDOWN,
+        up_delay: float = DEFAULT_SCALE_UP_DELAY,
+    ) -> None:
+        self.min_workers: int = min_workers
+        self.max_workers: int = max_workers
+        self.cooldown: float = cooldown
+        # how long messages wait with no idle worker before the pool grows.
+        self.up_delay: float = up_delay
+        self.saturated_since: float | None = None
+        # worker name -> since when it is idle.
+        self.idle_since: dict[str, float] = {}
+
+    def workers_to_add(
+        self,
+        backlog: int,
+        idle_workers: int,
+        booting: bool,
+        workers: int,
+        slots_per_worker: int,
+        now: float,
+    ) -> int:
+        """The number of workers to start now."""
+        if not backlog or idle_workers or booting:
+            # booting workers are about to take messages, wait for them.
+            self.saturated_since = None
+            return 0
+        if self.saturated_since is None:
+            self.saturated_since = now
+        if now - self.saturated_since < self.up_delay:
+            return 0
+
+        self.saturated_since = None
+        needed = math.ceil(backlog / slots_per_worker)
+        # at most doubles the pool at once.
+        return max(0, min(needed, max(workers, 1), self.max_workers - workers))
+
+    def workers_to_stop(
+        self, idle: list[str], backlog: int, workers: int, now: float
+    ) -> list[str]:
+        """The names of the idle workers to stop now."""
+        self.idle_since = {name: self.idle_since.get(name, now) for name in idle}
+        if backlog:
+            return []
+        expired = [
+            name
+            for name, since in self.idle_since.items()
+            if now - since >= self.cooldown
+        ]
+        return expired[: max(0, workers - self.min_workers)]
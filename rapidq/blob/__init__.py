@@ -0,0 +1,66 @@
+import os
+from typing import Type
+
+from rapidq.blob.base import Blob, BlobStore
+from rapidq.blob.filesystem import FileSystemBlobStore
+from rapidq.blob.shared_memory import SharedMemoryBlobStore
+from rapidq.constants import DEFAULT_BLOB_STORE, DEFAULT_BLOB_THRESHOLD, BlobStorage
+from rapidq.utils import import_module
+
+BLOB_STORES: dict[str, Type[BlobStore]] = {
+    BlobStorage.FILESYSTEM: FileSystemBlobStore,
+    BlobStorage.SHARED_MEMORY: SharedMemoryBlobStore,
+}
+
+
+def get_blob_store_class() -> Type[BlobStore] | None:
+    """
+    The blob store configured with `RAPIDQ_BLOB_STORE`, either one of
+    the built-in stores or the dotted path of a `BlobStore` subclass.
+    """
+    store = os.environ.get("RAPIDQ_BLOB_STORE", DEFAULT_BLOB_STORE)
+    if store == BlobStorage.NONE:
+        return None
+    if store in BLOB_STORES:
+        return BLOB_STORES[store]
+
+    module_name, _, class_name = store.rpartition(".")
+    store_class = (
+        getattr(import_module(module_name), class_name, None) if module_name else None
+    )
+    if not (isinstance(store_class, type) and issubclass(store_class, BlobStore)):
+        raise RuntimeError(
+            f"blob store must be in {[BlobStorage.NONE, *BLOB_STORES]}"
+            " or the path of a BlobStore subclass"
+        )
+    return store_class
+
+
+blob_store_instance: BlobStore | None = None
+
+
+def get_blob_store() -> BlobStore | None:
+    """Returns the configured blob store, or None if claim check is off."""
+    global blob_store_instance
+    if blob_store_instance is None:
+        blob_store_class = get_blob_store_class()
+        if blob_store_class is None:
+            return None
+        threshold = int(os.environ.get("RAPIDQ_BLOB_THRESHOLD", DEFAULT_BLOB_THRESHOLD))
+        if blob_store_class is FileSystemBlobStore:
+            blob_store_instance = FileSystemBlobStore(
+                threshold=threshold, directory=os.environ.get("RAPIDQ_BLOB_DIR")
+            )
+        else:
+            blob_store_instance = blob_store_class(threshold=threshold)
+    return blob_store_instance
+
+
+def reset_blob_store() -> None:
+    """Drops the blob store instance, the next lookup creates it again."""
+    global blob_store_instance
+    blob_store_instance = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_blob_store)
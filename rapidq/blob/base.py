@@ -0,0 +1,132 @@
+import pickle
+import struct
+from abc import ABC, abstractmethod
+from typing import Any, Iterable
+
+from rapidq.constants import DEFAULT_BLOB_THRESHOLD
+from rapidq.message import Message
+
+# frames start on this boundary, so arrays mapped from a blob are aligned.
+FRAME_ALIGNMENT = 64
+COUNT_HEADER = struct.Struct("!I")
+LENGTH = struct.Struct("!Q")
+
+
+def aligned(offset: int) -> int:
+    return -(-offset // FRAME_ALIGNMENT) * FRAME_ALIGNMENT
+
+
+def frame_offsets(lengths: list[int]) -> tuple[list[int], int]:
+    """Returns where each frame starts in a blob and the blob's total size."""
+    offset = COUNT_HEADER.size + LENGTH.size * len(lengths)
+    offsets = []
+    for length in lengths:
+        offset = aligned(offset)
+        offsets.append(offset)
+        offset += length
+    return offsets, offset
+
+
+def write_frames(buffer: memoryview, frames: list[memoryview]) -> None:
+    """Lays out the frames in the buffer, which must be `blob_size` bytes long."""
+    lengths = [frame.nbytes for frame in frames]
+    offsets, _ = frame_offsets(lengths)
+    COUNT_HEADER.pack_into(buffer, 0, len(frames))
+    for index, length in enumerate(lengths):
+        LENGTH.pack_into(buffer, COUNT_HEADER.size + LENGTH.size * index, length)
+    for offset, frame in zip(offsets, frames):
+        buffer[offset : offset + frame.nbytes] = frame.cast("B")
+
+
+def read_frames(buffer: memoryview) -> list[memoryview]:
+    """Slices the frames out of a blob without copying them."""
+    (count,) = COUNT_HEADER.unpack_from(buffer, 0)
+    lengths = [
+        LENGTH.unpack_from(buffer, COUNT_HEADER.size + LENGTH.size * index)[0]
+        for index in range(count)
+    ]
+    offsets, _ = frame_offsets(lengths)
+    return [
+        buffer[offset : offset + length] for offset, length in zip(offsets, lengths)
+    ]
+
+
+def blob_size(frames: Iterable[memoryview]) -> int:
+    return frame_offsets([frame.nbytes for frame in frames])[1]
+
+
+class Blob(ABC):
+    """An opened blob, its buffer stays valid until it is closed."""
+
+    buffer: memoryview
+
+    @abstractmethod
+    def close(self) -> None: ...
+
+
+class BlobStore(ABC):
+    """
+    Keeps large task arguments out of the broker, the message only carries
+    a reference to them (claim check).
+    Arguments are pickled with protocol 5, so buffers such as numpy arrays
+    are written as they are and read back without a copy.
+    """
+
+    def __init__(self, threshold: int = DEFAULT_BLOB_THRESHOLD) -> None:
+        self.threshold = threshold
+
+    @abstractmethod
+    def put(self, frames: list[memoryview]) -> str:
+        """Store the frames as one blob and return its reference."""
+
+    @abstractmethod
+    def open(self, blob_ref: str) -> Blob:
+        """Open the blob for reading."""
+
+    @abstractmethod
+    def delete(self, blob_ref: str) -> None:
+        """Remove the blob."""
+
+    def offload(self, args: tuple, kwargs: dict[str, Any]) -> str | None:
+        """
+        Store the arguments if they are larger than the threshold.
+        Returns the blob reference, or None if the arguments are small enough
+        to travel in the message.
+        """
+        buffers: list[pickle.PickleBuffer] = []
+        payload = pickle.dumps(
+            (args, kwargs), protocol=5, buffer_callback=buffers.append
+        )
+        frames = [memoryview(payload), *(buffer.raw() for buffer in buffers)]
+        if sum(frame.nbytes for frame in frames) < self.threshold:
+            return None
+        return self.put(frames)
+
+    def load(self, message: Message) -> Blob:
+        """Put the offloaded arguments back into the message."""
+        blob = self.open(message.blob_ref)
+        try:
+            payload, *buffers = read_frames(blob.buffer)
+            args, kwargs = pickle.loads(payload, buffers=buffers)
+        except Exception:
+            blob.close()
+            raise
+        message.args = list(args)
+        message.kwargs = kwargs
+        return blob
+
+    def release(self, message: Message, blob: Blob, delete: bool = True) -> None:
+        """
+        Drop the arguments from the message and delete the blob.
+        `delete=False` keeps the blob for a retry of the message.
+        """
+        message.args = []
+        message.kwargs = {}
+        try:
+            blob.close()
+        except BufferError:
+            # the task kept a reference to the data, the mapping goes away
+            # with the last reference instead.
+            pass
+        if delete:
+            self.delete(message.blob_ref)
@@ -0,0 +1,59 @@
+import mmap
+import os
+import tempfile
+import uuid
+
+from rapidq.blob.base import Blob, BlobStore, blob_size, write_frames
+from rapidq.constants import DEFAULT_BLOB_THRESHOLD
+
+
+class FileBlob(Blob):
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as blob_file:
+            # a private copy-on-write mapping, arguments can be modified
+            # by the task without touching the file.
+            self.mmap = mmap.mmap(blob_file.fileno(), 0, access=mmap.ACCESS_COPY)
+        self.buffer = memoryview(self.mmap)
+
+    def close(self) -> None:
+        self.buffer.release()
+        self.mmap.close()
+
+
+class FileSystemBlobStore(BlobStore):
+    """
+    Stores blobs as files in a directory, which must be shared by the
+    producers and the workers. Workers memory-map the files.
+    """
+
+    def __init__(
+        self, threshold: int = DEFAULT_BLOB_THRESHOLD, directory: str | None = None
+    ) -> None:
+        super().__init__(threshold=threshold)
+        self.directory = directory or os.path.join(
+            tempfile.gettempdir(), "rapidq-blobs"
+        )
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, blob_ref: str) -> str:
+        return os.path.join(self.directory, f"{blob_ref}.blob")
+
+    def put(self, frames: list[memoryview]) -> str:
+        blob_ref = uuid.uuid4().hex
+        buffer = bytearray(blob_size(frames))
+        write_frames(memoryview(buffer), frames)
+        # written under a temporary name, so a worker never maps a partial blob.
+        temp_path = f"{self.path(blob_ref)}.tmp"
+        with open(temp_path, "wb") as blob_file:
+            blob_file.write(buffer)
+        os.replace(temp_path, self.path(blob_ref))
+        return blob_ref
+
+    def open(self, blob_ref: str) -> FileBlob:
+        return FileBlob(self.path(blob_ref))
+
+    def delete(self, blob_ref: str) -> None:
+        try:
+            os.remove(self.path(blob_ref))
+        except FileNotFoundError:
+            pass
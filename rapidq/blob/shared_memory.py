@@ -0,0 +1,43 @@
+import uuid
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from rapidq.blob.base import Blob, BlobStore, blob_size, write_frames
+
+
+class SharedMemoryBlob(Blob):
+    def __init__(self, blob_ref: str) -> None:
+        self.shared_memory = SharedMemory(name=blob_ref)
+        self.buffer = self.shared_memory.buf
+
+    def close(self) -> None:
+        self.shared_memory.close()
+
+
+class SharedMemoryBlobStore(BlobStore):
+    """
+    Stores blobs in named shared memory, for producers and workers on the same host.
+    Workers attach to the segment without copying it.
+    """
+
+    def put(self, frames: list[memoryview]) -> str:
+        # short names, macOS limits shared memory names to 31 characters.
+        blob_ref = f"rq{uuid.uuid4().hex[:24]}"
+        shared_memory = SharedMemory(name=blob_ref, create=True, size=blob_size(frames))
+        # the segment must outlive the producer, which would otherwise
+        # unlink it on exit. The worker unlinks it after the task.
+        resource_tracker.unregister(shared_memory._name, "shared_memory")
+        write_frames(shared_memory.buf, frames)
+        shared_memory.close()
+        return blob_ref
+
+    def open(self, blob_ref: str) -> SharedMemoryBlob:
+        return SharedMemoryBlob(blob_ref)
+
+    def delete(self, blob_ref: str) -> None:
+        try:
+            shared_memory = SharedMemory(name=blob_ref)
+        except FileNotFoundError:
+            return
+        shared_memory.close()
+        shared_memory.unlink()
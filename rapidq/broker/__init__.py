@@ -1,12 +1,33 @@
+import os
 from typing import Type
+from urllib.parse import urlparse
 
 from rapidq.broker.base import Broker
+from rapidq.broker.memory_broker import MemoryBroker
 from rapidq.broker.redis_broker import RedisBroker
+from rapidq.broker.redis_streams_broker import RedisStreamsBroker
+from rapidq.broker.sqlite_broker import SqliteBroker
+
+# broker classes, by the scheme of `RAPIDQ_BROKER_URL`.
+BROKER_CLASSES: dict[str, Type[Broker]] = {
+    "redis": RedisBroker,
+    "rediss": RedisBroker,
+    "unix": RedisBroker,
+    "redis+streams": RedisStreamsBroker,
+    "rediss+streams": RedisStreamsBroker,
+    "memory": MemoryBroker,
+    "sqlite": SqliteBroker,
+}
 
 
 def get_broker_class() -> Type[Broker]:
-    # TODO: update when extra brokers are added.
-    return RedisBroker
+    url = os.environ.get("RAPIDQ_BROKER_URL", RedisBroker.DEFAULT_URL)
+    scheme = urlparse(url).scheme
+    if scheme not in BROKER_CLASSES:
+        raise RuntimeError(
+            f"unknown broker url scheme {scheme!r}, must be in {list(BROKER_CLASSES)}"
+        )
+    return BROKER_CLASSES[scheme]
 
 
 broker_instance: Broker | None = None
@@ -18,3 +39,14 @@ def get_broker() -> Broker:
         broker_class = get_broker_class()
         broker_instance = broker_class()
     return broker_instance
+
+
+def reset_broker() -> None:
+    """Drops the broker instance, the next `get_broker` call connects again."""
+    global broker_instance
+    broker_instance = None
+
+
+if hasattr(os, "register_at_fork"):
+    # a forked worker must not share the connections of the master.
+    os.register_at_fork(after_in_child=reset_broker)
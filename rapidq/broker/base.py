@@ -1,22 +1,73 @@
 from abc import ABC, abstractmethod
+from typing import Iterable
 
+from rapidq.constants import DEFAULT_QUEUE_NAME
 from rapidq.message import Message
 
 
+def serialize_message(message: Message) -> bytes:
+    """Serializes a message, always as bytes like Redis gives them back."""
+    data = Message.serialize(message)
+    return data.encode() if isinstance(data, str) else data
+
+
 class Broker(ABC):
+    # brokers that keep a popped message until its task is done, see `ack_message`.
+    NEEDS_ACK: bool = False
 
     @abstractmethod
     def is_alive(self) -> bool:
         """Test if broker is alive."""
 
     @abstractmethod
-    def enqueue_message(self, message: Message) -> None:
-        """Adds a message into the broker client."""
+    def enqueue_message(
+        self, message: Message, dedup_window: float | None = None
+    ) -> str | None:
+        """
+        Adds a message into the broker client.
+        If the message has a `dedup_key` and a message with the same task and key
+        is still pending, or was enqueued less than `dedup_window` seconds ago,
+        nothing is added and the id of that message is returned instead.
+        The check and the enqueue are atomic.
+        """
+
+    @abstractmethod
+    def schedule_message(self, message: Message, run_at: float) -> None:
+        """
+        Keeps the message aside until `run_at`, a unix timestamp.
+        It is queued as usual once `promote_scheduled` finds it due.
+        """
+
+    @abstractmethod
+    def promote_scheduled(self, now: float) -> tuple[int, float | None]:
+        """
+        Queues a batch of the scheduled messages that are due at `now`.
+        Returns how many were queued, and when the next one is due if there is one.
+        """
+
+    @abstractmethod
+    def release_dedup_key(self, message: Message) -> None:
+        """
+        Lets duplicates of the message be enqueued again, called when it starts.
+        Keys held for a `dedup_window` are left to expire.
+        """
+
+    @abstractmethod
+    def enqueue_messages(self, messages: Iterable[Message]) -> int:
+        """
+        Adds many messages into the broker client, in batches.
+        `messages` is consumed lazily, so it can be a generator.
+        Returns the number of messages added.
+        """
 
     @abstractmethod
-    def fetch_queued(self) -> list[bytes]:
+    def fetch_queued(self, queue_name: str = DEFAULT_QUEUE_NAME) -> list[bytes]:
         """Return the list of pending queued tasks (message ids)."""
 
+    @abstractmethod
+    def queue_depth(self, queue_name: str = DEFAULT_QUEUE_NAME) -> int:
+        """Return the number of messages waiting in the queue, all priorities."""
+
     @abstractmethod
     def fetch_message(self, message_id: str) -> bytes:
         """
@@ -26,12 +77,52 @@ class Broker(ABC):
         """
 
     @abstractmethod
-    def dequeue_message(self, message_id: str) -> bytes:
+    def dequeue_message(
+        self, message_id: str, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> bytes:
         """
         Remove a message from broker using `message_id` and return it.
         Returned data will not be a Message instance.
         """
 
+    @abstractmethod
+    def pop_messages(
+        self, count: int, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> list[bytes]:
+        """
+        Atomically remove up to `count` messages from the head of the queue
+        and return them, higher priority messages first.
+        A popped message is never returned to another caller,
+        so it is safe to call this from several masters at once.
+        Returned data will not be Message instances.
+        """
+
+    @abstractmethod
+    def requeue_messages(self, messages: list[bytes]) -> None:
+        """
+        Puts popped messages back at the head of their queue, in order,
+        so they are the next ones consumed. For messages no worker could take.
+        """
+
+    @abstractmethod
+    def wait_message(
+        self, queue_names: list[str], timeout: float
+    ) -> tuple[str, bytes] | None:
+        """
+        Block until a message is queued in any of `queue_names`, remove it
+        from the broker and return it along with the name of its queue.
+        Queues are checked in the given order.
+        Returns None if nothing arrived within `timeout` seconds.
+        Returned data will not be a Message instance.
+        """
+
+    def ack_message(self, message: Message) -> None:
+        """
+        Called by the worker once the task of a popped message is done,
+        whether it succeeded, failed or was retried. Brokers with `NEEDS_ACK`
+        hand out again the messages never acknowledged, eg after a crash.
+        """
+
     @abstractmethod
     def flush(self) -> None:
         """Flush the broker."""
@@ -0,0 +1,396 @@
+import heapq
+import os
+import socket
+import threading
+import time
+from collections import deque
+from multiprocessing import get_context
+from multiprocessing.managers import BaseManager
+from typing import Any, Iterable
+from urllib.parse import unquote, urlparse
+
+from rapidq.broker.base import Broker, serialize_message
+from rapidq.constants import DEFAULT_QUEUE_NAME, Priority
+from rapidq.message import Message
+from rapidq.utils import batched
+
+PRIORITIES: tuple[int, ...] = (Priority.HIGH, Priority.NORMAL, Priority.LOW)
+# a dedup key is released when its task starts, the expiry only
+# covers messages that never run.
+DEDUP_PENDING_TTL: float = 24 * 3600
+# never starts a process, passed so the managers leave the default start
+# method alone, the master sets it later.
+MANAGER_CONTEXT = get_context("spawn")
+
+
+class MemoryStore:
+    """
+    The queues of a MemoryBroker, held in memory.
+    Holds serialized messages only, so it never needs the serializer.
+    Safe to use from many threads, the manager server runs a thread per client.
+    """
+
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        # (queue name, priority) -> message ids, in order.
+        self.queues: dict[tuple[str, int], deque[str]] = {}
+        self.messages: dict[str, bytes] = {}
+        # heap of (run at, message id, queue name, priority).
+        self.scheduled: list[tuple[float, str, str, int]] = []
+        # dedup key -> (message id, expiry, held for a window).
+        self.dedup: dict[str, tuple[str, float, bool]] = {}
+
+    def _push(self, message_id: str, queue_name: str, priority: int) -> None:
+        # the caller holds the condition.
+        self.queues.setdefault((queue_name, priority), deque()).append(message_id)
+        self.condition.notify()
+
+    def enqueue(
+        self,
+        message_id: str,
+        data: bytes,
+        queue_name: str,
+        priority: int,
+        dedup_key: str | None = None,
+        dedup_window: float | None = None,
+    ) -> str | None:
+        """Queues a message unless its dedup key is taken, see `Broker.enqueue_message`."""
+        with self.condition:
+            if dedup_key is not None:
+                existing = self.dedup.get(dedup_key)
+                if existing and existing[1] > time.time():
+                    return existing[0]
+                self.dedup[dedup_key] = (
+                    message_id,
+                    time.time() + (dedup_window or DEDUP_PENDING_TTL),
+                    bool(dedup_window),
+                )
+            self.messages[message_id] = data
+            self._push(message_id, queue_name, priority)
+        return None
+
+    def enqueue_many(self, entries: list[tuple[str, bytes, str, int]]) -> None:
+        """Queues many (message id, data, queue name, priority) at once."""
+        with self.condition:
+            for message_id, data, queue_name, priority in entries:
+                self.messages[message_id] = data
+                self.queues.setdefault((queue_name, priority), deque()).append(
+                    message_id
+                )
+            self.condition.notify_all()
+
+    def schedule(
+        self,
+        message_id: str,
+        data: bytes,
+        queue_name: str,
+        priority: int,
+        run_at: float,
+    ) -> None:
+        with self.condition:
+            self.messages[message_id] = data
+            heapq.heappush(self.scheduled, (run_at, message_id, queue_name, priority))
+
+    def promote_scheduled(self, now: float, limit: int) -> tuple[int, float | None]:
+        moved = 0
+        with self.condition:
+            while self.scheduled and self.scheduled[0][0] <= now and moved < limit:
+                _, message_id, queue_name, priority = heapq.heappop(self.scheduled)
+                self._push(message_id, queue_name, priority)
+                moved += 1
+            # looked at every time the master promotes, so expired keys go away.
+            for key, (_, expiry, _) in list(self.dedup.items()):
+                if expiry <= now:
+                    del self.dedup[key]
+            next_due = self.scheduled[0][0] if self.scheduled else None
+        return moved, next_due
+
+    def release_dedup_key(self, dedup_key: str, message_id: str) -> None:
+        with self.condition:
+            existing = self.dedup.get(dedup_key)
+            if existing and existing[0] == message_id and not existing[2]:
+                del self.dedup[dedup_key]
+
+    def fetch_queued(self, queue_name: str, limit: int) -> list[bytes]:
+        with self.condition:
+            queued = []
+            for priority in PRIORITIES:
+                for message_id in self.queues.get((queue_name, priority), ()):
+                    if len(queued) == limit:
+                        return queued
+                    queued.append(message_id.encode())
+            return queued
+
+    def queue_depth(self, queue_name: str) -> int:
+        with self.condition:
+            return sum(
+                len(self.queues.get((queue_name, priority), ()))
+                for priority in PRIORITIES
+            )
+
+    def fetch_message(self, message_id: str) -> bytes | None:
+        with self.condition:
+            return self.messages.get(message_id)
+
+    def dequeue(self, message_id: str, queue_name: str) -> bytes | None:
+        with self.condition:
+            for priority in PRIORITIES:
+                queue = self.queues.get((queue_name, priority))
+                if queue and message_id in queue:
+                    queue.remove(message_id)
+            return self.messages.pop(message_id, None)
+
+    def _pop(self, count: int, queue_name: str) -> list[bytes]:
+        # the caller holds the condition.
+        popped = []
+        for priority in PRIORITIES:
+            queue = self.queues.get((queue_name, priority))
+            while queue and len(popped) < count:
+                popped.append(self.messages.pop(queue.popleft()))
+        return popped
+
+    def pop(self, count: int, queue_name: str) -> list[bytes]:
+        with self.condition:
+            return self._pop(count, queue_name)
+
+    def requeue(self, entries: list[tuple[str, bytes, str, int]]) -> None:
+        """Puts (message id, data, queue name, priority) back at the head, in order."""
+        with self.condition:
+            for message_id, data, queue_name, priority in reversed(entries):
+                self.messages[message_id] = data
+                self.queues.setdefault((queue_name, priority), deque()).appendleft(
+                    message_id
+                )
+            self.condition.notify_all()
+
+    def wait(self, queue_names: list[str], timeout: float) -> tuple[str, bytes] | None:
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                for queue_name in queue_names:
+                    popped = self._pop(1, queue_name)
+                    if popped:
+                        return queue_name, popped[0]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def flush(self) -> None:
+        with self.condition:
+            self.queues.clear()
+            self.messages.clear()
+            self.scheduled.clear()
+            self.dedup.clear()
+
+
+class StoreServer(BaseManager):
+    """Serves the MemoryStore of this process to the other processes."""
+
+
+class StoreClient(BaseManager):
+    """Connects to the MemoryStore served by another process."""
+
+
+StoreClient.register("store")
+
+
+class MemoryBroker(Broker):
+    """
+    A Broker keeping the queues in memory, for a single host, see the README.
+    `memory://` keeps them in this process, for tests. With an address, eg
+    `memory:///tmp/rapidq.sock` or `memory://:secret@127.0.0.1:7000`, the
+    processes share them through a multiprocessing manager server. The first
+    process to connect runs the server in a thread and holds the queues.
+    The server unpickles what it receives, a TCP address needs its own auth key.
+    """
+
+    SCHEME = "memory"
+    DEFAULT_URL = "memory://"
+    DEFAULT_AUTHKEY = "rapidq"
+    PROMOTE_BATCH_SIZE = 1000
+    BATCH_SIZE = 100
+    ENQUEUE_BATCH_SIZE = 1000
+
+    # stores held by this process, by address. `memory://` is "".
+    stores: dict[str, MemoryStore] = {}
+    stores_lock = threading.Lock()
+
+    def __init__(self, connection_params: dict[str, Any] | None = None) -> None:
+        connection_params = connection_params or {}
+        url = connection_params.get(
+            "url", os.environ.get("RAPIDQ_BROKER_URL", self.DEFAULT_URL)
+        )
+        parsed = urlparse(url)
+        if parsed.scheme != self.SCHEME:
+            raise RuntimeError(f"not a {self.SCHEME}:// url: {url!r}")
+        self.authkey: bytes = unquote(parsed.password or self.DEFAULT_AUTHKEY).encode()
+        self.address: str | tuple[str, int] | None = None
+        if parsed.path not in ("", "/"):
+            # only reachable by who can open the socket file.
+            self.address = unquote(parsed.path)
+        elif parsed.hostname:
+            if not parsed.password:
+                raise RuntimeError(
+                    f"a TCP memory broker needs an auth key, eg memory://:secret@{parsed.netloc}"
+                )
+            self.address = (parsed.hostname, parsed.port or 0)
+        self.store: MemoryStore = self.connect()
+
+    def connect(self) -> MemoryStore:
+        """Returns the store, hosting it in this process if nobody serves it yet."""
+        key = repr(self.address) if self.address else ""
+        with self.stores_lock:
+            if key in self.stores:
+                return self.stores[key]
+            if self.address is None:
+                store = self.stores[key] = MemoryStore()
+                return store
+            for _ in range(3):
+                try:
+                    client = StoreClient(
+                        self.address, self.authkey, ctx=MANAGER_CONTEXT
+                    )
+                    client.connect()
+                    return client.store()
+                except (ConnectionRefusedError, FileNotFoundError):
+                    pass
+                try:
+                    store = self.serve()
+                except OSError:
+                    # another process started serving in the meantime.
+                    continue
+                self.stores[key] = store
+                return store
+        raise RuntimeError(
+            f"unable to reach or serve the memory broker at {self.address}"
+        )
+
+    def serve(self) -> MemoryStore:
+        """Starts serving a new store from a thread of this process."""
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            # nothing answered on it, left behind by a process that died.
+            try:
+                with socket.socket(socket.AF_UNIX) as probe:
+                    probe.connect(self.address)
+            except ConnectionRefusedError:
+                os.unlink(self.address)
+        store = MemoryStore()
+
+        class Server(StoreServer):
+            pass
+
+        Server.register("store", callable=lambda: store)
+        server = Server(self.address, self.authkey, ctx=MANAGER_CONTEXT).get_server()
+        threading.Thread(
+            target=server.serve_forever, name="rapidq-memory-broker", daemon=True
+        ).start()
+        return store
+
+    @classmethod
+    def forget_stores(cls) -> None:
+        """Drops the stores inherited from the parent, they are copies after a fork."""
+        cls.stores = {}
+        cls.stores_lock = threading.Lock()
+
+    def is_alive(self) -> bool:
+        try:
+            self.store.queue_depth(DEFAULT_QUEUE_NAME)
+            return True
+        except (OSError, EOFError):
+            return False
+
+    def enqueue_message(
+        self, message: Message, dedup_window: float | None = None
+    ) -> str | None:
+        dedup_key = None
+        if message.dedup_key is not None:
+            dedup_key = f"{message.task_name}|{message.dedup_key}"
+        return self.store.enqueue(
+            message.message_id,
+            serialize_message(message),
+            message.queue_name,
+            message.priority,
+            dedup_key,
+            dedup_window,
+        )
+
+    def schedule_message(self, message: Message, run_at: float) -> None:
+        self.store.schedule(
+            message.message_id,
+            serialize_message(message),
+            message.queue_name,
+            message.priority,
+            run_at,
+        )
+
+    def promote_scheduled(self, now: float) -> tuple[int, float | None]:
+        return self.store.promote_scheduled(now, self.PROMOTE_BATCH_SIZE)
+
+    def release_dedup_key(self, message: Message) -> None:
+        if message.dedup_key is None:
+            return
+        self.store.release_dedup_key(
+            f"{message.task_name}|{message.dedup_key}", message.message_id
+        )
+
+    def enqueue_messages(self, messages: Iterable[Message]) -> int:
+        count = 0
+        # a call per batch, so a round trip to the server per batch.
+        for batch in batched(messages, self.ENQUEUE_BATCH_SIZE):
+            self.store.enqueue_many(
+                [
+                    (
+                        message.message_id,
+                        serialize_message(message),
+                        message.queue_name,
+                        message.priority,
+                    )
+                    for message in batch
+                ]
+            )
+            count += len(batch)
+        return count
+
+    def fetch_queued(self, queue_name: str = DEFAULT_QUEUE_NAME) -> list[bytes]:
+        return self.store.fetch_queued(queue_name, self.BATCH_SIZE)
+
+    def queue_depth(self, queue_name: str = DEFAULT_QUEUE_NAME) -> int:
+        return self.store.queue_depth(queue_name)
+
+    def fetch_message(self, message_id: str) -> bytes:
+        return self.store.fetch_message(message_id)
+
+    def dequeue_message(
+        self, message_id: str, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> bytes:
+        return self.store.dequeue(message_id, queue_name)
+
+    def pop_messages(
+        self, count: int, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> list[bytes]:
+        if count <= 0:
+            return []
+        return self.store.pop(count, queue_name)
+
+    def requeue_messages(self, messages: list[bytes]) -> None:
+        entries = []
+        for data in messages:
+            message = Message.deserialize(data)
+            entries.append(
+                (message.message_id, data, message.queue_name, message.priority)
+            )
+        self.store.requeue(entries)
+
+    def wait_message(
+        self, queue_names: list[str], timeout: float
+    ) -> tuple[str, bytes] | None:
+        return self.store.wait(queue_names, timeout)
+
+    def flush(self) -> None:
+        self.store.flush()
+
+
+if hasattr(os, "register_at_fork"):
+    # a forked worker connects to the server of the master like any process.
+    os.register_at_fork(after_in_child=MemoryBroker.forget_stores)
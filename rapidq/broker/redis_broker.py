@@ -1,11 +1,128 @@
+import math
 import os
-from typing import Any, cast
+import time
+from typing import Any, Iterable, cast
 
 from redis import ConnectionError, Redis
+from redis.client import Pipeline
 
 from rapidq.broker.base import Broker
-from rapidq.constants import DEFAULT_SERIALIZATION
+from rapidq.constants import (
+    DEFAULT_QUEUE_LAYOUT,
+    DEFAULT_QUEUE_NAME,
+    DEFAULT_SERIALIZATION,
+    Priority,
+    QueueLayout,
+)
 from rapidq.message import Message, MessageTypeRegistry
+from rapidq.utils import batched
+
+# Pops up to ARGV[1] entries in total from the queue lists (KEYS, highest
+# priority first) and returns the messages.
+# An entry is either a message id (keyed layout) or the serialized message itself
+# (inline layout). Message ids are swapped for their payload and the payload key
+# is deleted, so queues holding both kinds of entries drain correctly.
+# Runs atomically on the server, so concurrent callers can never receive the same message.
+POP_MESSAGES_SCRIPT = """
+local remaining = tonumber(ARGV[1])
+local messages = {}
+for _, key in ipairs(KEYS) do
+    if remaining <= 0 then
+        break
+    end
+    local entries = redis.call('LPOP', key, remaining)
+    if entries then
+        remaining = remaining - #entries
+        for _, entry in ipairs(entries) do
+            if string.len(entry) == 36 and string.match(entry, '^%x+%-%x+%-%x+%-%x+%-%x+$') then
+                local message = redis.call('GETDEL', ARGV[2] .. entry)
+                if message then
+                    table.insert(messages, message)
+                end
+            else
+                table.insert(messages, entry)
+            end
+        end
+    end
+end
+return messages
+"""
+
+# Pops the first message of the queue lists (KEYS, in the given order) and
+# returns it along with its list, false if they are all empty.
+# Like POP_MESSAGES_SCRIPT, the id of a keyed entry is swapped for its payload
+# in the same step, so no payload is left behind whatever happens to the caller.
+# ARGV[1] is the message key prefix and ARGV[2] the wake key prefix. If the list
+# still holds messages, its wake key is signalled for the next consumer.
+POP_FIRST_MESSAGE_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    local entry = redis.call('LPOP', key)
+    while entry do
+        local message = entry
+        if string.len(entry) == 36 and string.match(entry, '^%x+%-%x+%-%x+%-%x+%-%x+$') then
+            message = redis.call('GETDEL', ARGV[1] .. entry)
+        end
+        if message then
+            if redis.call('LLEN', key) > 0 then
+                redis.call('RPUSH', ARGV[2] .. key, 1)
+                redis.call('LTRIM', ARGV[2] .. key, -1, -1)
+            end
+            return {key, message}
+        end
+        entry = redis.call('LPOP', key)
+    end
+end
+return false
+"""
+
+# Enqueues a message unless its dedup key is taken, returns the dedup record
+# holding the key otherwise.
+# KEYS: the dedup key, the queue list, its wake key and the message key
+# (keyed layout only).
+# ARGV: the dedup record, its ttl in milliseconds, the queue entry and the payload.
+DEDUP_ENQUEUE_SCRIPT = """
+local existing = redis.call('GET', KEYS[1])
+if existing then
+    return existing
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+if KEYS[4] then
+    redis.call('SET', KEYS[4], ARGV[4])
+end
+redis.call('RPUSH', KEYS[2], ARGV[3])
+redis.call('RPUSH', KEYS[3], 1)
+redis.call('LTRIM', KEYS[3], -1, -1)
+return false
+"""
+
+# Deletes the dedup key KEYS[1] only if it still holds the record ARGV[1].
+RELEASE_DEDUP_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Moves up to ARGV[2] scheduled messages due at ARGV[1] from the sorted set
+# KEYS[1] onto their queues, the ones due first go first.
+# Members are "<queue list> <message id>", the payload is under the message key.
+# ARGV[3] is the wake key prefix, see `RedisBroker.signal`.
+# Returns the number of moved messages and the score of the next one, if any.
+PROMOTE_SCHEDULED_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    local separator = string.find(member, ' ', 1, true)
+    local queue_key = string.sub(member, 1, separator - 1)
+    redis.call('RPUSH', queue_key, string.sub(member, separator + 1))
+    redis.call('RPUSH', ARGV[3] .. queue_key, 1)
+    redis.call('LTRIM', ARGV[3] .. queue_key, -1, -1)
+end
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+local next_due = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {#due, next_due[2] or false}
+"""
 
 
 class RedisBroker(Broker):
@@ -14,9 +131,18 @@ class RedisBroker(Broker):
     """
 
     MESSAGE_PREFIX = "rapidq.message|"
+    DEDUP_PREFIX = "rapidq.dedup|"
+    # consumers block on these lists, not on the queues, see `wait_message`.
+    WAKE_PREFIX = "rapidq.wake|"
+    # a dedup key is released when its task starts, the expiry only
+    # covers messages that never run.
+    DEDUP_PENDING_TTL = 24 * 3600
     TASK_KEY = "rapidq.queued_tasks"
+    SCHEDULED_KEY = "rapidq.scheduled"
+    PROMOTE_BATCH_SIZE = 1000
     DEFAULT_URL = "redis://localhost:6379/0"
     BATCH_SIZE = 100
+    ENQUEUE_BATCH_SIZE = 1000
 
     def __init__(self, connection_params: dict[str, Any] | None = None) -> None:
         if not connection_params:
@@ -31,10 +157,22 @@ class RedisBroker(Broker):
             )
         self.serialization = serialization
 
+        layout = os.environ.get("RAPIDQ_BROKER_LAYOUT", DEFAULT_QUEUE_LAYOUT)
+        if layout not in (QueueLayout.KEYED, QueueLayout.INLINE):
+            raise RuntimeError(
+                f"layout must be in {[QueueLayout.KEYED, QueueLayout.INLINE]}"
+            )
+        self.layout = layout
+
         connection_params.setdefault(
             "url", os.environ.get("RAPIDQ_BROKER_URL", self.DEFAULT_URL)
         )
         self.client = Redis.from_url(**connection_params)
+        self._pop_messages = self.client.register_script(POP_MESSAGES_SCRIPT)
+        self._pop_first_message = self.client.register_script(POP_FIRST_MESSAGE_SCRIPT)
+        self._dedup_enqueue = self.client.register_script(DEDUP_ENQUEUE_SCRIPT)
+        self._release_dedup = self.client.register_script(RELEASE_DEDUP_SCRIPT)
+        self._promote_scheduled = self.client.register_script(PROMOTE_SCHEDULED_SCRIPT)
 
     def is_alive(self) -> bool:
         try:
@@ -46,27 +184,234 @@ class RedisBroker(Broker):
     def generate_message_key(self, message_id: str) -> str:
         return f"{self.MESSAGE_PREFIX}{message_id}"
 
-    def enqueue_message(self, message: Message) -> None:
-        key = self.generate_message_key(message.message_id)
+    def generate_dedup_key(self, message: Message) -> str:
+        return f"{self.DEDUP_PREFIX}{message.task_name}|{message.dedup_key}"
+
+    def generate_queue_key(
+        self, queue_name: str = DEFAULT_QUEUE_NAME, priority: int = Priority.NORMAL
+    ) -> str:
+        """
+        Returns the Redis list holding the messages of a queue and priority.
+        Every priority of a queue has its own list.
+        """
+        key = self.TASK_KEY
+        if queue_name != DEFAULT_QUEUE_NAME:
+            key = f"{key}|{queue_name}"
+        if priority != Priority.NORMAL:
+            key = f"{key}|p{priority}"
+        return key
+
+    def generate_queue_keys(self, queue_name: str = DEFAULT_QUEUE_NAME) -> list[str]:
+        """Returns all the lists of a queue, highest priority first."""
+        return [
+            self.generate_queue_key(queue_name, priority)
+            for priority in (Priority.HIGH, Priority.NORMAL, Priority.LOW)
+        ]
+
+    def generate_wake_key(self, queue_key: str) -> str:
+        return f"{self.WAKE_PREFIX}{queue_key}"
+
+    def signal(self, pipe: Pipeline, queue_key: str) -> None:
+        """
+        Wakes up a consumer blocked in `wait_message` on the queue list.
+        One token is enough, the consumer passes it on if more messages are left.
+        """
+        wake_key = self.generate_wake_key(queue_key)
+        pipe.rpush(wake_key, 1)
+        pipe.ltrim(wake_key, -1, -1)
+
+    def enqueue_message(
+        self, message: Message, dedup_window: float | None = None
+    ) -> str | None:
         data = Message.serialize(message)
-        self.client.set(key, data)
-        # This below Redis set will be monitored by master.
-        self.client.rpush(self.TASK_KEY, message.message_id)
+        queue_key = self.generate_queue_key(message.queue_name, message.priority)
+        if message.dedup_key is not None:
+            return self.enqueue_unique(message, data, queue_key, dedup_window)
+
+        pipe = self.client.pipeline()
+        if self.layout == QueueLayout.INLINE:
+            pipe.rpush(queue_key, data)
+        else:
+            pipe.set(self.generate_message_key(message.message_id), data)
+            # This below Redis list will be monitored by master.
+            pipe.rpush(queue_key, message.message_id)
+        self.signal(pipe, queue_key)
+        pipe.execute()
+        return None
+
+    def enqueue_unique(
+        self,
+        message: Message,
+        data: bytes | str,
+        queue_key: str,
+        dedup_window: float | None,
+    ) -> str | None:
+        """Enqueue the message and take its dedup key, unless the key is taken."""
+        record = message.message_id
+        ttl = self.DEDUP_PENDING_TTL
+        if dedup_window:
+            # marked, so that starting the task does not release the key.
+            record = f"{message.message_id} window"
+            ttl = dedup_window
+
+        keys = [
+            self.generate_dedup_key(message),
+            queue_key,
+            self.generate_wake_key(queue_key),
+        ]
+        entry = data
+        if self.layout == QueueLayout.KEYED:
+            keys.append(self.generate_message_key(message.message_id))
+            entry = message.message_id
+        # PX 0 is an error, a window below a millisecond still takes the key.
+        existing = self._dedup_enqueue(
+            keys=keys,
+            args=[record, max(1, math.ceil(ttl * 1000)), entry, data],
+        )
+        if existing is None:
+            return None
+        return cast(bytes, existing).decode().split(" ")[0]
 
-    def fetch_queued(self) -> list[bytes]:
-        return cast(list[bytes], self.client.lrange(self.TASK_KEY, 0, self.BATCH_SIZE))
+    def schedule_message(self, message: Message, run_at: float) -> None:
+        # always stored under the message key, whatever the layout, so the
+        # sorted set stays small. The queues accept both kinds of entries.
+        queue_key = self.generate_queue_key(message.queue_name, message.priority)
+        pipe = self.client.pipeline()
+        pipe.set(
+            self.generate_message_key(message.message_id), Message.serialize(message)
+        )
+        pipe.zadd(self.SCHEDULED_KEY, {f"{queue_key} {message.message_id}": run_at})
+        pipe.execute()
+
+    def promote_scheduled(self, now: float) -> tuple[int, float | None]:
+        moved, next_due = cast(
+            list,
+            self._promote_scheduled(
+                keys=[self.SCHEDULED_KEY],
+                args=[now, self.PROMOTE_BATCH_SIZE, self.WAKE_PREFIX],
+            ),
+        )
+        return moved, float(next_due) if next_due else None
+
+    def release_dedup_key(self, message: Message) -> None:
+        if message.dedup_key is None:
+            return
+        self._release_dedup(
+            keys=[self.generate_dedup_key(message)], args=[message.message_id]
+        )
+
+    def enqueue_messages(self, messages: Iterable[Message]) -> int:
+        count = 0
+        for batch in batched(messages, self.ENQUEUE_BATCH_SIZE):
+            # one transaction per batch, the whole batch is queued or none of it.
+            pipe = self.client.pipeline()
+            entries: dict[str, list[bytes | str]] = {}
+            for message in batch:
+                queue_key = self.generate_queue_key(
+                    message.queue_name, message.priority
+                )
+                data = Message.serialize(message)
+                if self.layout == QueueLayout.INLINE:
+                    entries.setdefault(queue_key, []).append(data)
+                    continue
+                pipe.set(self.generate_message_key(message.message_id), data)
+                entries.setdefault(queue_key, []).append(message.message_id)
+
+            for queue_key, queue_entries in entries.items():
+                pipe.rpush(queue_key, *queue_entries)
+                self.signal(pipe, queue_key)
+            pipe.execute()
+            count += len(batch)
+        return count
+
+    def fetch_queued(self, queue_name: str = DEFAULT_QUEUE_NAME) -> list[bytes]:
+        # NOTE: entries queued with the inline layout are serialized messages, not ids.
+        queued: list[bytes] = []
+        for queue_key in self.generate_queue_keys(queue_name):
+            remaining = self.BATCH_SIZE - len(queued)
+            if remaining <= 0:
+                break
+            # the end index is inclusive, and -1 would mean the whole list.
+            queued.extend(
+                cast(list[bytes], self.client.lrange(queue_key, 0, remaining - 1))
+            )
+        return queued
+
+    def queue_depth(self, queue_name: str = DEFAULT_QUEUE_NAME) -> int:
+        pipe = self.client.pipeline(transaction=False)
+        for queue_key in self.generate_queue_keys(queue_name):
+            pipe.llen(queue_key)
+        return sum(pipe.execute())
 
     def fetch_message(self, message_id: str) -> bytes:
+        # Only messages queued with the keyed layout can be looked up by id.
         key = self.generate_message_key(message_id)
         return cast(bytes, self.client.get(key))
 
-    def dequeue_message(self, message_id: str) -> bytes:
+    def dequeue_message(
+        self, message_id: str, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> bytes:
         key = self.generate_message_key(message_id)
         message = self.fetch_message(message_id)
         self.client.delete(key)
-        self.client.lrem(self.TASK_KEY, 0, message_id)
+        for queue_key in self.generate_queue_keys(queue_name):
+            self.client.lrem(queue_key, 0, message_id)
         return message
 
+    def pop_messages(
+        self, count: int, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> list[bytes]:
+        if count <= 0:
+            return []
+        return cast(
+            list[bytes],
+            self._pop_messages(
+                keys=self.generate_queue_keys(queue_name),
+                args=[count, self.MESSAGE_PREFIX],
+            ),
+        )
+
+    def requeue_messages(self, messages: list[bytes]) -> None:
+        entries: dict[str, list[bytes]] = {}
+        for data in messages:
+            message = Message.deserialize(data)
+            queue_key = self.generate_queue_key(message.queue_name, message.priority)
+            entries.setdefault(queue_key, []).append(data)
+        pipe = self.client.pipeline()
+        for queue_key, queue_entries in entries.items():
+            # pushed back inline, the queues accept both kinds of entries.
+            pipe.lpush(queue_key, *reversed(queue_entries))
+            self.signal(pipe, queue_key)
+        pipe.execute()
+
+    def wait_message(
+        self, queue_names: list[str], timeout: float
+    ) -> tuple[str, bytes] | None:
+        queue_keys = {
+            queue_key: queue_name
+            for queue_name in queue_names
+            for queue_key in self.generate_queue_keys(queue_name)
+        }
+        wake_keys = [self.generate_wake_key(queue_key) for queue_key in queue_keys]
+        deadline = time.monotonic() + timeout
+        while True:
+            # messages only ever leave the queues through a script, blocking
+            # on the queues themselves would pop an id apart from its payload.
+            popped = self._pop_first_message(
+                keys=list(queue_keys), args=[self.MESSAGE_PREFIX, self.WAKE_PREFIX]
+            )
+            if popped:
+                queue_key, message = cast(list[bytes], popped)
+                return queue_keys[queue_key.decode()], message
+            remaining = deadline - time.monotonic()
+            # a stale token, left by messages taken with `pop_messages`,
+            # only costs another look at the queues.
+            if remaining <= 0:
+                return None
+            # a zero timeout would block forever, so round it up to a millisecond.
+            if not self.client.blpop(wake_keys, timeout=max(remaining, 0.001)):
+                return None
+
     def flush(self) -> None:
         pattern = "rapidq*"
         pipe = self.client.pipeline()
@@ -0,0 +1,486 @@
+import math
+import os
+import socket
+import time
+from collections import deque
+from typing import Any, Iterable, cast
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+from redis import ResponseError
+
+from rapidq.broker.redis_broker import RedisBroker
+from rapidq.constants import DEFAULT_QUEUE_NAME
+from rapidq.message import Message
+from rapidq.utils import batched
+
+# Reads up to ARGV[3] messages for the consumer group ARGV[1] as the consumer
+# ARGV[2] from the streams KEYS[4..] (highest priority first), and returns
+# them as {stream, message} pairs. Each entry is recorded in the hash KEYS[1],
+# by message id, so that any process can acknowledge it.
+# KEYS[2] is the set of the streams the group was created on, see `maintain`.
+# Entries pending for more than ARGV[4] ms, left by a consumer that died, are
+# taken over with XAUTOCLAIM before the new ones are read. Only one consumer
+# at a time looks for them, every ARGV[5] ms, holding the key KEYS[3].
+STREAM_POP_SCRIPT = """
+local remaining = tonumber(ARGV[3])
+local messages = {}
+
+local function hand_out(key, entry)
+    -- fields are id, <message id>, message, <message>
+    redis.call('HSET', KEYS[1], entry[2][2], key .. ' ' .. entry[1])
+    table.insert(messages, {key, entry[2][4]})
+    remaining = remaining - 1
+end
+
+local reclaim = redis.call('SET', KEYS[3], ARGV[2], 'NX', 'PX', ARGV[5])
+for i = 4, #KEYS do
+    if remaining <= 0 then
+        break
+    end
+    local key = KEYS[i]
+    if redis.call('SADD', KEYS[2], key) == 1 then
+        -- from the start of the stream, the messages enqueued before count too.
+        redis.pcall('XGROUP', 'CREATE', key, ARGV[1], '0', 'MKSTREAM')
+    end
+    if reclaim then
+        local claimed = redis.pcall(
+            'XAUTOCLAIM', key, ARGV[1], ARGV[2], ARGV[4], '0-0', 'COUNT', remaining
+        )
+        if not (type(claimed) == 'table' and claimed.err) then
+            for _, entry in ipairs(claimed[2]) do
+                -- false for an entry trimmed by MAXLEN before it was acknowledged.
+                if entry then
+                    hand_out(key, entry)
+                end
+            end
+        end
+    end
+    if remaining > 0 then
+        local read = redis.pcall(
+            'XREADGROUP', 'GROUP', ARGV[1], ARGV[2], 'COUNT', remaining, 'STREAMS', key, '>'
+        )
+        if type(read) == 'table' and read.err then
+            -- the stream was deleted, the group is created again on the next call.
+            redis.call('SREM', KEYS[2], key)
+        elseif read then
+            for _, entry in ipairs(read[1][2]) do
+                hand_out(key, entry)
+            end
+        end
+    end
+end
+return messages
+"""
+
+# Acknowledges the entry recorded for the message id ARGV[2] in the hash KEYS[1]
+# for the group ARGV[1]. The entry stays in the stream until `maintain` trims it,
+# other groups may not have read it yet.
+STREAM_ACK_SCRIPT = """
+local entry = redis.call('HGET', KEYS[1], ARGV[2])
+if not entry then
+    return 0
+end
+redis.call('HDEL', KEYS[1], ARGV[2])
+local separator = string.find(entry, ' ', 1, true)
+return redis.call(
+    'XACK', string.sub(entry, 1, separator - 1), ARGV[1], string.sub(entry, separator + 1)
+)
+"""
+
+# Like DEDUP_ENQUEUE_SCRIPT, adds the message to the stream KEYS[2] unless the
+# dedup key KEYS[1] is taken.
+# ARGV: the dedup record, its ttl in milliseconds, the message id, the message
+# and the MAXLEN of the stream, 0 for none.
+STREAM_DEDUP_ENQUEUE_SCRIPT = """
+local existing = redis.call('GET', KEYS[1])
+if existing then
+    return existing
+end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+if ARGV[5] ~= '0' then
+    redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[5], '*', 'id', ARGV[3], 'message', ARGV[4])
+else
+    redis.call('XADD', KEYS[2], '*', 'id', ARGV[3], 'message', ARGV[4])
+end
+return false
+"""
+
+# Like PROMOTE_SCHEDULED_SCRIPT, with streams instead of lists.
+# ARGV[3] is the message key prefix and ARGV[4] the MAXLEN of the streams, 0 for none.
+STREAM_PROMOTE_SCHEDULED_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+for _, member in ipairs(due) do
+    local separator = string.find(member, ' ', 1, true)
+    local key = string.sub(member, 1, separator - 1)
+    local message_id = string.sub(member, separator + 1)
+    local message = redis.call('GETDEL', ARGV[3] .. message_id)
+    if message then
+        if ARGV[4] ~= '0' then
+            redis.call('XADD', key, 'MAXLEN', '~', ARGV[4], '*', 'id', message_id, 'message', message)
+        else
+            redis.call('XADD', key, '*', 'id', message_id, 'message', message)
+        end
+    end
+end
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+local next_due = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {#due, next_due[2] or false}
+"""
+
+# Housekeeping of the streams in the set KEYS[1], for the group ARGV[1].
+# - consumers of the group with nothing pending, idle for more than ARGV[2] ms,
+#   are removed.
+# - entries every group of the stream acknowledged are trimmed.
+# Returns the number of trimmed entries.
+STREAM_MAINTAIN_SCRIPT = """
+local function flat_to_table(flat)
+    local result = {}
+    for i = 1, #flat, 2 do
+        result[flat[i]] = flat[i + 1]
+    end
+    return result
+end
+
+local function parse_id(id)
+    local separator = string.find(id, '-', 1, true)
+    return tonumber(string.sub(id, 1, separator - 1)), tonumber(string.sub(id, separator + 1))
+end
+
+local trimmed = 0
+for _, key in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    local consumers = redis.pcall('XINFO', 'CONSUMERS', key, ARGV[1])
+    if type(consumers) == 'table' and consumers.err then
+        redis.call('SREM', KEYS[1], key)
+    else
+        for _, consumer in ipairs(consumers) do
+            consumer = flat_to_table(consumer)
+            if consumer['pending'] == 0 and consumer['idle'] > tonumber(ARGV[2]) then
+                redis.call('XGROUP', 'DELCONSUMER', key, ARGV[1], consumer['name'])
+            end
+        end
+
+        -- the oldest entry a group still needs: its oldest pending one, or the
+        -- one after the last it read.
+        local floor_ms, floor_seq
+        for _, group in ipairs(redis.call('XINFO', 'GROUPS', key)) do
+            group = flat_to_table(group)
+            local ms, seq
+            if group['pending'] > 0 then
+                ms, seq = parse_id(redis.call('XPENDING', key, group['name'])[2])
+            else
+                ms, seq = parse_id(group['last-delivered-id'])
+                seq = seq + 1
+            end
+            if not floor_ms or ms < floor_ms or (ms == floor_ms and seq < floor_seq) then
+                floor_ms, floor_seq = ms, seq
+            end
+        end
+        if floor_ms then
+            trimmed = trimmed + redis.call(
+                'XTRIM', key, 'MINID', string.format('%d-%d', floor_ms, floor_seq)
+            )
+        end
+    end
+end
+return trimmed
+"""
+
+
+class RedisStreamsBroker(RedisBroker):
+    """
+    A Broker that keeps the queues in Redis streams, read through a consumer group.
+    Every message is delivered once per group, so any number of masters, or
+    workers in direct mode, on any number of hosts share the queues.
+    A popped message stays pending until its task is acknowledged, messages
+    left pending for `claim_timeout` seconds by a consumer that died are
+    taken over by another one with XAUTOCLAIM.
+    Eg `redis+streams://localhost:6379/0?group=rapidq&claim_timeout=3600`.
+    """
+
+    SCHEME = "redis+streams"
+    DEFAULT_URL = "redis+streams://localhost:6379/0"
+    TASK_KEY = "rapidq.stream"
+    # message id -> "<stream> <entry id>", by group, see `ack_message`.
+    ACK_PREFIX = "rapidq.stream.acks|"
+    # the streams of a group, by group.
+    STREAMS_PREFIX = "rapidq.stream.groups|"
+    # held by the consumer looking for abandoned messages, by group.
+    RECLAIM_PREFIX = "rapidq.stream.reclaim|"
+    NEEDS_ACK = True
+    DEFAULT_GROUP = "rapidq"
+    CLAIM_TIMEOUT = 3600
+    # seconds between two housekeeping runs, see `maintain`, and between two
+    # looks for abandoned messages, see STREAM_POP_SCRIPT.
+    MAINTAIN_INTERVAL = 5
+    # `queue_depth` counts up to this many undelivered entries per stream on
+    # Redis < 7, which does not tell the lag of a group.
+    DEPTH_SCAN_LIMIT = 10000
+
+    def __init__(self, connection_params: dict[str, Any] | None = None) -> None:
+        connection_params = dict(connection_params or {})
+        url = connection_params.get(
+            "url", os.environ.get("RAPIDQ_BROKER_URL", self.DEFAULT_URL)
+        )
+        parsed = urlparse(url)
+        if not parsed.scheme.endswith("+streams"):
+            raise RuntimeError(f"not a {self.SCHEME}:// url: {url!r}")
+        options = dict(parse_qsl(parsed.query))
+        self.group: str = options.pop("group", self.DEFAULT_GROUP)
+        self.claim_timeout: float = float(
+            options.pop("claim_timeout", self.CLAIM_TIMEOUT)
+        )
+        # approximate, entries are trimmed even if a group did not read them.
+        self.maxlen: int = int(options.pop("maxlen", 0))
+        # the rest of the url is for redis-py.
+        connection_params["url"] = urlunparse(
+            parsed._replace(
+                scheme=parsed.scheme.removesuffix("+streams"), query=urlencode(options)
+            )
+        )
+        super().__init__(connection_params)
+
+        self.consumer: str = f"{socket.gethostname()}-{os.getpid()}"
+        self.ack_key: str = f"{self.ACK_PREFIX}{self.group}"
+        self.streams_key: str = f"{self.STREAMS_PREFIX}{self.group}"
+        self.reclaim_key: str = f"{self.RECLAIM_PREFIX}{self.group}"
+        # read by this consumer but not handed out yet, by queue name.
+        # Requeued messages wait here, a stream has no head to push them back to.
+        self.held: dict[str, deque[bytes]] = {}
+        self.next_maintenance: float = 0.0
+        self._stream_pop = self.client.register_script(STREAM_POP_SCRIPT)
+        self._stream_ack = self.client.register_script(STREAM_ACK_SCRIPT)
+        self._stream_dedup_enqueue = self.client.register_script(
+            STREAM_DEDUP_ENQUEUE_SCRIPT
+        )
+        self._stream_promote_scheduled = self.client.register_script(
+            STREAM_PROMOTE_SCHEDULED_SCRIPT
+        )
+        self._stream_maintain = self.client.register_script(STREAM_MAINTAIN_SCRIPT)
+
+    def add_to_stream(self, pipe: Any, message: Message) -> None:
+        pipe.xadd(
+            self.generate_queue_key(message.queue_name, message.priority),
+            {"id": message.message_id, "message": Message.serialize(message)},
+            maxlen=self.maxlen or None,
+            approximate=True,
+        )
+
+    def enqueue_message(
+        self, message: Message, dedup_window: float | None = None
+    ) -> str | None:
+        if message.dedup_key is None:
+            self.add_to_stream(self.client, message)
+            return None
+
+        record = message.message_id
+        ttl = self.DEDUP_PENDING_TTL
+        if dedup_window:
+            # marked, so that starting the task does not release the key.
+            record = f"{message.message_id} window"
+            ttl = dedup_window
+        existing = self._stream_dedup_enqueue(
+            keys=[
+                self.generate_dedup_key(message),
+                self.generate_queue_key(message.queue_name, message.priority),
+            ],
+            args=[
+                record,
+                max(1, math.ceil(ttl * 1000)),
+                message.message_id,
+                Message.serialize(message),
+                self.maxlen,
+            ],
+        )
+        if existing is None:
+            return None
+        return cast(bytes, existing).decode().split(" ")[0]
+
+    def promote_scheduled(self, now: float) -> tuple[int, float | None]:
+        # called regularly by every master, so the housekeeping runs here too.
+        if now >= self.next_maintenance:
+            self.maintain()
+            self.next_maintenance = now + self.MAINTAIN_INTERVAL
+        moved, next_due = cast(
+            list,
+            self._stream_promote_scheduled(
+                keys=[self.SCHEDULED_KEY],
+                args=[now, self.PROMOTE_BATCH_SIZE, self.MESSAGE_PREFIX, self.maxlen],
+            ),
+        )
+        return moved, float(next_due) if next_due else None
+
+    def maintain(self) -> int:
+        """
+        Trims the streams and forgets the consumers gone for good, see
+        STREAM_MAINTAIN_SCRIPT. Returns how many entries were trimmed.
+        """
+        return cast(
+            int,
+            self._stream_maintain(
+                keys=[self.streams_key],
+                args=[self.group, int(self.claim_timeout * 1000)],
+            ),
+        )
+
+    def enqueue_messages(self, messages: Iterable[Message]) -> int:
+        count = 0
+        for batch in batched(messages, self.ENQUEUE_BATCH_SIZE):
+            # one transaction per batch, the whole batch is queued or none of it.
+            pipe = self.client.pipeline()
+            for message in batch:
+                self.add_to_stream(pipe, message)
+            pipe.execute()
+            count += len(batch)
+        return count
+
+    def undelivered(self, stream: str, count: int) -> list[tuple[bytes, dict]]:
+        """Returns up to `count` entries of the stream the group did not read yet."""
+        try:
+            groups = self.client.xinfo_groups(stream)
+        except ResponseError:
+            # no such stream.
+            return []
+        start = "-"
+        for group in groups:
+            if group["name"].decode() == self.group:
+                start = "(" + group["last-delivered-id"].decode()
+        return cast(list, self.client.xrange(stream, min=start, count=count))
+
+    def fetch_queued(self, queue_name: str = DEFAULT_QUEUE_NAME) -> list[bytes]:
+        queued: list[bytes] = list(self.held.get(queue_name, ()))[: self.BATCH_SIZE]
+        for stream in self.generate_queue_keys(queue_name):
+            entries = self.undelivered(stream, self.BATCH_SIZE - len(queued))
+            queued.extend(fields[b"id"] for _, fields in entries)
+        return queued
+
+    def queue_depth(self, queue_name: str = DEFAULT_QUEUE_NAME) -> int:
+        depth = len(self.held.get(queue_name, ()))
+        for stream in self.generate_queue_keys(queue_name):
+            lag = None
+            try:
+                for group in self.client.xinfo_groups(stream):
+                    if group["name"].decode() == self.group:
+                        lag = group.get("lag")
+            except ResponseError:
+                continue
+            if lag is None:
+                lag = len(self.undelivered(stream, self.DEPTH_SCAN_LIMIT))
+            depth += lag
+        return depth
+
+    def dequeue_message(
+        self, message_id: str, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> bytes:
+        for stream in self.generate_queue_keys(queue_name):
+            for entry_id, fields in self.undelivered(stream, self.BATCH_SIZE):
+                if fields[b"id"].decode() == message_id:
+                    if self.client.xdel(stream, entry_id):
+                        return fields[b"message"]
+        return cast(bytes, None)
+
+    def read(self, count: int, streams: list[str]) -> list[tuple[str, bytes]]:
+        """Reads up to `count` new messages from the streams, in order."""
+        popped = self._stream_pop(
+            keys=[self.ack_key, self.streams_key, self.reclaim_key, *streams],
+            args=[
+                self.group,
+                self.consumer,
+                count,
+                int(self.claim_timeout * 1000),
+                int(self.MAINTAIN_INTERVAL * 1000),
+            ],
+        )
+        return [(stream.decode(), message) for stream, message in popped]
+
+    def take_held(self, count: int, queue_name: str) -> list[bytes]:
+        held = self.held.get(queue_name)
+        taken: list[bytes] = []
+        while held and len(taken) < count:
+            taken.append(held.popleft())
+        return taken
+
+    def pop_messages(
+        self, count: int, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> list[bytes]:
+        if count <= 0:
+            return []
+        messages = self.take_held(count, queue_name)
+        if len(messages) < count:
+            messages.extend(
+                message
+                for _, message in self.read(
+                    count - len(messages), self.generate_queue_keys(queue_name)
+                )
+            )
+        return messages
+
+    def requeue_messages(self, messages: list[bytes]) -> None:
+        # still pending for this consumer, so another one takes them over
+        # if this process dies before it gives them out.
+        for data in reversed(messages):
+            queue_name = Message.deserialize(data).queue_name
+            self.held.setdefault(queue_name, deque()).appendleft(data)
+
+    def wait_message(
+        self, queue_names: list[str], timeout: float
+    ) -> tuple[str, bytes] | None:
+        for queue_name in queue_names:
+            held = self.take_held(1, queue_name)
+            if held:
+                return queue_name, held[0]
+
+        streams = {
+            stream: queue_name
+            for queue_name in queue_names
+            for stream in self.generate_queue_keys(queue_name)
+        }
+        deadline = time.monotonic() + timeout
+        while True:
+            # also creates the groups the blocking read below needs.
+            popped = self.read(1, list(streams))
+            if popped:
+                stream, message = popped[0]
+                return streams[stream], message
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                # BLOCK 0 would block forever, so round it up to a millisecond.
+                read = self.client.xreadgroup(
+                    self.group,
+                    self.consumer,
+                    {stream: ">" for stream in streams},
+                    count=1,
+                    block=max(int(remaining * 1000), 1),
+                )
+            except ResponseError:
+                # the streams were deleted meanwhile, `read` creates them again.
+                continue
+            if not read:
+                return None
+
+            # a message per stream at most, the first one by priority is
+            # returned and the others are kept for the next call.
+            pipe = self.client.pipeline()
+            entries = {}
+            for stream, stream_entries in read:
+                stream = stream.decode()
+                for entry_id, fields in stream_entries:
+                    pipe.hset(
+                        self.ack_key, fields[b"id"], f"{stream} {entry_id.decode()}"
+                    )
+                    entries[stream] = fields[b"message"]
+            pipe.execute()
+            ordered = [stream for stream in streams if stream in entries]
+            for stream in ordered[1:]:
+                self.held.setdefault(streams[stream], deque()).append(entries[stream])
+            return streams[ordered[0]], entries[ordered[0]]
+
+    def ack_message(self, message: Message) -> None:
+        self._stream_ack(keys=[self.ack_key], args=[self.group, message.message_id])
+
+    def flush(self) -> None:
+        self.held.clear()
+        super().flush()
@@ -0,0 +1,339 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator
+from urllib.parse import parse_qs, unquote, urlparse
+
+from rapidq.broker.base import Broker, serialize_message
+from rapidq.constants import DEFAULT_QUEUE_NAME
+from rapidq.message import Message
+
+# `run_at` is set while a message is scheduled, `claimed_at` once it is popped,
+# until its task is acknowledged. The rest are ready, in the `messages_ready` index.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    message_id TEXT NOT NULL,
+    queue_name TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    run_at REAL,
+    claimed_at REAL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_ready
+    ON messages (queue_name, priority DESC, id)
+    WHERE run_at IS NULL AND claimed_at IS NULL;
+CREATE INDEX IF NOT EXISTS messages_scheduled
+    ON messages (run_at) WHERE run_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS messages_claimed
+    ON messages (claimed_at) WHERE claimed_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS messages_message_id ON messages (message_id);
+CREATE TABLE IF NOT EXISTS dedup (
+    key TEXT PRIMARY KEY,
+    message_id TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    held INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+READY = "run_at IS NULL AND claimed_at IS NULL"
+
+CLAIM_SQL = f"""
+UPDATE messages SET claimed_at = ?
+WHERE id IN (
+    SELECT id FROM messages WHERE queue_name = ? AND {READY}
+    ORDER BY priority DESC, id LIMIT ?
+)
+RETURNING id, priority, data
+"""
+
+
+class SqliteBroker(Broker):
+    """
+    A Broker that keeps the queues in a SQLite database in WAL mode,
+    for a single host without Redis. Messages survive restarts.
+    A popped message is only claimed, it is deleted once its task is
+    acknowledged. Claims older than `claim_timeout` seconds, left by a
+    consumer that died, are handed out again.
+    Eg `sqlite:////var/lib/rapidq/queue.db?claim_timeout=600`.
+    """
+
+    SCHEME = "sqlite"
+    DEFAULT_URL = "sqlite:///rapidq.db"
+    NEEDS_ACK = True
+    # a dedup key is released when its task starts, the expiry only
+    # covers messages that never run.
+    DEDUP_PENDING_TTL = 24 * 3600
+    CLAIM_TIMEOUT = 3600
+    PROMOTE_BATCH_SIZE = 1000
+    BATCH_SIZE = 100
+    # how often `wait_message` looks for a commit of another connection.
+    POLL_INTERVAL = 0.01
+
+    def __init__(self, connection_params: dict[str, Any] | None = None) -> None:
+        connection_params = connection_params or {}
+        url = connection_params.get(
+            "url", os.environ.get("RAPIDQ_BROKER_URL", self.DEFAULT_URL)
+        )
+        parsed = urlparse(url)
+        if parsed.scheme != self.SCHEME:
+            raise RuntimeError(f"not a {self.SCHEME}:// url: {url!r}")
+        # like SQLAlchemy, `sqlite:///name.db` is relative, `sqlite:////name.db` absolute.
+        self.path: str = unquote(parsed.path[1:]) or "rapidq.db"
+        options = parse_qs(parsed.query)
+        self.claim_timeout: float = float(
+            options.get("claim_timeout", [self.CLAIM_TIMEOUT])[0]
+        )
+
+        # autocommit, transactions are opened explicitly, see `transaction`.
+        self.connection = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        # shared by the threads of a worker.
+        self.lock = threading.Lock()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        # no fsync on commit, a commit is only lost if the host itself crashes.
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.transaction() as connection:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """A write transaction, it takes the database lock right away."""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            self.connection.execute("COMMIT")
+
+    def query(self, sql: str, params: tuple = ()) -> list[tuple]:
+        with self.lock:
+            return self.connection.execute(sql, params).fetchall()
+
+    def is_alive(self) -> bool:
+        try:
+            self.query("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def generate_dedup_key(self, message: Message) -> str:
+        return f"{message.task_name}|{message.dedup_key}"
+
+    def insert(self, connection: sqlite3.Connection, message: Message) -> None:
+        connection.execute(
+            "INSERT INTO messages (message_id, queue_name, priority, data)"
+            " VALUES (?, ?, ?, ?)",
+            (
+                message.message_id,
+                message.queue_name,
+                message.priority,
+                serialize_message(message),
+            ),
+        )
+
+    def enqueue_message(
+        self, message: Message, dedup_window: float | None = None
+    ) -> str | None:
+        with self.transaction() as connection:
+            if message.dedup_key is not None:
+                now = time.time()
+                key = self.generate_dedup_key(message)
+                existing = connection.execute(
+                    "SELECT message_id FROM dedup WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if existing:
+                    return existing[0]
+                connection.execute(
+                    "INSERT OR REPLACE INTO dedup VALUES (?, ?, ?, ?)",
+                    (
+                        key,
+                        message.message_id,
+                        now + (dedup_window or self.DEDUP_PENDING_TTL),
+                        bool(dedup_window),
+                    ),
+                )
+            self.insert(connection, message)
+        return None
+
+    def schedule_message(self, message: Message, run_at: float) -> None:
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT INTO messages (message_id, queue_name, priority, run_at, data)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (
+                    message.message_id,
+                    message.queue_name,
+                    message.priority,
+                    run_at,
+                    serialize_message(message),
+                ),
+            )
+
+    def promote_scheduled(self, now: float) -> tuple[int, float | None]:
+        with self.transaction() as connection:
+            due = connection.execute(
+                "SELECT id FROM messages WHERE run_at IS NOT NULL AND run_at <= ?"
+                " ORDER BY run_at LIMIT ?",
+                (now, self.PROMOTE_BATCH_SIZE),
+            ).fetchall()
+            if due:
+                # at the tail of their queue, like a message enqueued now.
+                (last,) = connection.execute("SELECT MAX(id) FROM messages").fetchone()
+                connection.executemany(
+                    "UPDATE messages SET run_at = NULL, id = ? WHERE id = ?",
+                    ((last + index, id_) for index, (id_,) in enumerate(due, 1)),
+                )
+            # the claims of consumers that died are handed out again.
+            connection.execute(
+                "UPDATE messages SET claimed_at = NULL"
+                " WHERE claimed_at IS NOT NULL AND claimed_at < ?",
+                (now - self.claim_timeout,),
+            )
+            connection.execute("DELETE FROM dedup WHERE expires_at <= ?", (now,))
+            next_due = connection.execute(
+                "SELECT MIN(run_at) FROM messages WHERE run_at IS NOT NULL"
+            ).fetchone()[0]
+        return len(due), next_due
+
+    def release_dedup_key(self, message: Message) -> None:
+        if message.dedup_key is None:
+            return
+        with self.transaction() as connection:
+            connection.execute(
+                "DELETE FROM dedup WHERE key = ? AND message_id = ? AND NOT held",
+                (self.generate_dedup_key(message), message.message_id),
+            )
+
+    def enqueue_messages(self, messages: Iterable[Message]) -> int:
+        count = 0
+        # a single transaction, so a single commit for the whole batch.
+        with self.transaction() as connection:
+            for message in messages:
+                self.insert(connection, message)
+                count += 1
+        return count
+
+    def fetch_queued(self, queue_name: str = DEFAULT_QUEUE_NAME) -> list[bytes]:
+        rows = self.query(
+            f"SELECT message_id FROM messages WHERE queue_name = ? AND {READY}"
+            " ORDER BY priority DESC, id LIMIT ?",
+            (queue_name, self.BATCH_SIZE),
+        )
+        return [message_id.encode() for (message_id,) in rows]
+
+    def queue_depth(self, queue_name: str = DEFAULT_QUEUE_NAME) -> int:
+        return self.query(
+            f"SELECT COUNT(*) FROM messages WHERE queue_name = ? AND {READY}",
+            (queue_name,),
+        )[0][0]
+
+    def fetch_message(self, message_id: str) -> bytes:
+        rows = self.query(
+            f"SELECT data FROM messages WHERE message_id = ? AND {READY} LIMIT 1",
+            (message_id,),
+        )
+        return rows[0][0] if rows else None
+
+    def dequeue_message(
+        self, message_id: str, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> bytes:
+        with self.transaction() as connection:
+            row = connection.execute(
+                "UPDATE messages SET claimed_at = ? WHERE id = ("
+                "SELECT id FROM messages WHERE message_id = ? AND queue_name = ?"
+                f" AND {READY} LIMIT 1) RETURNING data",
+                (time.time(), message_id, queue_name),
+            ).fetchone()
+        return row[0] if row else None
+
+    def claim(
+        self, connection: sqlite3.Connection, count: int, queue_name: str
+    ) -> list[bytes]:
+        rows = connection.execute(
+            CLAIM_SQL, (time.time(), queue_name, count)
+        ).fetchall()
+        # RETURNING gives the rows in no particular order.
+        rows.sort(key=lambda row: (-row[1], row[0]))
+        return [row[2] for row in rows]
+
+    def pop_messages(
+        self, count: int, queue_name: str = DEFAULT_QUEUE_NAME
+    ) -> list[bytes]:
+        if count <= 0:
+            return []
+        with self.transaction() as connection:
+            return self.claim(connection, count, queue_name)
+
+    def requeue_messages(self, messages: list[bytes]) -> None:
+        with self.transaction() as connection:
+            # the last one first, each goes ahead of everything else.
+            for data in reversed(messages):
+                message = Message.deserialize(data)
+                (first,) = connection.execute("SELECT MIN(id) FROM messages").fetchone()
+                position = 0 if first is None else first - 1
+                updated = connection.execute(
+                    "UPDATE messages SET claimed_at = NULL, id = ?"
+                    " WHERE message_id = ? AND claimed_at IS NOT NULL",
+                    (position, message.message_id),
+                ).rowcount
+                if not updated:
+                    connection.execute(
+                        "INSERT INTO messages"
+                        " (id, message_id, queue_name, priority, data)"
+                        " VALUES (?, ?, ?, ?, ?)",
+                        (
+                            position,
+                            message.message_id,
+                            message.queue_name,
+                            message.priority,
+                            data,
+                        ),
+                    )
+
+    def wait_message(
+        self, queue_names: list[str], timeout: float
+    ) -> tuple[str, bytes] | None:
+        deadline = time.monotonic() + timeout
+        version = None
+        while True:
+            # data_version changes with every commit of another connection,
+            # total_changes with the writes of this one, from another thread.
+            # Both are cheap to read, so the queues are only looked at once
+            # something was written.
+            with self.lock:
+                current = (
+                    self.connection.execute("PRAGMA data_version").fetchone()[0],
+                    self.connection.total_changes,
+                )
+            if current != version:
+                version = current
+                with self.transaction() as connection:
+                    for queue_name in queue_names:
+                        claimed = self.claim(connection, 1, queue_name)
+                        if claimed:
+                            return queue_name, claimed[0]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.POLL_INTERVAL, remaining))
+
+    def ack_message(self, message: Message) -> None:
+        with self.transaction() as connection:
+            connection.execute(
+                "DELETE FROM messages WHERE message_id = ? AND claimed_at IS NOT NULL",
+                (message.message_id,),
+            )
+
+    def flush(self) -> None:
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM messages")
+            connection.execute("DELETE FROM dedup")
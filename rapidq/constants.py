@@ -4,6 +4,75 @@ from multiprocessing import cpu_count
 class Serialization:
     PICKLE: str = "pickle"
     JSON: str = "json"
+    # fixed header followed by length prefixed fields, see `BinaryMessage`.
+    BINARY: str = "binary"
+
+
+class Compression:
+    NONE: str = "none"
+    ZLIB: str = "zlib"
+    LZMA: str = "lzma"
+
+
+class BlobStorage:
+    # large arguments travel inside the message.
+    NONE: str = "none"
+    FILESYSTEM: str = "filesystem"
+    SHARED_MEMORY: str = "shared_memory"
+
+
+class ResultStorage:
+    # task results are thrown away.
+    NONE: str = "none"
+    REDIS: str = "redis"
+
+
+class TaskStatus:
+    SUCCESS: str = "success"
+    FAILURE: str = "failure"
+
+
+class QueueLayout:
+    # message body is stored under its own key, the queue holds the message id.
+    KEYED: str = "keyed"
+    # the serialized message is pushed onto the queue itself.
+    INLINE: str = "inline"
+
+
+class ConsumeMode:
+    # the master fetches messages and hands them over to the workers.
+    RELAY: str = "relay"
+    # every worker fetches messages from the broker by itself.
+    DIRECT: str = "direct"
+
+
+class Priority:
+    # order in which messages of the same queue are consumed.
+    LOW: int = 0
+    NORMAL: int = 1
+    HIGH: int = 2
+
+
+class QueueStrategy:
+    # always drain the queues in the given order.
+    PRIORITY: str = "priority"
+    # share the workers between queues, proportional to the queue weights.
+    WEIGHTED: str = "weighted"
+
+
+class ConcurrencyMode:
+    # a worker process runs one task at a time.
+    PROCESS: str = "process"
+    # a worker process runs tasks in a pool of threads, for I/O bound tasks.
+    THREADS: str = "threads"
+    # a worker process runs an asyncio event loop, for `async def` tasks.
+    ASYNCIO: str = "asyncio"
+
+
+class LogFormat:
+    TEXT: str = "text"
+    # one JSON object per line.
+    JSON: str = "json"
 
 
 class WorkerState:
@@ -11,11 +80,52 @@ class WorkerState:
     IDLE: int = 1
     BUSY: int = 2
     SHUTDOWN: int = 3
+    # reached its task or memory limit, finishing what it holds before exiting.
+    RECYCLING: int = 4
 
 
 DEFAULT_SERIALIZATION: str = Serialization.PICKLE
+DEFAULT_COMPRESSION: str = Compression.NONE
+# serialized messages smaller than this many bytes are sent uncompressed.
+DEFAULT_COMPRESSION_THRESHOLD: int = 16 * 1024
+DEFAULT_COMPRESSION_LEVEL: int = 6
+DEFAULT_BLOB_STORE: str = BlobStorage.NONE
+# arguments of at least this many bytes are offloaded to the blob store.
+DEFAULT_BLOB_THRESHOLD: int = 1024 * 1024
+DEFAULT_RESULT_BACKEND: str = ResultStorage.NONE
+# seconds a task result is kept.
+DEFAULT_RESULT_TTL: int = 3600
+DEFAULT_QUEUE_LAYOUT: str = QueueLayout.KEYED
 DEFAULT_QUEUE_NAME: str = "default"
+DEFAULT_PRIORITY: int = Priority.NORMAL
+DEFAULT_QUEUE_STRATEGY: str = QueueStrategy.PRIORITY
+DEFAULT_CONSUME_MODE: str = ConsumeMode.RELAY
+# how many messages a worker slot can hold at once, including the running one.
+DEFAULT_PREFETCH: int = 1
+# messages the queue of a worker can hold, the prefetch limit is capped to it.
+DEFAULT_WORKER_QUEUE_SIZE: int = 250
+DEFAULT_CONCURRENCY_MODE: str = ConcurrencyMode.PROCESS
+DEFAULT_THREADS: int = 10
+# the number of tasks an asyncio worker runs at once.
+DEFAULT_ASYNC_LIMIT: int = 100
 DEFAULT_IDLE_TIME: float = 0.5  # 500ms
+# seconds between two autoscaling decisions.
+DEFAULT_SCALE_INTERVAL: float = 1.0
+DEFAULT_SCALE_UP_DELAY: float = 1.0
+# seconds a worker stays idle before the autoscaler stops it.
+DEFAULT_SCALE_COOLDOWN: float = 30.0
+# failed tasks are not retried unless the task asks for it.
+DEFAULT_MAX_RETRIES: int = 0
+DEFAULT_RETRY_BACKOFF: float = 1.0
+DEFAULT_RETRY_BACKOFF_MAX: float = 600.0
 DEFAULT_AUTO_DISCOVER_MODULES: tuple = ("tasks",)
+DEFAULT_LOG_LEVEL: str = "INFO"
+DEFAULT_LOG_FORMAT: str = LogFormat.TEXT
+# share of the per-task log lines that are written.
+DEFAULT_LOG_SAMPLE_RATE: float = 1.0
+# the metrics endpoint only listens locally unless told otherwise.
+DEFAULT_METRICS_HOST: str = "127.0.0.1"
+# the number of distinct task names the metrics keep track of.
+DEFAULT_METRICS_TASKS: int = 256
 
 CPU_COUNT: int = min(4, cpu_count())
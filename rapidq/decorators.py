@@ -1,10 +1,23 @@
+import hashlib
+import json
+import time
+from datetime import datetime
 from functools import wraps
-from typing import Any, Callable
+from typing import Any, Callable, Iterable
 
+from rapidq.blob import BlobStore, get_blob_store
 from rapidq.broker import Broker, get_broker
-from rapidq.constants import DEFAULT_QUEUE_NAME
+from rapidq.constants import (
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_PRIORITY,
+    DEFAULT_QUEUE_NAME,
+    DEFAULT_RETRY_BACKOFF,
+    DEFAULT_RETRY_BACKOFF_MAX,
+    Priority,
+)
 from rapidq.message import Message
 from rapidq.registry import TaskRegistry
+from rapidq.retry import RetryPolicy
 
 
 class BackGroundTask:
@@ -12,36 +25,211 @@ class BackGroundTask:
         self,
         func: Callable[..., Any],
         name: str,
-        broker: Broker,
+        broker: Broker | None = None,
+        queue_name: str = DEFAULT_QUEUE_NAME,
+        priority: int = DEFAULT_PRIORITY,
+        blob_store: BlobStore | None = None,
+        retry_policy: RetryPolicy | None = None,
     ) -> None:
         self.func = func
         func_name = getattr(func, "__name__", None)
         self.name = name or f"{func.__module__}.{func_name}"
-        self.broker = broker
+        # None looks them up on every enqueue, so a task decorated before a fork
+        # uses the connections of the process it is enqueued from.
+        self._broker = broker
+        self.queue_name = queue_name
+        self.priority = validate_priority(priority)
+        self._blob_store = blob_store
+        self.retry_policy = retry_policy
         # registers the task for calling later via name.
         TaskRegistry.register(self)
 
     def __call__(self, *args, **kwargs) -> Any:
         return self.func(*args, **kwargs)
 
+    @property
+    def broker(self) -> Broker:
+        return self._broker if self._broker is not None else get_broker()
+
+    @property
+    def blob_store(self) -> BlobStore | None:
+        return self._blob_store if self._blob_store is not None else get_blob_store()
+
+    def _create_message(
+        self,
+        args: tuple,
+        kwargs: dict[str, Any],
+        queue: str | None = None,
+        priority: int | None = None,
+        dedup_key: str | None = None,
+    ) -> Message:
+        blob_ref = None
+        blob_store = self.blob_store
+        if blob_store is not None:
+            blob_ref = blob_store.offload(args, kwargs)
+            if blob_ref is not None:
+                # the message only carries the claim check.
+                args, kwargs = (), {}
+        return Message(
+            task_name=self.name,
+            queue_name=queue or self.queue_name,
+            args=args,
+            kwargs=kwargs,
+            priority=self.priority if priority is None else priority,
+            blob_ref=blob_ref,
+            dedup_key=dedup_key,
+            enqueued_at=time.time(),
+        )
+
     def enqueue(self, *args, **kwargs) -> Message:
         """Enqueue the task for execution by a worker."""
-        message = Message(
-            task_name=self.name,
-            queue_name=DEFAULT_QUEUE_NAME,
+        return self.apply_async(args=args, kwargs=kwargs)
+
+    def apply_async(
+        self,
+        args: tuple = (),
+        kwargs: dict[str, Any] | None = None,
+        queue: str | None = None,
+        priority: int | None = None,
+        dedup_key: str | bool | None = None,
+        dedup_window: float | None = None,
+        eta: datetime | float | None = None,
+        countdown: float | None = None,
+    ) -> Message:
+        """
+        Enqueue the task, with options for this call only.
+        `queue` and `priority` override the ones given to the task decorator.
+        With a `dedup_key`, the message is dropped if a message of this task with
+        the same key is still pending, or was enqueued less than `dedup_window`
+        seconds ago. `dedup_key=True` derives the key from the arguments.
+        A dropped message gets the id of the message it duplicates.
+        `eta` (a datetime or unix timestamp) or `countdown` (seconds from now)
+        delay the task, it is queued once it is due.
+        """
+        if priority is not None:
+            validate_priority(priority)
+        if dedup_window is not None and not dedup_key:
+            raise RuntimeError("dedup_window needs a dedup_key.")
+        if dedup_window is not None and dedup_window <= 0:
+            raise RuntimeError("dedup_window must be greater than 0.")
+        run_at = scheduled_time(eta=eta, countdown=countdown)
+        if run_at is not None and dedup_key:
+            raise RuntimeError("dedup_key can not be used with eta or countdown.")
+        args, kwargs = tuple(args), kwargs or {}
+        if dedup_key is True:
+            dedup_key = arguments_hash(args, kwargs)
+        message = self._create_message(
             args=args,
             kwargs=kwargs,
+            queue=queue,
+            priority=priority,
+            dedup_key=dedup_key or None,
         )
-        self.broker.enqueue_message(message)
+        if run_at is not None and run_at > message.enqueued_at:
+            # its time in the queue counts from when it is due.
+            message.enqueued_at = run_at
+            self.broker.schedule_message(message, run_at=run_at)
+            return message
+
+        duplicate_of = self.broker.enqueue_message(message, dedup_window=dedup_window)
+        if duplicate_of is not None:
+            if message.blob_ref is not None:
+                self.blob_store.delete(message.blob_ref)
+            message.message_id = duplicate_of
         return message
 
+    def enqueue_many(
+        self,
+        arguments: Iterable[tuple | dict[str, Any]],
+        queue: str | None = None,
+        priority: int | None = None,
+    ) -> int:
+        """
+        Enqueue the task once for every item in `arguments`.
+        An item is either a tuple of positional arguments or a dict of keyword arguments.
+        Messages are created lazily and sent to the broker in batches,
+        so `arguments` can be a generator of any size.
+        Returns the number of enqueued messages.
+        """
+        if priority is not None:
+            validate_priority(priority)
+        messages = (
+            (
+                self._create_message(
+                    args=(), kwargs=item, queue=queue, priority=priority
+                )
+                if isinstance(item, dict)
+                else self._create_message(
+                    args=tuple(item), kwargs={}, queue=queue, priority=priority
+                )
+            )
+            for item in arguments
+        )
+        return self.broker.enqueue_messages(messages)
+
     def delay(self, *args, **kwargs) -> Message:
         """Alias for `enqueue` provided for Celery compatibility."""
         return self.enqueue(*args, **kwargs)
 
 
-def background_task(name: str) -> Callable[[Callable[..., Any]], BackGroundTask]:
-    """Decorator for callables to be registered as task."""
+def scheduled_time(
+    eta: datetime | float | None = None, countdown: float | None = None
+) -> float | None:
+    """The unix timestamp a task is due at, None to run it right away."""
+    if eta is not None and countdown is not None:
+        raise RuntimeError("Give either eta or countdown, not both.")
+    if countdown is not None:
+        return time.time() + countdown
+    if isinstance(eta, datetime):
+        # naive datetimes are in local time.
+        return eta.timestamp()
+    return eta
+
+
+def arguments_hash(args: tuple, kwargs: dict[str, Any]) -> str:
+    """
+    Stable hash of task arguments, the same in every process.
+    Arguments that are not JSON serializable are hashed by their `repr`.
+    """
+    data = json.dumps(
+        [args, kwargs], sort_keys=True, separators=(",", ":"), default=repr
+    )
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def validate_priority(priority: int) -> int:
+    if priority not in (Priority.LOW, Priority.NORMAL, Priority.HIGH):
+        raise RuntimeError(
+            f"priority must be one of {[Priority.LOW, Priority.NORMAL, Priority.HIGH]}"
+        )
+    return priority
+
+
+def background_task(
+    name: str,
+    queue: str = DEFAULT_QUEUE_NAME,
+    priority: int = DEFAULT_PRIORITY,
+    max_retries: int = DEFAULT_MAX_RETRIES,
+    retry_on: tuple[type[BaseException], ...] = (Exception,),
+    retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+    retry_backoff_max: float = DEFAULT_RETRY_BACKOFF_MAX,
+    retry_jitter: bool = True,
+) -> Callable[[Callable[..., Any]], BackGroundTask]:
+    """
+    Decorator for callables to be registered as task.
+    `queue` and `priority` are the defaults for every enqueue of the task.
+    A task raising one of `retry_on` is enqueued again, up to `max_retries` times,
+    after `retry_backoff` seconds doubling with every retry (see `RetryPolicy`).
+    """
+    retry_policy = None
+    if max_retries > 0:
+        retry_policy = RetryPolicy(
+            max_retries=max_retries,
+            retry_on=retry_on,
+            backoff=retry_backoff,
+            backoff_max=retry_backoff_max,
+            jitter=retry_jitter,
+        )
 
     def decorator(func) -> BackGroundTask:
         if not name:
@@ -51,11 +239,12 @@ def background_task(name: str) -> Callable[[Callable[..., Any]], BackGroundTask]
 
         @wraps(func)
         def wrapped_func(*args, **kwargs) -> BackGroundTask:
-            broker = get_broker()
             return BackGroundTask(
                 func=func,
                 name=name,
-                broker=broker,
+                queue_name=queue,
+                priority=priority,
+                retry_policy=retry_policy,
             )
 
         return wrapped_func(func)
@@ -0,0 +1,168 @@
+import copy
+import json
+import logging
+import sys
+import zlib
+from logging.handlers import QueueHandler, QueueListener
+from multiprocessing import Queue
+from queue import SimpleQueue
+
+from rapidq.constants import (
+    DEFAULT_LOG_FORMAT,
+    DEFAULT_LOG_LEVEL,
+    DEFAULT_LOG_SAMPLE_RATE,
+    LogFormat,
+)
+
+# components with their own level, each one is a child of the `rapidq` logger.
+COMPONENTS: tuple[str, ...] = ("master", "worker", "task")
+LOGGER_NAME: str = "rapidq"
+
+master_log: logging.Logger = logging.getLogger(f"{LOGGER_NAME}.master")
+worker_log: logging.Logger = logging.getLogger(f"{LOGGER_NAME}.worker")
+# a line or two for every task, see `LogConfig.sample_rate`.
+task_log: logging.Logger = logging.getLogger(f"{LOGGER_NAME}.task")
+
+TEXT_FORMAT: str = (
+    "%(asctime)s %(levelname)s %(processName)s [PID: %(process)d]: %(message)s"
+)
+EXCEPTION_FORMATTER: logging.Formatter = logging.Formatter()
+
+
+class LogConfig:
+    """
+    How the master and the workers log.
+    `levels` maps a component, or `*` for all of them, to a level name.
+    The per-task lines below WARNING are logged for `sample_rate` of the messages.
+    """
+
+    def __init__(
+        self,
+        levels: dict[str, str] | None = None,
+        format: str = DEFAULT_LOG_FORMAT,
+        sample_rate: float = DEFAULT_LOG_SAMPLE_RATE,
+    ) -> None:
+        if format not in (LogFormat.TEXT, LogFormat.JSON):
+            raise RuntimeError(
+                f"log format must be in {[LogFormat.TEXT, LogFormat.JSON]}"
+            )
+        self.levels: dict[str, str] = {"*": DEFAULT_LOG_LEVEL, **(levels or {})}
+        self.format: str = format
+        self.sample_rate: float = sample_rate
+
+    def level_of(self, component: str) -> str:
+        return self.levels.get(component, self.levels["*"]).upper()
+
+    def sampled(self, message_id: str) -> bool:
+        """
+        True for the share of messages whose lines are kept.
+        Decided by the message id, so the lines of a message are kept together.
+        """
+        if self.sample_rate >= 1.0:
+            return True
+        return zlib.crc32(message_id.encode()) < self.sample_rate * 2**32
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a JSON object on a single line."""
+
+    # attributes of every record, anything else was passed with `extra`.
+    RESERVED = frozenset(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.processName,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.RESERVED:
+                data[key] = value
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = self.formatException(record.exc_info)
+        if exc_text:
+            data["exc_info"] = exc_text
+        if record.stack_info:
+            data["stack_info"] = record.stack_info
+        return json.dumps(data, default=str)
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    Puts records on the queue with the traceback in `exc_text`, apart from the
+    message. `QueueHandler` folds it into the message, which leaves the JSON
+    format nothing to put in its own field.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        # the arguments and the traceback may not pickle.
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class BatchStreamHandler(logging.StreamHandler):
+    """
+    Writes the records handed over by the listeners, and flushes only once
+    the queues are drained, so a burst of records costs a single write.
+    """
+
+    def __init__(self, queues: "list[Queue | SimpleQueue]", stream=None) -> None:
+        super().__init__(stream or sys.stdout)
+        self.queues: list[Queue | SimpleQueue] = queues
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            if all(log_queue.empty() for log_queue in self.queues):
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+def configure_logging(config: LogConfig, log_queue: "Queue | SimpleQueue") -> None:
+    """
+    Sends the records of the `rapidq` loggers of this process to `log_queue`.
+    Putting a record on the queue does not wait for any I/O.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(RecordQueueHandler(log_queue))
+    logger.setLevel(config.level_of("*"))
+    # the application decides what happens to its own records.
+    logger.propagate = False
+    for component in COMPONENTS:
+        logging.getLogger(f"{LOGGER_NAME}.{component}").setLevel(
+            config.level_of(component)
+        )
+
+
+def start_log_listeners(
+    config: LogConfig, log_queue: Queue, local_queue: SimpleQueue
+) -> list[QueueListener]:
+    """
+    Starts the single writer of the records of every process.
+    `log_queue` brings the records of the workers and `local_queue` the ones
+    of the master. The master does not put its own records on `log_queue`,
+    a KeyboardInterrupt in the middle of `Queue.put` can leave its lock held.
+    """
+    handler = BatchStreamHandler([log_queue, local_queue])
+    if config.format == LogFormat.JSON:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    listeners = [QueueListener(log_queue, handler), QueueListener(local_queue, handler)]
+    for listener in listeners:
+        listener.start()
+    return listeners
@@ -1,18 +1,64 @@
+import gc
+import logging
+import math
 import os
 import queue
+import signal
 import sys
 import time
-from multiprocessing import Event, Process, Queue, Value, set_start_method
+from logging.handlers import QueueListener
+from multiprocessing import (
+    Event,
+    Process,
+    Queue,
+    Value,
+    current_process,
+    set_start_method,
+)
+from multiprocessing.connection import wait
 from multiprocessing.sharedctypes import Synchronized
 from multiprocessing.synchronize import Event as SyncEvent
 from typing import Any, Callable
 
+from rapidq.autoscale import Autoscaler
 from rapidq.broker import Broker, get_broker
-from rapidq.constants import CPU_COUNT, DEFAULT_IDLE_TIME, WorkerState
+from rapidq.constants import (
+    CPU_COUNT,
+    DEFAULT_ASYNC_LIMIT,
+    DEFAULT_CONCURRENCY_MODE,
+    DEFAULT_CONSUME_MODE,
+    DEFAULT_IDLE_TIME,
+    DEFAULT_LOG_FORMAT,
+    DEFAULT_LOG_SAMPLE_RATE,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_METRICS_HOST,
+    DEFAULT_PRIORITY,
+    DEFAULT_QUEUE_NAME,
+    DEFAULT_QUEUE_STRATEGY,
+    DEFAULT_RETRY_BACKOFF,
+    DEFAULT_RETRY_BACKOFF_MAX,
+    DEFAULT_SCALE_COOLDOWN,
+    DEFAULT_SCALE_INTERVAL,
+    DEFAULT_THREADS,
+    DEFAULT_WORKER_QUEUE_SIZE,
+    ConcurrencyMode,
+    ConsumeMode,
+    WorkerState,
+)
 from rapidq.decorators import BackGroundTask
 from rapidq.decorators import background_task as task_decorator
+from rapidq.log import (
+    LogConfig,
+    configure_logging,
+    master_log,
+    start_log_listeners,
+)
+from rapidq.message import Message
+from rapidq.metrics import Metrics, serve_metrics
+from rapidq.queues import QueueScheduler
 from rapidq.utils import import_module
-from rapidq.worker.process_worker import Worker
+from rapidq.worker.async_worker import AsyncWorker
+from rapidq.worker.process_worker import Worker, initialize_framework_loaders
 
 
 class RapidQ:
@@ -23,11 +69,69 @@ class RapidQ:
     """
 
     def __init__(
-        self, workers: int = CPU_COUNT, module_name: str = "", init_as_app: bool = False
+        self,
+        workers: int = CPU_COUNT,
+        module_name: str = "",
+        init_as_app: bool = False,
+        consume_mode: str = DEFAULT_CONSUME_MODE,
+        prefetch: dict[str, int] | None = None,
+        queues: dict[str, int] | None = None,
+        queue_strategy: str = DEFAULT_QUEUE_STRATEGY,
+        concurrency_mode: str = DEFAULT_CONCURRENCY_MODE,
+        threads: int = DEFAULT_THREADS,
+        async_limit: int = DEFAULT_ASYNC_LIMIT,
+        min_workers: int | None = None,
+        max_workers: int | None = None,
+        scale_cooldown: float = DEFAULT_SCALE_COOLDOWN,
+        max_tasks_per_child: int | None = None,
+        max_memory_per_child: int | None = None,
+        metrics_port: int | None = None,
+        metrics_host: str = DEFAULT_METRICS_HOST,
+        log_levels: dict[str, str] | None = None,
+        log_format: str = DEFAULT_LOG_FORMAT,
+        log_sample_rate: float = DEFAULT_LOG_SAMPLE_RATE,
     ) -> None:
+        # sizes the pool when a maximum is given, see `autoscale`.
+        self.autoscaler: Autoscaler | None = None
+        if max_workers:
+            min_workers = min_workers or 1
+            self.autoscaler = Autoscaler(
+                min_workers=min_workers,
+                max_workers=max_workers,
+                cooldown=scale_cooldown,
+            )
+            workers = min(max(workers, min_workers), max_workers)
         self.no_of_workers: int = workers
         self.module_name: str = module_name
+        self.consume_mode: str = consume_mode
+        self.concurrency_mode: str = concurrency_mode
+        self.threads: int = threads
+        self.async_limit: int = async_limit
+        # workers are recycled after this many tasks, or this many MiB of memory.
+        self.max_tasks_per_child: int | None = max_tasks_per_child
+        self.max_memory_per_child: int | None = max_memory_per_child
+        self.scheduler: QueueScheduler = QueueScheduler(
+            queues=queues, strategy=queue_strategy, prefetch=prefetch
+        )
         self.boot_complete: bool = False
+        # when to look for due scheduled messages next, see `promote_scheduled`.
+        self.next_promotion: float = 0.0
+        self.next_scaling: float = 0.0
+        # number for the next worker started by the autoscaler.
+        self.next_worker_num: int = workers
+        # workers stopped by the autoscaler or recycling, until their process exits.
+        self.retiring: list[Worker] = []
+        # set once the master starts stopping the workers, see `shutdown`.
+        self.shutting_down: bool = False
+        # collected when they are served, see `serve_metrics`.
+        self.metrics: Metrics | None = Metrics() if metrics_port else None
+        self.metrics_port: int | None = metrics_port
+        self.metrics_host: str = metrics_host
+        self.log_config: LogConfig = LogConfig(
+            levels=log_levels, format=log_format, sample_rate=log_sample_rate
+        )
+        # writes the records of every process, started with the application.
+        self.log_listeners: list[QueueListener] = []
         if init_as_app:
             if not all([self.no_of_workers, self.module_name]):
                 raise RuntimeError("Arguments are improper unable to start RapidQ.")
@@ -35,42 +139,118 @@ class RapidQ:
 
     def initialize(self) -> None:
         self.process_counter: Synchronized[int] = Value("i", 0)
+        # set by the workers whenever one of them is ready for more messages.
+        self.idle_event: SyncEvent = Event()
         self.workers: dict[str, Worker] = {}
         self.pid: int = os.getpid()
+        # the workers hand their records over to the master, who writes them.
+        self.log_queue: Queue = Queue()
+        self.local_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        configure_logging(self.log_config, self.local_log_queue)
+        self.log_listeners = start_log_listeners(
+            self.log_config, self.log_queue, self.local_log_queue
+        )
         self.broker: Broker = get_broker()
 
+    def preload(self) -> None:
+        """
+        Loads the application once in the master, for the workers to fork from.
+        The workers share the memory of the loaded modules until they write to it.
+        """
+        import_module(self.module_name)
+        initialize_framework_loaders(self)
+        # keeps the garbage collector of the workers off the objects loaded so far,
+        # looking at them would write to their memory pages and copy them.
+        gc.freeze()
+
     def config_from_module(self, module_path: str) -> None:
         module = import_module(module_path)
 
         configurable_keys = (
             "RAPIDQ_BROKER_SERIALIZER",
             "RAPIDQ_BROKER_URL",
+            "RAPIDQ_BROKER_LAYOUT",
+            "RAPIDQ_COMPRESSION",
+            "RAPIDQ_COMPRESSION_THRESHOLD",
+            "RAPIDQ_COMPRESSION_LEVEL",
+            "RAPIDQ_BLOB_STORE",
+            "RAPIDQ_BLOB_THRESHOLD",
+            "RAPIDQ_BLOB_DIR",
+            "RAPIDQ_RESULT_BACKEND",
+            "RAPIDQ_RESULT_URL",
+            "RAPIDQ_RESULT_TTL",
         )
         for key in configurable_keys:
             if not getattr(module, key, None):
                 continue
             os.environ[key] = str(getattr(module, key))
+        # the serializer might have been looked up before the configuration.
+        Message.reset_serializer()
 
-    def task(self, name: str) -> Callable[[Callable[..., Any]], BackGroundTask]:
+    def task(
+        self,
+        name: str,
+        queue: str = DEFAULT_QUEUE_NAME,
+        priority: int = DEFAULT_PRIORITY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        retry_on: tuple[type[BaseException], ...] = (Exception,),
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+        retry_backoff_max: float = DEFAULT_RETRY_BACKOFF_MAX,
+        retry_jitter: bool = True,
+    ) -> Callable[[Callable[..., Any]], BackGroundTask]:
         """Decorator for callables to be registered as task."""
-        return task_decorator(name)
+        return task_decorator(
+            name,
+            queue=queue,
+            priority=priority,
+            max_retries=max_retries,
+            retry_on=retry_on,
+            retry_backoff=retry_backoff,
+            retry_backoff_max=retry_backoff_max,
+            retry_jitter=retry_jitter,
+        )
 
-    def logger(self, message: str) -> None:
-        print(f"Master: [PID: {self.pid}] {message}")
+    def logger(self, message: str, level: int = logging.INFO) -> None:
+        master_log.log(level, message)
 
     def _create_worker(self, worker_num: int) -> Worker:
         """Create and return a single Worker instance."""
-        worker_queue: Queue[bytes] = Queue(maxsize=250)
+        worker_queue: Queue[bytes] = Queue(maxsize=DEFAULT_WORKER_QUEUE_SIZE)
         shutdown_event: SyncEvent = Event()
         worker_state: Synchronized[int] = Value("i", 0)
+        worker_inflight: Synchronized[int] = Value("i", 0)
         process_name = f"Worker-{worker_num}"
-        worker = Worker(
+        worker_class = Worker
+        if self.concurrency_mode == ConcurrencyMode.ASYNCIO:
+            worker_class = AsyncWorker
+        worker = worker_class(
             queue=worker_queue,
             name=process_name,
             shutdown_event=shutdown_event,
             process_counter=self.process_counter,
             state=worker_state,
+            idle_event=self.idle_event,
+            inflight=worker_inflight,
             module_name=self.module_name,
+            consume_mode=self.consume_mode,
+            # each worker keeps its own round-robin state in direct mode.
+            scheduler=QueueScheduler(
+                queues=self.scheduler.queues,
+                strategy=self.scheduler.strategy,
+                prefetch=self.scheduler.prefetch,
+            ),
+            concurrency_mode=self.concurrency_mode,
+            threads=self.threads,
+            async_limit=self.async_limit,
+            max_tasks=self.max_tasks_per_child,
+            max_memory=(
+                self.max_memory_per_child * 1024 * 1024
+                if self.max_memory_per_child
+                else None
+            ),
+            metrics=self.metrics.for_worker() if self.metrics else None,
+            log_queue=self.log_queue,
+            log_config=self.log_config,
         )
 
         # NOTE: I am well aware of the state duplication when the process is started
@@ -103,6 +283,148 @@ class RapidQ:
         """Returns the queued messages"""
         return self.broker.fetch_queued()
 
+    def queue_depth(self) -> int:
+        """Returns the number of messages waiting in the consumed queues."""
+        return sum(
+            self.broker.queue_depth(queue_name)
+            for queue_name in self.scheduler.queue_names
+        )
+
+    def spawn_worker(self) -> Worker:
+        """Starts one more worker."""
+        worker = self._create_worker(self.next_worker_num)
+        self.next_worker_num += 1
+        self.add_worker(worker=worker)
+        worker.process.start()
+        return worker
+
+    def retire_worker(self, name: str) -> None:
+        """Stops a worker gracefully, it finishes what it holds first."""
+        worker = self.workers.pop(name)
+        worker.stop()
+        self.retiring.append(worker)
+
+    def reap_retired(self) -> None:
+        """Collects the retired workers whose process exited."""
+        for worker in list(self.retiring):
+            if worker.process.exitcode is None:
+                continue
+            worker.join()
+            self.worker_exited(worker)
+            self.reassign_leftovers(worker)
+            worker.task_queue.cancel_join_thread()
+            self.retiring.remove(worker)
+
+    def worker_exited(self, worker: Worker) -> None:
+        """Keeps the counters of a worker whose process exited."""
+        if self.metrics and worker.metrics:
+            self.metrics.worker_exited(worker.metrics)
+
+    def reassign_leftovers(self, worker: Worker) -> None:
+        """Hands the messages left in the queue of an exited worker to the others."""
+        leftovers = worker.drain_tasks()
+        if not leftovers:
+            return
+        self.logger(
+            f"{worker.name} left {len(leftovers)} message(s), reassigning them."
+        )
+        # rather go above the prefetch limits for a while than lose them.
+        self.requeue(
+            self.assign_messages(
+                leftovers,
+                {_worker: len(leftovers) for _worker in self.workers.values()},
+            )
+        )
+
+    def recycle_workers(self) -> None:
+        """
+        Replaces the workers that reached their task or memory limit.
+        The replacement boots while the old worker finishes what it holds.
+        """
+        for name, worker in list(self.workers.items()):
+            if worker.state.value != WorkerState.RECYCLING:
+                continue
+            self.workers.pop(name)
+            self.retiring.append(worker)
+            replacement = self.spawn_worker()
+            self.logger(f"{name} is recycling, {replacement.name} replaces it.")
+
+    def maintain_workers(self) -> None:
+        """Replaces the recycling and the dead workers, collects the exited ones."""
+        self.recycle_workers()
+        self.check_workers()
+        if self.retiring:
+            self.reap_retired()
+
+    def autoscale(self) -> None:
+        """
+        Grows or shrinks the worker pool from the queue backlog, see `Autoscaler`.
+        Does nothing unless `max_workers` is set.
+        """
+        if self.autoscaler is None or not self.boot_complete:
+            return
+        now = time.monotonic()
+        if now < self.next_scaling:
+            return
+        self.next_scaling = now + DEFAULT_SCALE_INTERVAL
+        self.reap_retired()
+
+        backlog = self.queue_depth()
+        idle = [
+            name
+            for name, worker in self.workers.items()
+            if worker.state.value == WorkerState.IDLE and not worker.inflight.value
+        ]
+        booting = any(
+            worker.state.value == WorkerState.BOOTING
+            for worker in self.workers.values()
+        )
+        to_add = self.autoscaler.workers_to_add(
+            backlog=backlog,
+            idle_workers=len(idle),
+            booting=booting,
+            workers=len(self.workers),
+            slots_per_worker=next(iter(self.workers.values())).slots,
+            now=now,
+        )
+        if to_add:
+            self.logger(f"{backlog} message(s) waiting, adding {to_add} worker(s).")
+        for _ in range(to_add):
+            self.spawn_worker()
+
+        for name in self.autoscaler.workers_to_stop(
+            idle=idle, backlog=backlog, workers=len(self.workers), now=now
+        ):
+            self.logger(f"{name} is idle, stopping it.")
+            self.retire_worker(name)
+
+    def render_metrics(self) -> str:
+        """Returns the metrics in the Prometheus text format, called by the endpoint."""
+        queue_depths = {
+            queue_name: self.broker.queue_depth(queue_name)
+            for queue_name in self.scheduler.queue_names
+        }
+        state_names = {
+            value: name.lower()
+            for name, value in vars(WorkerState).items()
+            if not name.startswith("_")
+        }
+        workers = dict.fromkeys(state_names.values(), 0)
+        for worker in list(self.workers.values()):
+            workers[state_names[worker.state.value]] += 1
+        return self.metrics.render(queue_depths=queue_depths, workers=workers)
+
+    def start_metrics_server(self) -> None:
+        """Serves the metrics on `/metrics`, if a port is given."""
+        if self.metrics is None:
+            return
+        serve_metrics(
+            self.render_metrics, host=self.metrics_host, port=self.metrics_port
+        )
+        self.logger(
+            f"metrics on http://{self.metrics_host}:{self.metrics_port}/metrics"
+        )
+
     def idle_workers(self) -> list[Worker]:
         """Returns the workers in idle state."""
         if not self.boot_complete:
@@ -114,6 +436,78 @@ class RapidQ:
             if _worker.state.value == WorkerState.IDLE
         ]
 
+    def worker_credits(self, queue_name: str) -> dict[Worker, int]:
+        """
+        Returns the workers that can take messages from `queue_name`, along
+        with how many messages each one can take. A worker may hold up to the
+        prefetch limit of the queue for each of its slots, counting the running tasks.
+        """
+        if not self.boot_complete:
+            return {}
+
+        credits = {}
+        for _worker in self.workers.values():
+            if _worker.state.value not in (WorkerState.IDLE, WorkerState.BUSY):
+                continue
+            if _worker.process.exitcode is not None:
+                # died after freeing its slot, `check_workers` replaces it.
+                continue
+            credit = _worker.capacity(queue_name) - _worker.inflight.value
+            if credit > 0:
+                credits[_worker] = credit
+        return credits
+
+    def assign_messages(
+        self, messages: list[bytes], credits: dict[Worker, int]
+    ) -> list[bytes]:
+        """
+        Hands the messages over to the workers, each one to the worker
+        with the most credit left so the load stays even.
+        Returns the messages no worker could take, as the workers can run out
+        of credit or start recycling between fetching and assigning.
+        """
+        for index, message in enumerate(messages):
+            while credits:
+                worker = max(credits, key=credits.__getitem__)
+                with worker.inflight.get_lock():
+                    worker.inflight.value += 1
+                try:
+                    worker.task_queue.put(message, timeout=0.1)
+                except queue.Full:
+                    with worker.inflight.get_lock():
+                        worker.inflight.value -= 1
+                    # whatever its credit says, try the other workers.
+                    del credits[worker]
+                    continue
+                master_log.debug("assigning a task to %s", worker.name)
+                credits[worker] -= 1
+                if credits[worker] <= 0:
+                    del credits[worker]
+                break
+            else:
+                # every worker ran out of credit.
+                return messages[index:]
+        return []
+
+    def requeue(self, messages: list[bytes]) -> None:
+        """Puts the messages no worker could take back at the head of their queue."""
+        if not messages:
+            return
+        self.logger(
+            f"{len(messages)} message(s) could not be assigned, requeueing them."
+        )
+        self.broker.requeue_messages(messages)
+
+    def requeue_unstarted(self, worker: Worker) -> None:
+        """Gives the messages a stopping worker did not start back to the broker."""
+        unstarted = worker.drain_tasks()
+        if not unstarted:
+            return
+        self.logger(
+            f"{worker.name} did not start {len(unstarted)} message(s), requeueing them."
+        )
+        self.broker.requeue_messages(unstarted)
+
     def wait_boot_up(self) -> None:
         """Wait for workers to fully boot up"""
         while True:
@@ -132,42 +526,133 @@ class RapidQ:
                 self.abnormal_shutdown()
         self.boot_complete = True
 
+    def promote_scheduled(self) -> float:
+        """
+        Queues the scheduled messages that are due.
+        Looks at least every `DEFAULT_IDLE_TIME`, and right when the next
+        message is due. Returns the seconds until the next look.
+        """
+        now = time.time()
+        if now >= self.next_promotion:
+            moved, next_due = self.broker.promote_scheduled(now)
+            if moved:
+                self.logger(f"{moved} scheduled message(s) queued.")
+            self.next_promotion = now + DEFAULT_IDLE_TIME
+            if next_due is not None:
+                # a due time in the past means the batch did not take them all.
+                self.next_promotion = min(self.next_promotion, next_due)
+        return max(0.0, self.next_promotion - now)
+
     def main_loop(self) -> None:
         """Master main loop"""
         self.wait_boot_up()
         while True:
             try:
-                pending_message_ids = self.queued_tasks()
-                if not pending_message_ids:
-                    time.sleep(DEFAULT_IDLE_TIME)
+                self.maintain_workers()
+                until_promotion = self.promote_scheduled()
+                # clear before looking, so a worker freeing up
+                # right after the check still wakes up the wait below.
+                self.idle_event.clear()
+                if not any(
+                    self.worker_credits(queue_name)
+                    for queue_name in self.scheduler.queue_names
+                ):
+                    # no worker can take more messages.
+                    self.autoscale()
+                    self.idle_event.wait(timeout=DEFAULT_IDLE_TIME)
+                    continue
+
+                dispatched = False
+                drained_queues = []
+                for queue_name, share in self.scheduler.plan():
+                    credits = self.worker_credits(queue_name)
+                    if not credits:
+                        continue
+                    # Fetch only as many messages as the workers can take.
+                    # Messages are removed from the broker as they are fetched.
+                    count = math.ceil(sum(credits.values()) * share)
+                    messages = self.broker.pop_messages(
+                        count=count, queue_name=queue_name
+                    )
+                    if messages:
+                        unassigned = self.assign_messages(messages, credits)
+                        self.requeue(unassigned)
+                        dispatched = True
+                        if self.metrics:
+                            self.metrics.count_dispatched(
+                                queue_name, len(messages) - len(unassigned)
+                            )
+                    else:
+                        drained_queues.append(queue_name)
+
+                if dispatched or not drained_queues or not until_promotion:
                     continue
 
-                for worker in self.idle_workers():
-                    if not pending_message_ids:
-                        break
-
-                    try:
-                        message_id = pending_message_ids.pop(0).decode()
-                        message = self.broker.dequeue_message(message_id=message_id)
-                    except UnicodeDecodeError as error:
-                        self.logger(
-                            f"Unable to decode message! message_id: {message_id} \n"
-                            "You have configured different serialization strategies"
-                            " for RapidQ and your project.\nCheck configuration."
-                            "You will have to restart the workers with correct serialization. Or flush the broker."
-                        )
-                        raise error
-
-                    try:
-                        worker.task_queue.put(message, timeout=0.1)
-                        # assign the task to the idle worker
-                        self.logger(f"assigning [{message_id}] to {worker.name}")
-                    except queue.Full:
-                        pass
-                if not pending_message_ids:
-                    time.sleep(DEFAULT_IDLE_TIME)
-            except (KeyboardInterrupt, Exception) as error:
-                print(error)
+                # only looked at here and when the workers are full, as a worker
+                # that just finished looks idle until it gets its next message.
+                self.autoscale()
+
+                # the queues are drained, block on the broker until a message arrives.
+                popped = self.broker.wait_message(
+                    queue_names=drained_queues,
+                    timeout=min(DEFAULT_IDLE_TIME, until_promotion),
+                )
+                if popped:
+                    queue_name, message = popped
+                    unassigned = self.assign_messages(
+                        [message], self.worker_credits(queue_name)
+                    )
+                    self.requeue(unassigned)
+                    if self.metrics and not unassigned:
+                        self.metrics.count_dispatched(queue_name, 1)
+            except KeyboardInterrupt:
+                self.abnormal_shutdown()
+            except Exception:
+                master_log.exception("Unexpected error, shutting down.")
+                self.abnormal_shutdown()
+
+    def check_workers(self) -> None:
+        """Replaces the worker processes that exited on their own."""
+        if self.shutting_down:
+            return
+        for name, worker in list(self.workers.items()):
+            if not worker.process or worker.process.exitcode is None:
+                continue
+            self.logger(
+                f"{name} exited unexpectedly with code {worker.process.exitcode}, restarting.",
+                logging.WARNING,
+            )
+            new_worker = self._create_worker(int(name.rpartition("-")[2]))
+            self.add_worker(worker=new_worker)
+            new_worker.process.start()
+            self.worker_exited(worker)
+            self.reassign_leftovers(worker)
+            worker.task_queue.cancel_join_thread()
+
+    def supervise(self) -> None:
+        """
+        Master loop for direct mode.
+        Workers fetch their own messages, so the master only looks after them.
+        """
+        self.wait_boot_up()
+        while True:
+            try:
+                self.autoscale()
+                until_promotion = self.promote_scheduled()
+                # wakes up as soon as any of the worker processes exits.
+                wait(
+                    [
+                        worker.process.sentinel
+                        for worker in self.workers.values()
+                        if worker.process
+                    ],
+                    timeout=min(DEFAULT_IDLE_TIME, until_promotion),
+                )
+                self.maintain_workers()
+            except KeyboardInterrupt:
+                self.abnormal_shutdown()
+            except Exception:
+                master_log.exception("Unexpected error, shutting down.")
                 self.abnormal_shutdown()
 
     def abnormal_shutdown(self) -> None:
@@ -175,8 +660,21 @@ class RapidQ:
         sys.exit(1)
 
     def shutdown(self) -> None:
+        self.shutting_down = True
+        # the workers get the time to finish, another Ctrl+C must not cut it short.
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        try:
+            self.stop_workers()
+        finally:
+            self.logger("Shutting down master")
+            # writes what is left in the queues.
+            for listener in self.log_listeners:
+                listener.stop()
+            self.log_listeners = []
+
+    def stop_workers(self) -> None:
         self.logger("Preparing to shutdown ...")
-        for worker in self.workers.values():
+        for worker in [*self.workers.values(), *self.retiring]:
             if not worker.process:
                 continue
             try:
@@ -184,30 +682,86 @@ class RapidQ:
                     f"Waiting for {worker.process.name} - PID: {worker.process.pid} to exit!"
                 )
                 worker.stop()
+                # it takes no more messages, the ones it did not start go back to the broker.
+                self.requeue_unstarted(worker)
                 worker.join(timeout=5)
 
                 if worker.process.is_alive():
                     self.logger(
-                        f"Worker still alive, forcefully killing. PID: {worker.process.pid}"
+                        f"Worker still alive, forcefully killing. PID: {worker.process.pid}",
+                        logging.WARNING,
                     )
                     worker.process.terminate()
                     worker.join(timeout=1)
+                # nothing reads the queue anymore, do not let messages
+                # still buffered for it hold up the exit.
+                worker.task_queue.cancel_join_thread()
             except Exception as error:
                 self.logger(
-                    f"Error while shutting down worker {worker.process.name}: {error}"
+                    f"Error while shutting down worker {worker.process.name}: {error}",
+                    logging.ERROR,
                 )
 
-        self.logger("Shutting down master")
-
 
-def main_process(workers: int, module_name: str) -> None:
+def main_process(
+    workers: int,
+    module_name: str,
+    consume_mode: str = DEFAULT_CONSUME_MODE,
+    prefetch: dict[str, int] | None = None,
+    queues: dict[str, int] | None = None,
+    queue_strategy: str = DEFAULT_QUEUE_STRATEGY,
+    concurrency_mode: str = DEFAULT_CONCURRENCY_MODE,
+    threads: int = DEFAULT_THREADS,
+    async_limit: int = DEFAULT_ASYNC_LIMIT,
+    min_workers: int | None = None,
+    max_workers: int | None = None,
+    scale_cooldown: float = DEFAULT_SCALE_COOLDOWN,
+    max_tasks_per_child: int | None = None,
+    max_memory_per_child: int | None = None,
+    preload: bool = False,
+    metrics_port: int | None = None,
+    metrics_host: str = DEFAULT_METRICS_HOST,
+    log_levels: dict[str, str] | None = None,
+    log_format: str = DEFAULT_LOG_FORMAT,
+    log_sample_rate: float = DEFAULT_LOG_SAMPLE_RATE,
+) -> None:
     """Instantiates and runs the master application"""
-    set_start_method("spawn")
-    master = RapidQ(workers=workers, module_name=module_name, init_as_app=True)
+    # spawned workers start from a fresh interpreter and import the application.
+    set_start_method("fork" if preload else "spawn")
+    # shows up in the log records, the workers are named after their number.
+    current_process().name = "Master"
+    master = RapidQ(
+        workers=workers,
+        module_name=module_name,
+        init_as_app=True,
+        consume_mode=consume_mode,
+        prefetch=prefetch,
+        queues=queues,
+        queue_strategy=queue_strategy,
+        concurrency_mode=concurrency_mode,
+        threads=threads,
+        async_limit=async_limit,
+        min_workers=min_workers,
+        max_workers=max_workers,
+        scale_cooldown=scale_cooldown,
+        max_tasks_per_child=max_tasks_per_child,
+        max_memory_per_child=max_memory_per_child,
+        metrics_port=metrics_port,
+        metrics_host=metrics_host,
+        log_levels=log_levels,
+        log_format=log_format,
+        log_sample_rate=log_sample_rate,
+    )
     if not master.broker.is_alive():
-        master.logger("Error: unable to access broker, shutting down.")
+        master.logger("Error: unable to access broker, shutting down.", logging.ERROR)
         master.abnormal_shutdown()
 
+    if preload:
+        master.preload()
     master.create_workers()
     master.start_workers()
-    master.main_loop()
+    master.start_metrics_server()
+    if master.consume_mode == ConsumeMode.DIRECT:
+        master.supervise()
+    else:
+        master.main_loop()
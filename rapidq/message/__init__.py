@@ -4,6 +4,7 @@ from rapidq.message.message import (
     MessageTypeRegistry,
 )
 from rapidq.message.message_types import (
+    BinaryMessage,
     JsonMessage,
     PickleMessage,
 )
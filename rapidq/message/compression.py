@@ -0,0 +1,91 @@
+import lzma
+import os
+import zlib
+from typing import Callable, NamedTuple
+
+from rapidq.constants import (
+    DEFAULT_COMPRESSION,
+    DEFAULT_COMPRESSION_LEVEL,
+    DEFAULT_COMPRESSION_THRESHOLD,
+    Compression,
+)
+
+# first byte of a compressed message. No serializer output starts with it,
+# so compressed and uncompressed messages can sit in the same queue.
+COMPRESSED_FLAG = b"\x00"
+
+
+class Codec(NamedTuple):
+    # second byte of a compressed message, tells which codec was used.
+    marker: bytes
+    compress: Callable[[bytes, int], bytes]
+    decompress: Callable[[bytes], bytes]
+
+
+CODECS: dict[str, Codec] = {
+    Compression.ZLIB: Codec(
+        marker=b"z",
+        compress=lambda data, level: zlib.compress(data, level),
+        decompress=zlib.decompress,
+    ),
+    Compression.LZMA: Codec(
+        marker=b"x",
+        compress=lambda data, level: lzma.compress(data, preset=level),
+        decompress=lzma.decompress,
+    ),
+}
+CODECS_BY_MARKER: dict[bytes, Codec] = {
+    codec.marker: codec for codec in CODECS.values()
+}
+
+
+class Compressor:
+    """
+    Compresses serialized messages above a size threshold.
+    """
+
+    def __init__(
+        self,
+        compression: str = DEFAULT_COMPRESSION,
+        threshold: int = DEFAULT_COMPRESSION_THRESHOLD,
+        level: int = DEFAULT_COMPRESSION_LEVEL,
+    ) -> None:
+        if compression != Compression.NONE and compression not in CODECS:
+            raise RuntimeError(f"compression must be in {[Compression.NONE, *CODECS]}")
+        self.codec: Codec | None = CODECS.get(compression)
+        self.threshold: int = threshold
+        self.level: int = level
+
+    @classmethod
+    def from_env(cls) -> "Compressor":
+        return cls(
+            compression=os.environ.get("RAPIDQ_COMPRESSION", DEFAULT_COMPRESSION),
+            threshold=int(
+                os.environ.get(
+                    "RAPIDQ_COMPRESSION_THRESHOLD", DEFAULT_COMPRESSION_THRESHOLD
+                )
+            ),
+            level=int(
+                os.environ.get("RAPIDQ_COMPRESSION_LEVEL", DEFAULT_COMPRESSION_LEVEL)
+            ),
+        )
+
+    def compress(self, data: bytes | str) -> bytes | str:
+        if self.codec is None or len(data) < self.threshold:
+            return data
+        raw = data.encode() if isinstance(data, str) else data
+        compressed = self.codec.compress(raw, self.level)
+        if len(compressed) + 2 >= len(raw):
+            # incompressible, not worth the decompression on the other side.
+            return data
+        return b"".join((COMPRESSED_FLAG, self.codec.marker, compressed))
+
+    @staticmethod
+    def decompress(data: bytes) -> bytes:
+        """Decompress the data if it was compressed, whatever the current settings."""
+        if data[:1] != COMPRESSED_FLAG:
+            return data
+        codec = CODECS_BY_MARKER.get(data[1:2])
+        if codec is None:
+            raise RuntimeError("Message is compressed with an unknown codec.")
+        return codec.decompress(memoryview(data)[2:])
@@ -5,7 +5,8 @@ import uuid
 from abc import ABC, abstractmethod
 from typing import Any, Callable, ClassVar, Type, TypeVar
 
-from rapidq.constants import DEFAULT_SERIALIZATION, Serialization
+from rapidq.constants import DEFAULT_PRIORITY, DEFAULT_SERIALIZATION, Serialization
+from rapidq.message.compression import Compressor
 
 MsgRegistryT = TypeVar("MsgRegistryT", bound="MessageTypeRegistry")
 MsgT = TypeVar("MsgT", bound="Message")
@@ -44,6 +45,23 @@ class Message:
     A class for handling messages.
     """
 
+    __slots__ = (
+        "task_name",
+        "queue_name",
+        "args",
+        "kwargs",
+        "message_id",
+        "priority",
+        "blob_ref",
+        "dedup_key",
+        "attempt",
+        "enqueued_at",
+    )
+
+    # serializer resolved from the environment, cached for the whole process.
+    _serializer: ClassVar[Type[MessageType] | None] = None
+    _compressor: ClassVar[Compressor | None] = None
+
     def __init__(
         self,
         task_name: str,
@@ -51,12 +69,26 @@ class Message:
         args: tuple,
         kwargs: dict[str, Any],
         message_id: str | None = None,
+        priority: int = DEFAULT_PRIORITY,
+        blob_ref: str | None = None,
+        dedup_key: str | None = None,
+        attempt: int = 0,
+        enqueued_at: float | None = None,
     ) -> None:
         self.task_name: str = task_name
         self.queue_name: str = queue_name
         self.args: list[Any] = list(args)
         self.kwargs: dict[str, Any] = kwargs
         self.message_id: str = message_id or str(uuid.uuid4())
+        self.priority: int = priority
+        # set when the arguments were offloaded to the blob store.
+        self.blob_ref: str | None = blob_ref
+        # duplicates of the message are dropped while this key is held in the broker.
+        self.dedup_key: str | None = dedup_key
+        # number of times the task was retried so far.
+        self.attempt: int = attempt
+        # unix time the message was queued at, or became due if it was delayed.
+        self.enqueued_at: float | None = enqueued_at
 
     def dict(self) -> dict[str, Any]:
         return {
@@ -65,20 +97,44 @@ class Message:
             "args": self.args,
             "kwargs": self.kwargs,
             "message_id": self.message_id,
+            "priority": self.priority,
+            "blob_ref": self.blob_ref,
+            "dedup_key": self.dedup_key,
+            "attempt": self.attempt,
+            "enqueued_at": self.enqueued_at,
         }
 
     @classmethod
     def _get_serializer(cls: Type[MsgT]) -> Type[MessageType]:
-        """Get the configured serializer based on environment settings."""
-        serialization = os.environ.get(
-            "RAPIDQ_BROKER_SERIALIZER", DEFAULT_SERIALIZATION
-        )
-        return MessageTypeRegistry.fetch(msg_type=serialization)
+        """Get the configured serializer, looked up once per process."""
+        serializer = Message._serializer
+        if serializer is None:
+            serialization = os.environ.get(
+                "RAPIDQ_BROKER_SERIALIZER", DEFAULT_SERIALIZATION
+            )
+            serializer = MessageTypeRegistry.fetch(msg_type=serialization)
+            Message._serializer = serializer
+        return serializer
+
+    @staticmethod
+    def _get_compressor() -> Compressor:
+        """Get the configured compression, looked up once per process."""
+        compressor = Message._compressor
+        if compressor is None:
+            compressor = Compressor.from_env()
+            Message._compressor = compressor
+        return compressor
+
+    @staticmethod
+    def reset_serializer() -> None:
+        """Forget the cached serializer, for when the configuration changes."""
+        Message._serializer = None
+        Message._compressor = None
 
     @classmethod
     def serialize(cls: Type[MsgT], message: "Message") -> bytes | str:
-        return cls._get_serializer().serialize(message)
+        return cls._get_compressor().compress(cls._get_serializer().serialize(message))
 
     @classmethod
     def deserialize(cls: Type[MsgT], message_data: bytes) -> "Message":
-        return cls._get_serializer().deserialize(message_data)
+        return cls._get_serializer().deserialize(Compressor.decompress(message_data))
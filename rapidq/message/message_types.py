@@ -1,5 +1,6 @@
 import json
 import pickle
+import struct
 
 from rapidq.constants import Serialization
 from rapidq.message import Message, MessageType, MessageTypeRegistry
@@ -29,3 +30,72 @@ class PickleMessage(MessageType):
     @staticmethod
     def deserialize(message_data: bytes) -> Message:
         return Message(**pickle.loads(message_data))
+
+
+@MessageTypeRegistry.register
+class BinaryMessage(MessageType):
+    """
+    Compact envelope, a fixed size header followed by the fields:
+    magic, version, priority, attempt, enqueue time and the byte lengths of the
+    text fields, then the text fields as utf-8 and the pickled args and kwargs.
+    Optional text fields that are not set are empty, an unknown enqueue time is 0.
+    """
+
+    msg_type: str = Serialization.BINARY
+
+    # not a hex digit, `{` or a pickle opcode, so it never looks like
+    # a message id or one of the other formats.
+    MAGIC: bytes = b"RQ"
+    VERSION: int = 5
+    # lengths of task name, queue name, message id, blob reference and dedup key.
+    HEADER: struct.Struct = struct.Struct("!2sBBHd5H")
+
+    @staticmethod
+    def serialize(message: Message) -> bytes:
+        texts = (
+            message.task_name.encode(),
+            message.queue_name.encode(),
+            message.message_id.encode(),
+            message.blob_ref.encode() if message.blob_ref else b"",
+            message.dedup_key.encode() if message.dedup_key else b"",
+        )
+        header = BinaryMessage.HEADER.pack(
+            BinaryMessage.MAGIC,
+            BinaryMessage.VERSION,
+            message.priority,
+            message.attempt,
+            message.enqueued_at or 0.0,
+            *map(len, texts),
+        )
+        payload = pickle.dumps(
+            (message.args, message.kwargs), protocol=pickle.HIGHEST_PROTOCOL
+        )
+        return b"".join((header, *texts, payload))
+
+    @staticmethod
+    def deserialize(message_data: bytes) -> Message:
+        magic, version, priority, attempt, enqueued_at, *lengths = (
+            BinaryMessage.HEADER.unpack_from(message_data)
+        )
+        if magic != BinaryMessage.MAGIC or version != BinaryMessage.VERSION:
+            raise RuntimeError("Not a binary message or unsupported version.")
+
+        texts = []
+        start = BinaryMessage.HEADER.size
+        for length in lengths:
+            texts.append(message_data[start : start + length].decode())
+            start += length
+        task_name, queue_name, message_id, blob_ref, dedup_key = texts
+        args, kwargs = pickle.loads(memoryview(message_data)[start:])
+        return Message(
+            task_name,
+            queue_name,
+            args,
+            kwargs,
+            message_id=message_id,
+            priority=priority,
+            blob_ref=blob_ref or None,
+            dedup_key=dedup_key or None,
+            attempt=attempt,
+            enqueued_at=enqueued_at or None,
+        )
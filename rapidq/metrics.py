@@ -0,0 +1,277 @@
+import threading
+from bisect import bisect_left
+from ctypes import c_char
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Array, Value
+from multiprocessing.sharedctypes import RawArray, Synchronized, SynchronizedArray
+from typing import Callable
+
+from rapidq.constants import DEFAULT_METRICS_TASKS
+
+# upper bounds in seconds of the histogram buckets, the last bucket is +Inf.
+BUCKETS: tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+# longer task names are cut, in utf-8 bytes.
+NAME_SIZE: int = 200
+
+# Layout of the counters of a task, the tasks follow each other in the array.
+# The count of a histogram is the sum of its buckets.
+SUCCESSES, FAILURES, DURATION_SUM, WAIT_SUM = range(4)
+DURATION_BUCKETS: int = 4
+WAIT_BUCKETS: int = DURATION_BUCKETS + len(BUCKETS) + 1
+TASK_FIELDS: int = WAIT_BUCKETS + len(BUCKETS) + 1
+
+CONTENT_TYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class TaskNames:
+    """
+    Task names by index, shared by the master and the workers.
+    A task gets its index the first time any worker records it.
+    """
+
+    def __init__(self, size: int = DEFAULT_METRICS_TASKS) -> None:
+        self.size: int = size
+        self.names: SynchronizedArray = Array(c_char, size * NAME_SIZE)
+        # guarded by the lock of `names`.
+        self.count: Synchronized = Value("i", 0)
+        # indexes already looked up by this process.
+        self.cache: dict[str, int] = {}
+
+    def index(self, name: str) -> int | None:
+        """Returns the index of the task, None once the table is full."""
+        index = self.cache.get(name)
+        if index is not None:
+            return index
+        encoded = name.encode()[:NAME_SIZE]
+        with self.names.get_lock():
+            for index, known in enumerate(self._read()):
+                if known == encoded:
+                    break
+            else:
+                index = self.count.value
+                if index == self.size:
+                    return None
+                start = index * NAME_SIZE
+                self.names[start : start + len(encoded)] = encoded
+                self.count.value += 1
+        self.cache[name] = index
+        return index
+
+    def all(self) -> list[str]:
+        """Returns the names of the recorded tasks, by index."""
+        with self.names.get_lock():
+            return [name.decode(errors="replace") for name in self._read()]
+
+    def _read(self) -> list[bytes]:
+        # the caller holds the lock.
+        raw = self.names.get_obj().raw
+        return [
+            raw[index * NAME_SIZE : (index + 1) * NAME_SIZE].rstrip(b"\0")
+            for index in range(self.count.value)
+        ]
+
+
+class WorkerMetrics:
+    """
+    Counters and histograms of one worker, in shared memory so the master
+    can read them without asking. Only this worker writes to them.
+    """
+
+    def __init__(self, task_names: TaskNames) -> None:
+        self.task_names: TaskNames = task_names
+        self.values = RawArray("d", task_names.size * TASK_FIELDS)
+        # tasks of a threads worker finish concurrently.
+        self.lock: threading.Lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def record(
+        self, task_name: str, duration: float, failed: bool, wait: float | None
+    ) -> None:
+        """Adds a finished task, `wait` is the time it spent queued, if known."""
+        index = self.task_names.index(task_name)
+        if index is None:
+            return
+        base = index * TASK_FIELDS
+        values = self.values
+        with self.lock:
+            values[base + (FAILURES if failed else SUCCESSES)] += 1
+            values[base + DURATION_SUM] += duration
+            values[base + DURATION_BUCKETS + bisect_left(BUCKETS, duration)] += 1
+            if wait is not None:
+                values[base + WAIT_SUM] += wait
+                values[base + WAIT_BUCKETS + bisect_left(BUCKETS, wait)] += 1
+
+
+class Metrics:
+    """
+    The master side of the metrics.
+    Adds up the counters of the running workers and of the ones that exited.
+    """
+
+    def __init__(self, max_tasks: int = DEFAULT_METRICS_TASKS) -> None:
+        self.task_names: TaskNames = TaskNames(max_tasks)
+        self.lock: threading.Lock = threading.Lock()
+        self.workers: list[WorkerMetrics] = []
+        # counters of the workers that exited, so the totals never go down.
+        self.exited: list[float] = [0.0] * (max_tasks * TASK_FIELDS)
+        # messages the master handed over to the workers, by queue.
+        self.dispatched: dict[str, int] = {}
+
+    def for_worker(self) -> WorkerMetrics:
+        """Returns the counters for a new worker."""
+        worker_metrics = WorkerMetrics(self.task_names)
+        with self.lock:
+            self.workers.append(worker_metrics)
+        return worker_metrics
+
+    def worker_exited(self, worker_metrics: WorkerMetrics) -> None:
+        """Keeps the counters of a worker whose process exited."""
+        with self.lock:
+            if worker_metrics not in self.workers:
+                return
+            self.workers.remove(worker_metrics)
+            self.exited = [
+                total + value
+                for total, value in zip(self.exited, worker_metrics.values)
+            ]
+
+    def count_dispatched(self, queue_name: str, count: int) -> None:
+        self.dispatched[queue_name] = self.dispatched.get(queue_name, 0) + count
+
+    def totals(self) -> tuple[list[str], list[float]]:
+        """Returns the task names and their counters, summed over every worker."""
+        names = self.task_names.all()
+        size = len(names) * TASK_FIELDS
+        with self.lock:
+            totals = self.exited[:size]
+            for worker_metrics in self.workers:
+                totals = [
+                    total + value
+                    for total, value in zip(totals, worker_metrics.values[:size])
+                ]
+        return names, totals
+
+    def render(self, queue_depths: dict[str, int], workers: dict[str, int]) -> str:
+        """Returns the metrics in the Prometheus text format."""
+        names, totals = self.totals()
+        lines = [
+            "# HELP rapidq_tasks_total Tasks run, by outcome.",
+            "# TYPE rapidq_tasks_total counter",
+        ]
+        for index, name in enumerate(names):
+            base = index * TASK_FIELDS
+            task = escape(name)
+            lines.append(
+                f'rapidq_tasks_total{{task="{task}",status="success"}} {int(totals[base + SUCCESSES])}'
+            )
+            lines.append(
+                f'rapidq_tasks_total{{task="{task}",status="failure"}} {int(totals[base + FAILURES])}'
+            )
+
+        for metric, help_text, buckets, total in (
+            (
+                "rapidq_task_duration_seconds",
+                "Time spent running the task.",
+                DURATION_BUCKETS,
+                DURATION_SUM,
+            ),
+            (
+                "rapidq_task_wait_seconds",
+                "Time from enqueue, or the due time of delayed tasks, to the start.",
+                WAIT_BUCKETS,
+                WAIT_SUM,
+            ),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} histogram")
+            for index, name in enumerate(names):
+                base = index * TASK_FIELDS
+                task = escape(name)
+                cumulative = 0.0
+                for bucket, bound in enumerate((*BUCKETS, "+Inf")):
+                    cumulative += totals[base + buckets + bucket]
+                    lines.append(
+                        f'{metric}_bucket{{task="{task}",le="{bound}"}} {int(cumulative)}'
+                    )
+                lines.append(f'{metric}_sum{{task="{task}"}} {totals[base + total]}')
+                lines.append(f'{metric}_count{{task="{task}"}} {int(cumulative)}')
+
+        lines.append(
+            "# HELP rapidq_messages_dispatched_total Messages handed to the workers by the master."
+        )
+        lines.append("# TYPE rapidq_messages_dispatched_total counter")
+        for queue_name, count in list(self.dispatched.items()):
+            lines.append(
+                f'rapidq_messages_dispatched_total{{queue="{escape(queue_name)}"}} {count}'
+            )
+
+        lines.append("# HELP rapidq_queue_depth Messages waiting in the queue.")
+        lines.append("# TYPE rapidq_queue_depth gauge")
+        for queue_name, depth in queue_depths.items():
+            lines.append(f'rapidq_queue_depth{{queue="{escape(queue_name)}"}} {depth}')
+
+        lines.append("# HELP rapidq_workers Worker processes, by state.")
+        lines.append("# TYPE rapidq_workers gauge")
+        for state, count in workers.items():
+            lines.append(f'rapidq_workers{{state="{state}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def escape(value: str) -> str:
+    """Escapes a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def serve_metrics(
+    render: Callable[[], str], host: str, port: int
+) -> ThreadingHTTPServer:
+    """Serves the output of `render` on `/metrics` from a background thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.partition("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            try:
+                body = render().encode()
+            except Exception as error:
+                self.send_error(500, str(error))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            # scrapes are too frequent to be worth logging.
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="rapidq-metrics", daemon=True
+    ).start()
+    return server
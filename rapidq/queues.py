@@ -0,0 +1,71 @@
+from rapidq.constants import (
+    DEFAULT_PREFETCH,
+    DEFAULT_QUEUE_NAME,
+    DEFAULT_QUEUE_STRATEGY,
+    QueueStrategy,
+)
+
+
+class QueueScheduler:
+    """
+    Decides which queues are consumed, in which order,
+    and how many messages each queue can hand out at a time.
+    """
+
+    def __init__(
+        self,
+        queues: dict[str, int] | None = None,
+        strategy: str = DEFAULT_QUEUE_STRATEGY,
+        prefetch: dict[str, int] | None = None,
+    ) -> None:
+        # queue name -> weight, in priority order.
+        self.queues: dict[str, int] = queues or {DEFAULT_QUEUE_NAME: 1}
+        self.strategy: str = strategy
+        # prefetch limit per queue name, "*" applies to every other queue.
+        self.prefetch: dict[str, int] = prefetch or {}
+        # running scores for smooth weighted round-robin.
+        self._current: dict[str, int] = dict.fromkeys(self.queues, 0)
+
+    @property
+    def queue_names(self) -> list[str]:
+        return list(self.queues)
+
+    def prefetch_for(self, queue_name: str) -> int:
+        """Returns the prefetch limit of the given queue."""
+        if queue_name in self.prefetch:
+            return self.prefetch[queue_name]
+        return self.prefetch.get("*", DEFAULT_PREFETCH)
+
+    def order(self) -> list[str]:
+        """
+        Returns the queue names in the order they should be consumed.
+        With the weighted strategy, the queue that goes first is picked
+        by smooth weighted round-robin, so over many calls every queue
+        goes first in proportion to its weight.
+        """
+        if self.strategy == QueueStrategy.PRIORITY:
+            return self.queue_names
+
+        for queue_name, weight in self.queues.items():
+            self._current[queue_name] += weight
+        ordered = sorted(self.queues, key=self._current.__getitem__, reverse=True)
+        self._current[ordered[0]] -= sum(self.queues.values())
+        return ordered
+
+    def plan(self) -> list[tuple[str, float]]:
+        """
+        Returns the queue names for a single dispatch pass, each with the
+        fraction of the remaining free capacity the queue may fill.
+        Whatever a queue leaves unused goes to the queues after it.
+        """
+        ordered = self.order()
+        if self.strategy == QueueStrategy.PRIORITY:
+            return [(queue_name, 1.0) for queue_name in ordered]
+
+        plan = []
+        remaining_weight = sum(self.queues.values())
+        for queue_name in ordered:
+            weight = self.queues[queue_name]
+            plan.append((queue_name, weight / remaining_weight))
+            remaining_weight -= weight
+        return plan
@@ -4,6 +4,7 @@ from typing import TYPE_CHECKING, Any, Callable
 
 if TYPE_CHECKING:
     from rapidq.decorators import BackGroundTask
+    from rapidq.retry import RetryPolicy
 
 FRAMEWORK_LOADERS: set[Callable[..., Any]] = set()
 
@@ -20,18 +21,26 @@ class TaskRegistry:
     def register(cls, task: "BackGroundTask") -> None:
         if "tasks" not in cls.__dict__:
             cls.tasks: dict[str, Callable[..., Any]] = {}
+            cls.retry_policies: dict[str, RetryPolicy] = {}
         if task.name in cls.tasks:
             raise RuntimeError(
                 f"The name `{task.name}` has already registered for a different callable.\n"
                 f"check `{task.func.__module__}.{task.func.__name__}`"
             )
         cls.tasks[task.name] = task.func
+        if task.retry_policy is not None:
+            cls.retry_policies[task.name] = task.retry_policy
 
     @classmethod
     def fetch(cls, name: str) -> Callable[..., Any] | None:
         tasks: dict[str, Callable[..., Any]] = cls.__dict__.get("tasks", {})
         return tasks.get(name)
 
+    @classmethod
+    def fetch_retry_policy(cls, name: str) -> RetryPolicy | None:
+        policies: dict[str, RetryPolicy] = cls.__dict__.get("retry_policies", {})
+        return policies.get(name)
+
 
 def framework_loader(
     loader_callable: Callable[..., Any],
@@ -0,0 +1,34 @@
+import os
+
+from rapidq.constants import DEFAULT_RESULT_BACKEND, DEFAULT_RESULT_TTL, ResultStorage
+from rapidq.result.async_result import AsyncResult, gather
+from rapidq.result.base import ResultBackend
+from rapidq.result.redis_backend import RedisResultBackend
+
+result_backend_instance: ResultBackend | None = None
+
+
+def get_result_backend() -> ResultBackend | None:
+    """Returns the configured result backend, or None if results are not kept."""
+    global result_backend_instance
+    if result_backend_instance is None:
+        backend = os.environ.get("RAPIDQ_RESULT_BACKEND", DEFAULT_RESULT_BACKEND)
+        if backend == ResultStorage.NONE:
+            return None
+        if backend != ResultStorage.REDIS:
+            raise RuntimeError(
+                f"result backend must be in {[ResultStorage.NONE, ResultStorage.REDIS]}"
+            )
+        ttl = int(os.environ.get("RAPIDQ_RESULT_TTL", DEFAULT_RESULT_TTL))
+        result_backend_instance = RedisResultBackend(ttl=ttl)
+    return result_backend_instance
+
+
+def reset_result_backend() -> None:
+    """Drops the result backend instance, the next lookup connects again."""
+    global result_backend_instance
+    result_backend_instance = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=reset_result_backend)
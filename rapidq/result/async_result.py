@@ -0,0 +1,92 @@
+import time
+from typing import Any, Iterable
+
+from rapidq.constants import TaskStatus
+from rapidq.message import Message
+from rapidq.result.base import ResultBackend
+
+
+class AsyncResult:
+    """
+    Handle on the result of an enqueued task.
+    """
+
+    def __init__(
+        self, message: Message | str, backend: ResultBackend | None = None
+    ) -> None:
+        self.message_id: str = (
+            message.message_id if isinstance(message, Message) else message
+        )
+        self._backend = backend
+        self._outcome: tuple[str, Any] | None = None
+
+    @property
+    def backend(self) -> ResultBackend:
+        if self._backend is None:
+            # imported here, `rapidq.result` imports this module first.
+            from rapidq.result import get_result_backend
+
+            self._backend = get_result_backend()
+            if self._backend is None:
+                raise RuntimeError(
+                    "No result backend configured, set `RAPIDQ_RESULT_BACKEND`."
+                )
+        return self._backend
+
+    def __repr__(self) -> str:
+        return f"<AsyncResult: {self.message_id}>"
+
+    def ready(self) -> bool:
+        """True once the task finished, successfully or not."""
+        if self._outcome is None:
+            data = self.backend.fetch_result(self.message_id)
+            if data is not None:
+                self._outcome = self.backend.decode(data)
+        return self._outcome is not None
+
+    def get(self, timeout: float | None = None) -> Any:
+        """
+        Wait for the task and return its result.
+        `None` waits forever, `0` does not wait at all.
+        Raises `TimeoutError` if the task is not finished in time and
+        `RuntimeError` if the task failed.
+        """
+        if self._outcome is None:
+            if timeout is not None and timeout <= 0:
+                data = self.backend.fetch_result(self.message_id)
+            else:
+                data = self.backend.wait_result(self.message_id, timeout)
+            if data is None:
+                raise TimeoutError(f"Result of {self.message_id} not ready.")
+            self._outcome = self.backend.decode(data)
+        return self._unwrap()
+
+    def _unwrap(self) -> Any:
+        status, value = self._outcome
+        if status == TaskStatus.FAILURE:
+            raise RuntimeError(f"Task {self.message_id} failed: {value}")
+        return value
+
+
+def gather(handles: Iterable[AsyncResult], timeout: float | None = None) -> list[Any]:
+    """
+    Wait for many tasks and return their results, in the order of `handles`.
+    Results that are already stored are fetched in one round trip,
+    the missing ones are then waited for one after the other.
+    Raises like `AsyncResult.get`, `timeout` is for all the tasks together.
+    """
+    handles = list(handles)
+    pending = [handle for handle in handles if handle._outcome is None]
+    if pending:
+        backend = pending[0].backend
+        fetched = backend.fetch_results([handle.message_id for handle in pending])
+        for handle, data in zip(pending, fetched):
+            if data is not None:
+                handle._outcome = backend.decode(data)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    results = []
+    for handle in handles:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        results.append(handle.get(timeout=remaining))
+    return results
@@ -0,0 +1,51 @@
+import pickle
+from abc import ABC, abstractmethod
+from typing import Any
+
+from rapidq.constants import DEFAULT_RESULT_TTL, TaskStatus
+
+
+class ResultBackend(ABC):
+    """
+    Keeps the outcome of tasks for `ttl` seconds, for producers to pick up.
+    """
+
+    def __init__(self, ttl: int = DEFAULT_RESULT_TTL) -> None:
+        self.ttl = ttl
+
+    @abstractmethod
+    def store_result(self, message_id: str, data: bytes) -> None:
+        """Store the outcome of a task, replacing any earlier one."""
+
+    @abstractmethod
+    def fetch_result(self, message_id: str) -> bytes | None:
+        """Return the outcome of a task if it is there, without waiting."""
+
+    @abstractmethod
+    def fetch_results(self, message_ids: list[str]) -> list[bytes | None]:
+        """Return the outcome of many tasks at once, without waiting."""
+
+    @abstractmethod
+    def wait_result(self, message_id: str, timeout: float | None) -> bytes | None:
+        """
+        Block until the outcome of a task is stored, up to `timeout` seconds.
+        `None` waits forever. Returns None on timeout.
+        """
+
+    @staticmethod
+    def encode(status: str, value: Any) -> bytes:
+        """`value` is the task's return value, or the error message on failure."""
+        return pickle.dumps((status, value), protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def decode(data: bytes) -> tuple[str, Any]:
+        return pickle.loads(data)
+
+    def save(self, message_id: str, status: str, value: Any) -> None:
+        self.store_result(message_id, self.encode(status, value))
+
+    def save_success(self, message_id: str, result: Any) -> None:
+        self.save(message_id, TaskStatus.SUCCESS, result)
+
+    def save_failure(self, message_id: str, error: Exception) -> None:
+        self.save(message_id, TaskStatus.FAILURE, f"{type(error).__name__}: {error}")
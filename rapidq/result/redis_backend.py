@@ -0,0 +1,75 @@
+import os
+from typing import Any, cast
+from urllib.parse import urlparse
+
+from redis import Redis
+
+from rapidq.constants import DEFAULT_RESULT_TTL
+from rapidq.result.base import ResultBackend
+
+
+class RedisResultBackend(ResultBackend):
+    """
+    Every result is a single item Redis list, so that waiting on it is a
+    blocking list command instead of polling.
+    """
+
+    RESULT_PREFIX = "rapidq.result|"
+    DEFAULT_URL = "redis://localhost:6379/0"
+
+    def __init__(
+        self,
+        ttl: int = DEFAULT_RESULT_TTL,
+        connection_params: dict[str, Any] | None = None,
+    ) -> None:
+        super().__init__(ttl=ttl)
+        if not connection_params:
+            connection_params = {}
+        # results live next to the messages, unless configured otherwise.
+        connection_params.setdefault(
+            "url",
+            os.environ.get(
+                "RAPIDQ_RESULT_URL",
+                os.environ.get("RAPIDQ_BROKER_URL", self.DEFAULT_URL),
+            ),
+        )
+        parsed = urlparse(connection_params["url"])
+        if parsed.scheme.endswith("+streams"):
+            # the url of the Redis Streams broker, its options are not for redis-py.
+            connection_params["url"] = parsed._replace(
+                scheme=parsed.scheme.removesuffix("+streams"), query=""
+            ).geturl()
+        self.client = Redis.from_url(**connection_params)
+
+    def generate_result_key(self, message_id: str) -> str:
+        return f"{self.RESULT_PREFIX}{message_id}"
+
+    def store_result(self, message_id: str, data: bytes) -> None:
+        key = self.generate_result_key(message_id)
+        pipe = self.client.pipeline()
+        pipe.delete(key)
+        # the push wakes up whoever blocks on the key.
+        pipe.rpush(key, data)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def fetch_result(self, message_id: str) -> bytes | None:
+        return cast(
+            bytes | None, self.client.lindex(self.generate_result_key(message_id), -1)
+        )
+
+    def fetch_results(self, message_ids: list[str]) -> list[bytes | None]:
+        pipe = self.client.pipeline(transaction=False)
+        for message_id in message_ids:
+            pipe.lindex(self.generate_result_key(message_id), -1)
+        return cast(list[bytes | None], pipe.execute())
+
+    def wait_result(self, message_id: str, timeout: float | None) -> bytes | None:
+        key = self.generate_result_key(message_id)
+        # moving the item from the tail to the tail of the same list blocks
+        # until it is there but leaves it in place, so it can be read again.
+        # `0` blocks forever for Redis.
+        return cast(
+            bytes | None,
+            self.client.blmove(key, key, timeout or 0, src="RIGHT", dest="RIGHT"),
+        )
@@ -0,0 +1,42 @@
+import random
+
+from rapidq.constants import (
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_RETRY_BACKOFF,
+    DEFAULT_RETRY_BACKOFF_MAX,
+)
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed task is retried, and how long it waits first.
+    The wait doubles with every attempt, up to `backoff_max` seconds.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        retry_on: tuple[type[BaseException], ...] = (Exception,),
+        backoff: float = DEFAULT_RETRY_BACKOFF,
+        backoff_max: float = DEFAULT_RETRY_BACKOFF_MAX,
+        jitter: bool = True,
+    ) -> None:
+        self.max_retries: int = max_retries
+        self.retry_on: tuple[type[BaseException], ...] = retry_on
+        # seconds to wait before the first retry.
+        self.backoff: float = backoff
+        self.backoff_max: float = backoff_max
+        # spreads the retries of tasks that failed together.
+        self.jitter: bool = jitter
+
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        """`attempt` is the number of retries already done."""
+        return attempt < self.max_retries and isinstance(error, self.retry_on)
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before the retry number `attempt`, starting at 1."""
+        delay = min(self.backoff_max, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            # "full jitter", anywhere between no wait and the full backoff.
+            delay = random.uniform(0, delay)
+        return delay
@@ -1,15 +1,93 @@
 import argparse
+import logging
 import os
 import sys
-from argparse import Namespace
+from argparse import ArgumentTypeError, Namespace
 
 from rapidq import __version__
 from rapidq.broker import Broker, get_broker
-from rapidq.constants import CPU_COUNT
+from rapidq.constants import (
+    CPU_COUNT,
+    DEFAULT_ASYNC_LIMIT,
+    DEFAULT_CONCURRENCY_MODE,
+    DEFAULT_CONSUME_MODE,
+    DEFAULT_LOG_FORMAT,
+    DEFAULT_LOG_SAMPLE_RATE,
+    DEFAULT_METRICS_HOST,
+    DEFAULT_QUEUE_NAME,
+    DEFAULT_QUEUE_STRATEGY,
+    DEFAULT_SCALE_COOLDOWN,
+    DEFAULT_THREADS,
+    ConcurrencyMode,
+    ConsumeMode,
+    LogFormat,
+    QueueStrategy,
+)
+from rapidq.log import COMPONENTS
 from rapidq.master import main_process
 from rapidq.utils import import_module
 
 
+def parse_prefetch(value: str) -> dict[str, int]:
+    """
+    Parse the `--prefetch` argument.
+    Either a number for every queue, eg: `4`, or comma separated
+    per queue values, eg: `8,reports=1`.
+    """
+    prefetch: dict[str, int] = {}
+    for item in value.split(","):
+        queue_name, _, limit = item.strip().rpartition("=")
+        if not limit.isdigit() or int(limit) < 1:
+            raise ArgumentTypeError(f"invalid prefetch value: {item!r}")
+        prefetch[queue_name or "*"] = int(limit)
+    return prefetch
+
+
+def parse_queues(value: str) -> dict[str, int]:
+    """
+    Parse the `--queues` argument.
+    Comma separated queue names in priority order, each with an optional
+    weight for the weighted strategy, eg: `critical=5,default=2,bulk`.
+    """
+    queues: dict[str, int] = {}
+    for item in value.split(","):
+        queue_name, _, weight = item.strip().partition("=")
+        if not queue_name or (weight and (not weight.isdigit() or int(weight) < 1)):
+            raise ArgumentTypeError(f"invalid queue: {item!r}")
+        queues[queue_name] = int(weight or 1)
+    return queues
+
+
+def parse_log_level(value: str) -> dict[str, str]:
+    """
+    Parse the `--log-level` argument.
+    Either a level for every component, eg: `info`, or comma separated
+    per component levels, eg: `info,task=warning`.
+    """
+    levels: dict[str, str] = {}
+    for item in value.split(","):
+        component, _, level = item.strip().rpartition("=")
+        if component and component not in COMPONENTS:
+            raise ArgumentTypeError(
+                f"unknown component {component!r}, must be in {list(COMPONENTS)}"
+            )
+        if not isinstance(logging.getLevelName(level.upper()), int):
+            raise ArgumentTypeError(f"invalid log level: {item!r}")
+        levels[component or "*"] = level.upper()
+    return levels
+
+
+def parse_sample_rate(value: str) -> float:
+    """Parse the `--log-sample` argument, a share between 0 and 1."""
+    try:
+        rate = float(value)
+    except ValueError:
+        rate = -1.0
+    if not 0.0 <= rate <= 1.0:
+        raise ArgumentTypeError(f"invalid sample rate: {value!r}")
+    return rate
+
+
 def parse_args() -> Namespace:
     """
     Parse command line arguments.
@@ -30,8 +108,171 @@ def parse_args() -> Namespace:
         default=CPU_COUNT,
         help="The number of worker processes to use.",
     )
+    parser.add_argument(
+        "--consume-mode",
+        type=str,
+        choices=[ConsumeMode.RELAY, ConsumeMode.DIRECT],
+        default=DEFAULT_CONSUME_MODE,
+        help=(
+            "relay: the master fetches messages and hands them to the workers. "
+            "direct: every worker fetches messages from the broker by itself."
+        ),
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=parse_prefetch,
+        default={},
+        help=(
+            "How many messages a worker can hold at once, including the running one."
+            " Either a number, eg: 4, or per queue values, eg: 8,reports=1"
+        ),
+    )
+
+    parser.add_argument(
+        "-Q",
+        "--queues",
+        type=parse_queues,
+        default={DEFAULT_QUEUE_NAME: 1},
+        help=(
+            "Queues to consume, in priority order, each with an optional weight."
+            f" eg: critical=5,default=2,bulk (default: {DEFAULT_QUEUE_NAME})"
+        ),
+    )
+    parser.add_argument(
+        "--queue-strategy",
+        type=str,
+        choices=[QueueStrategy.PRIORITY, QueueStrategy.WEIGHTED],
+        default=DEFAULT_QUEUE_STRATEGY,
+        help=(
+            "priority: drain the queues in the given order. "
+            "weighted: share the workers between queues according to their weights."
+        ),
+    )
+
+    parser.add_argument(
+        "--concurrency-mode",
+        type=str,
+        choices=[
+            ConcurrencyMode.PROCESS,
+            ConcurrencyMode.THREADS,
+            ConcurrencyMode.ASYNCIO,
+        ],
+        default=DEFAULT_CONCURRENCY_MODE,
+        help=(
+            "process: a worker runs one task at a time. "
+            "threads: a worker runs tasks in a thread pool, for I/O bound tasks. "
+            "asyncio: a worker runs an event loop, for `async def` tasks."
+        ),
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=DEFAULT_THREADS,
+        help=(
+            "The number of threads per worker, with `--concurrency-mode threads`."
+            " With asyncio, the threads that run the sync tasks."
+        ),
+    )
+    parser.add_argument(
+        "--async-limit",
+        type=int,
+        default=DEFAULT_ASYNC_LIMIT,
+        help="The number of tasks per worker in flight, with `--concurrency-mode asyncio`.",
+    )
+
+    parser.add_argument(
+        "--min-workers",
+        type=int,
+        default=None,
+        help="The smallest the pool shrinks to when autoscaling (default: 1).",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=None,
+        help=(
+            "Turns on autoscaling: workers are added up to this number while"
+            " messages keep waiting, and idle ones are stopped."
+        ),
+    )
+    parser.add_argument(
+        "--scale-cooldown",
+        type=float,
+        default=DEFAULT_SCALE_COOLDOWN,
+        help="Seconds a worker stays idle before the autoscaler stops it.",
+    )
+
+    parser.add_argument(
+        "--max-tasks-per-child",
+        type=int,
+        default=None,
+        help="Replace a worker after it ran this many tasks.",
+    )
+    parser.add_argument(
+        "--max-memory-per-child",
+        type=int,
+        default=None,
+        help="Replace a worker once its resident memory goes above this many MiB.",
+    )
+
+    parser.add_argument(
+        "--preload",
+        action="store_true",
+        help=(
+            "Load the application once in the master and fork the workers from it."
+            " Workers boot faster and share the memory of the loaded modules."
+        ),
+    )
+
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve Prometheus metrics on this port, at /metrics.",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        type=str,
+        default=DEFAULT_METRICS_HOST,
+        help=f"The address the metrics are served on (default: {DEFAULT_METRICS_HOST}).",
+    )
+
+    parser.add_argument(
+        "--log-level",
+        type=parse_log_level,
+        default={},
+        help=(
+            "Either a level, eg: info, or per component levels, eg: info,task=warning."
+            f" The components are: {', '.join(COMPONENTS)}."
+        ),
+    )
+    parser.add_argument(
+        "--log-format",
+        type=str,
+        choices=[LogFormat.TEXT, LogFormat.JSON],
+        default=DEFAULT_LOG_FORMAT,
+        help="json: one JSON object per line, with the message id and task name of task lines.",
+    )
+    parser.add_argument(
+        "--log-sample",
+        type=parse_sample_rate,
+        default=DEFAULT_LOG_SAMPLE_RATE,
+        help=(
+            "Share of the messages whose task lines are written, eg: 0.01 for one in"
+            " a hundred. Warnings and errors are always written."
+        ),
+    )
 
     args = parser.parse_args()
+    if args.min_workers is not None and not args.max_workers:
+        parser.error("--min-workers needs --max-workers")
+    if args.max_workers and not 1 <= (args.min_workers or 1) <= args.max_workers:
+        parser.error("need 1 <= --min-workers <= --max-workers")
+    for limit in ("max_tasks_per_child", "max_memory_per_child"):
+        if getattr(args, limit) is not None and getattr(args, limit) < 1:
+            parser.error(f"--{limit.replace('_', '-')} must be at least 1")
+    if args.preload and not hasattr(os, "fork"):
+        parser.error("--preload needs fork, which is not available on this platform")
     return args
 
 
@@ -42,7 +283,28 @@ def main():
     args = parse_args()
     import_module(args.module)
     print(f"Welcome to RapidQ! ({__version__})")
-    main_process(workers=args.workers, module_name=args.module)
+    main_process(
+        workers=args.workers,
+        module_name=args.module,
+        consume_mode=args.consume_mode,
+        prefetch=args.prefetch,
+        queues=args.queues,
+        queue_strategy=args.queue_strategy,
+        concurrency_mode=args.concurrency_mode,
+        threads=args.threads,
+        async_limit=args.async_limit,
+        min_workers=args.min_workers,
+        max_workers=args.max_workers,
+        scale_cooldown=args.scale_cooldown,
+        max_tasks_per_child=args.max_tasks_per_child,
+        max_memory_per_child=args.max_memory_per_child,
+        preload=args.preload,
+        metrics_port=args.metrics_port,
+        metrics_host=args.metrics_host,
+        log_levels=args.log_level,
+        log_format=args.log_format,
+        log_sample_rate=args.log_sample,
+    )
     return 0
 
 
@@ -1,7 +1,11 @@
 import importlib
 import os
 import sys
+from itertools import islice
 from types import ModuleType
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
 
 
 def import_module(module_name) -> ModuleType:
@@ -10,3 +14,26 @@ def import_module(module_name) -> ModuleType:
         sys.path.append(current_path)
     _module = importlib.import_module(module_name)
     return _module
+
+
+def resident_memory() -> int:
+    """Returns the resident memory of the current process in bytes, 0 if unknown."""
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:  # windows
+        return 0
+    # the peak usage, not the current one. in bytes on macOS, KiB elsewhere.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def batched(iterable: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Yield lists of `size` items from `iterable`, the last one may be shorter."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,144 @@
+import asyncio
+import functools
+import inspect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rapidq.broker import get_broker
+from rapidq.constants import DEFAULT_IDLE_TIME, ConsumeMode, WorkerState
+from rapidq.message import Message
+from rapidq.registry import TaskRegistry
+from rapidq.result import get_result_backend
+from rapidq.worker.process_worker import Worker
+
+
+class AsyncWorker(Worker):
+    """
+    Worker process that runs an asyncio event loop.
+    `async def` tasks run as coroutines on the loop, up to `slots` at once.
+    Sync tasks run in a thread pool of `threads` threads, so they never block the loop.
+    """
+
+    def run(self):
+        """Implements a worker's execution logic."""
+        self.logger("started")
+
+        self.update_state(WorkerState.IDLE)
+        try:
+            asyncio.run(self.run_loop())
+        except KeyboardInterrupt:
+            self.stop()
+            self.update_state(WorkerState.SHUTDOWN)
+
+    async def run_loop(self):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix=self.name)
+        )
+        # `next_task` blocks, so it waits in its own thread to keep the loop running.
+        fetcher = ThreadPoolExecutor(max_workers=1)
+        free_slots = asyncio.Semaphore(self.slots)
+        running: set[asyncio.Task] = set()
+
+        def finished(job: asyncio.Task):
+            running.discard(job)
+            free_slots.release()
+
+        while self.keep_running():
+            try:
+                await asyncio.wait_for(free_slots.acquire(), timeout=DEFAULT_IDLE_TIME)
+            except asyncio.TimeoutError:
+                continue
+            task = await loop.run_in_executor(fetcher, self.next_task)
+            if task is None:
+                free_slots.release()
+                continue
+            job = asyncio.create_task(self.execute_async(task))
+            running.add(job)
+            job.add_done_callback(finished)
+
+        # let the running tasks finish before exiting.
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        fetcher.shutdown()
+
+    async def execute_async(self, task: bytes):
+        """Runs the task in a slot, then gives back its credit to the master."""
+        self.occupy_slot()
+        try:
+            await self.process_task_async(task)
+        finally:
+            self.count_task()
+            if self.consume_mode == ConsumeMode.RELAY:
+                self.release_credit()
+            self.free_slot()
+
+    async def process_task_async(self, raw_message: bytes):
+        """Process the given message, awaiting `async def` tasks on the loop."""
+        message = Message.deserialize(raw_message)
+        try:
+            return await self.process_message_async(message)
+        finally:
+            if get_broker().NEEDS_ACK:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self.ack_message, message
+                )
+
+    async def process_message_async(self, message: Message):
+        """Runs the task of an already de-serialized message."""
+        task_callable = TaskRegistry.fetch(message.task_name)
+        if not inspect.iscoroutinefunction(task_callable):
+            # sync and unregistered tasks go to the thread pool, hooks included.
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.process_message, message)
+
+        if message.dedup_key is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.release_dedup_key, message
+            )
+
+        try:
+            blob = self.load_arguments(message)
+        except Exception as error:
+            self.log_task(message, f"Error: {error}", logging.ERROR)
+            return 1
+
+        try:
+            self.run_pre_hooks(message=message)
+
+            _task_result = None
+            _task_error = None
+            retried = False
+            started = time.perf_counter()
+            try:
+                self.log_task(message, "Received.")
+                _task_result = await task_callable(*message.args, **message.kwargs)
+            except Exception as error:
+                self.record_task(message, started, failed=True)
+                _task_error = error
+                self.log_task(message, f"Error: {error}", logging.ERROR, error=error)
+                retried = await asyncio.get_running_loop().run_in_executor(
+                    None, self.retry_task, message, error
+                )
+            else:
+                self.record_task(message, started)
+                self.log_task(message, "Finished.")
+
+            if not retried and get_result_backend() is not None:
+                # a blocking round trip, off the loop.
+                await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    functools.partial(
+                        self.save_result,
+                        message,
+                        result=_task_result,
+                        error=_task_error,
+                    ),
+                )
+
+            self.run_post_hooks(message=message, result=_task_result)
+        finally:
+            self.release_arguments(message, blob, retried=retried)
+
+        return 0
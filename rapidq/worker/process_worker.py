@@ -1,20 +1,41 @@
+import asyncio
+import inspect
+import logging
 import os
+import sys
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Process, Queue, Value
 from multiprocessing.sharedctypes import Synchronized
 from multiprocessing.synchronize import Event as SyncEvent
 from queue import Empty
+from threading import BoundedSemaphore
 from typing import Any, Callable
 
-from rapidq.constants import DEFAULT_IDLE_TIME, WorkerState
+from rapidq.blob import Blob, get_blob_store
+from rapidq.broker import Broker, get_broker
+from rapidq.constants import (
+    DEFAULT_ASYNC_LIMIT,
+    DEFAULT_IDLE_TIME,
+    DEFAULT_THREADS,
+    DEFAULT_WORKER_QUEUE_SIZE,
+    ConcurrencyMode,
+    ConsumeMode,
+    WorkerState,
+)
+from rapidq.log import LogConfig, configure_logging, task_log, worker_log
 from rapidq.message import Message
+from rapidq.metrics import WorkerMetrics
+from rapidq.queues import QueueScheduler
 from rapidq.registry import (
     FRAMEWORK_LOADERS,
     POST_EXECUTION_HOOKS,
     PRE_EXECUTION_HOOKS,
     TaskRegistry,
 )
-from rapidq.utils import import_module
+from rapidq.result import get_result_backend
+from rapidq.utils import import_module, resident_memory
 
 
 def initialize_framework_loaders(worker):
@@ -34,64 +55,236 @@ class Worker:
         shutdown_event: SyncEvent,
         process_counter: Synchronized,
         state: Synchronized,
+        idle_event: SyncEvent,
+        inflight: Synchronized,
         module_name: str,
+        consume_mode: str = ConsumeMode.RELAY,
+        scheduler: QueueScheduler | None = None,
+        concurrency_mode: str = ConcurrencyMode.PROCESS,
+        threads: int = DEFAULT_THREADS,
+        async_limit: int = DEFAULT_ASYNC_LIMIT,
+        max_tasks: int | None = None,
+        max_memory: int | None = None,
+        metrics: WorkerMetrics | None = None,
+        log_queue: "Queue | None" = None,
+        log_config: LogConfig | None = None,
     ):
         self.process: Process | None = None
         self.pid: int | None = None
+        # only used in direct mode, connects after the process is started.
+        self.broker: Broker | None = None
+        # messages fetched ahead in direct mode.
+        self.prefetched: deque[bytes] = deque()
 
         self.name: str = name
         self.task_queue: Queue[bytes] = queue
         self.shutdown_event: SyncEvent = shutdown_event
         self.counter: Synchronized = process_counter
         self.state: Synchronized = state
+        self.idle_event: SyncEvent = idle_event
+        # Credit counter, the number of messages assigned by the master that are
+        # not finished yet. The master never lets this go above the prefetch limit.
+        self.inflight: Synchronized = inflight
         # TODO: module_name has to be specified some other way,
         # or has to be removed completely
         self.module_name: str = module_name
+        self.consume_mode: str = consume_mode
+        # decides the queues to consume in direct mode.
+        self.scheduler: QueueScheduler = scheduler or QueueScheduler()
+        self.concurrency_mode: str = concurrency_mode
+        self.threads: int = threads
+        # number of tasks the worker can run at the same time.
+        self.slots: int = 1
+        if concurrency_mode == ConcurrencyMode.THREADS:
+            self.slots = threads
+        elif concurrency_mode == ConcurrencyMode.ASYNCIO:
+            self.slots = async_limit
+        # number of slots running a task, guarded by the state lock.
+        self.busy_slots: int = 0
+        # the worker is replaced after this many tasks, or this many bytes of memory.
+        self.max_tasks: int | None = max_tasks
+        self.max_memory: int | None = max_memory
+        # guarded by the state lock.
+        self.tasks_done: int = 0
+        self.recycling: bool = False
+        # counters read by the master, None when metrics are off.
+        self.metrics: WorkerMetrics | None = metrics
+        # records go to the master through this queue, see `configure_logging`.
+        self.log_queue: Queue | None = log_queue
+        self.log_config: LogConfig = log_config or LogConfig()
+        # set in the worker process once it counts in `process_counter`.
+        self.registered: bool = False
 
     def __call__(self):
         """Start the worker"""
         try:
             self.start()
         except Exception as error:
-            self.stop()
-            self.logger("Startup failed!")
-            self.logger(str(error))
+            if not self.registered:
+                self.stop()
+                self.logger(f"Startup failed! {error}", logging.ERROR)
+                return
+            # the master replaces the worker and reassigns what is left in its queue.
+            self.update_state(WorkerState.SHUTDOWN)
+            worker_log.exception("Unexpected error, exiting.")
+            self.requeue_prefetched()
+            sys.exit(1)
 
     def update_state(self, state: int):
         """Updates a worker state"""
         with self.state.get_lock():
             self.state.value = state
+        if state == WorkerState.IDLE:
+            # wake up the master if it is waiting for a free worker.
+            self.idle_event.set()
+
+    def occupy_slot(self):
+        """Marks a slot as busy, the worker is BUSY while any slot is."""
+        with self.state.get_lock():
+            self.busy_slots += 1
+            if not self.recycling:
+                self.state.value = WorkerState.BUSY
+
+    def free_slot(self):
+        """Marks a slot as free, the worker is IDLE once every slot is."""
+        with self.state.get_lock():
+            self.busy_slots -= 1
+            if self.busy_slots or self.recycling:
+                return
+        self.update_state(WorkerState.IDLE)
+
+    def count_task(self):
+        """Counts a finished task, the worker starts recycling once it hit a limit."""
+        with self.state.get_lock():
+            self.tasks_done += 1
+            tasks_done = self.tasks_done
+        if self.recycling:
+            return
+        if self.max_tasks and tasks_done >= self.max_tasks:
+            self.recycle(f"ran {tasks_done} tasks")
+        elif self.max_memory and (memory := resident_memory()) > self.max_memory:
+            self.recycle(f"uses {memory // 2**20}MiB of memory")
+
+    def recycle(self, reason: str):
+        """
+        Stops taking messages, the worker exits once the ones it holds are done.
+        The master starts a replacement as soon as it sees the RECYCLING state.
+        """
+        with self.state.get_lock():
+            if self.recycling:
+                return
+            self.recycling = True
+            self.state.value = WorkerState.RECYCLING
+        self.logger(f"{reason}, recycling.")
+        self.idle_event.set()
+
+    def capacity(self, queue_name: str) -> int:
+        """
+        Returns how many messages of the queue the worker may hold at once.
+        Never more than its queue holds, the master would block on a full one.
+        """
+        return min(
+            self.scheduler.prefetch_for(queue_name) * self.slots,
+            DEFAULT_WORKER_QUEUE_SIZE,
+        )
+
+    def release_credit(self):
+        """Tells the master this worker can take one more message."""
+        with self.inflight.get_lock():
+            self.inflight.value -= 1
+        self.idle_event.set()
+
+    def keep_running(self) -> bool:
+        """
+        True until shutdown, the messages held are given back then, see `start`.
+        On recycling, true until the messages held are done.
+        """
+        if self.shutdown_event.is_set():
+            return False
+        if self.recycling:
+            # in relay mode, the master might have assigned more before it saw the state.
+            return bool(self.prefetched) or self.inflight.value > self.busy_slots
+        return True
 
-    def logger(self, message: str):
+    def logger(self, message: str, level: int = logging.INFO):
         """For logging messages."""
-        # TODO: implement logging
-        print(f"{self.name} [PID: {self.pid}]: {message}")
+        worker_log.log(level, message)
+
+    def log_task(
+        self,
+        message: Message,
+        event: str,
+        level: int = logging.INFO,
+        error: Exception | None = None,
+    ):
+        """
+        Logs a line about a message. Lines below WARNING are sampled, and
+        are only formatted once they are sure to be written.
+        """
+        if not task_log.isEnabledFor(level):
+            return
+        if level < logging.WARNING and not self.log_config.sampled(message.message_id):
+            return
+        task_log.log(
+            level,
+            "[%s] [%s]: %s",
+            message.message_id,
+            message.task_name,
+            event,
+            exc_info=error,
+            extra={"message_id": message.message_id, "task_name": message.task_name},
+        )
 
     def start(self):
         """Start the worker."""
+        if self.log_queue is not None:
+            configure_logging(self.log_config, self.log_queue)
         self.update_state(WorkerState.BOOTING)
         if self.module_name:
             import_module(self.module_name)
 
         self.pid = os.getpid()
-        self.logger(f"starting with PID: {self.pid}")
+        self.logger("starting")
 
         # initialize any web framework loaders if any.
         initialize_framework_loaders(self)
+        if self.consume_mode == ConsumeMode.DIRECT:
+            self.broker = get_broker()
         # increment the worker counter
         with self.counter.get_lock():
             self.counter.value += 1
-        return self.run()
+        self.registered = True
+        result = self.run()
+        # stopped, the messages fetched ahead did not start.
+        self.requeue_prefetched()
+        return result
 
-    def flush_tasks(self):
+    def requeue_prefetched(self):
+        """Gives the messages fetched ahead in direct mode back to the broker."""
+        if not self.broker or not self.prefetched:
+            return
+        try:
+            self.broker.requeue_messages(list(self.prefetched))
+        except Exception as error:
+            self.logger(
+                f"unable to requeue {len(self.prefetched)} message(s): {error}",
+                logging.ERROR,
+            )
+        else:
+            self.prefetched.clear()
+
+    def drain_tasks(self) -> list[bytes]:
         """
-        Removes all the assigned tasks from the worker's task queue.
+        Takes the assigned tasks the worker did not start out of its task queue.
+        The credit it still holds counts the ones on their way through the pipe.
         """
-        while not self.task_queue.empty():
+        tasks = []
+        while len(tasks) < self.inflight.value:
             try:
-                self.task_queue.get(block=False)
+                tasks.append(self.task_queue.get(timeout=0.1))
             except Empty:
-                pass
+                break
+        return tasks
 
     def join(self, timeout: int | None = None):
         """Wait for the worker process to exit."""
@@ -101,11 +294,10 @@ class Worker:
     def stop(self):
         """
         Prepare to stop the worker process.
-        Flush task queue and sets `shutdown_event`.
+        Sets `shutdown_event`, the master takes back the tasks left in
+        the task queue, see `drain_tasks`.
         """
-        if not self.shutdown_event.is_set():
-            self.shutdown_event.set()
-            self.flush_tasks()
+        self.shutdown_event.set()
 
     def run_pre_hooks(self, message: Message) -> None:
         """
@@ -115,7 +307,7 @@ class Worker:
             try:
                 hook_func(message=message, task_name=message.task_name, worker=self)
             except Exception as e:
-                self.logger(f"pre-hook error: {e}")
+                self.logger(f"pre-hook error: {e}", logging.ERROR)
 
     def run_post_hooks(self, message: Message, result: Any) -> None:
         """
@@ -130,52 +322,252 @@ class Worker:
                     worker=self,
                 )
             except Exception as e:
-                self.logger(f"post-hook error: {e}")
+                self.logger(f"post-hook error: {e}", logging.ERROR)
+
+    def load_arguments(self, message: Message) -> Blob | None:
+        """Loads the arguments a message left in the blob store, if any."""
+        if message.blob_ref is None:
+            return None
+        blob_store = get_blob_store()
+        if blob_store is None:
+            raise RuntimeError(
+                f"Arguments are in blob `{message.blob_ref}` but no blob store is configured."
+            )
+        return blob_store.load(message)
+
+    def release_arguments(
+        self, message: Message, blob: Blob | None, retried: bool = False
+    ) -> None:
+        """Deletes the blob of a finished message, a retried one still needs it."""
+        if blob is not None:
+            get_blob_store().release(message, blob, delete=not retried)
+
+    def retry_task(self, message: Message, error: Exception) -> bool:
+        """
+        Schedules the message again if the retry policy of its task allows it.
+        Returns True if it was rescheduled.
+        """
+        policy = TaskRegistry.fetch_retry_policy(message.task_name)
+        if policy is None or not policy.should_retry(error, message.attempt):
+            return False
+
+        attempt = message.attempt + 1
+        delay = policy.delay(attempt)
+        run_at = time.time() + delay
+        retry = Message(
+            task_name=message.task_name,
+            queue_name=message.queue_name,
+            # offloaded arguments stay in the blob store.
+            args=() if message.blob_ref else message.args,
+            kwargs={} if message.blob_ref else message.kwargs,
+            message_id=message.message_id,
+            priority=message.priority,
+            blob_ref=message.blob_ref,
+            attempt=attempt,
+            enqueued_at=run_at,
+        )
+        try:
+            get_broker().schedule_message(retry, run_at=run_at)
+        except Exception as e:
+            self.log_task(message, f"unable to retry: {e}", logging.ERROR)
+            return False
+        self.log_task(
+            message,
+            f"Retry {attempt}/{policy.max_retries} in {delay:.2f}s.",
+            logging.WARNING,
+        )
+        return True
+
+    def release_dedup_key(self, message: Message) -> None:
+        """Lets duplicates of the message be enqueued again, now that it started."""
+        if message.dedup_key is None:
+            return
+        try:
+            get_broker().release_dedup_key(message)
+        except Exception as e:
+            self.log_task(message, f"unable to release dedup key: {e}", logging.ERROR)
+
+    def ack_message(self, message: Message) -> None:
+        """Tells the broker the message is done with, so it is not handed out again."""
+        broker = get_broker()
+        if not broker.NEEDS_ACK:
+            return
+        try:
+            broker.ack_message(message)
+        except Exception as e:
+            self.log_task(message, f"unable to ack: {e}", logging.ERROR)
+
+    def save_result(
+        self, message: Message, result: Any = None, error: Exception | None = None
+    ) -> None:
+        """Stores the outcome of the task, if a result backend is configured."""
+        backend = get_result_backend()
+        if backend is None:
+            return
+        try:
+            if error is None:
+                backend.save_success(message.message_id, result)
+            else:
+                backend.save_failure(message.message_id, error)
+        except Exception as e:
+            self.log_task(message, f"unable to save result: {e}", logging.ERROR)
+
+    def record_task(
+        self, message: Message, started: float, failed: bool = False
+    ) -> None:
+        """Adds a task that ran since `started` (perf counter) to the metrics."""
+        if self.metrics is None:
+            return
+        duration = time.perf_counter() - started
+        wait = None
+        if message.enqueued_at is not None:
+            wait = max(0.0, time.time() - duration - message.enqueued_at)
+        self.metrics.record(message.task_name, duration, failed, wait)
 
     def process_task(self, raw_message: bytes):
         """Process the given message. This is where the registered callables are executed."""
         message = Message.deserialize(raw_message)
-        self.update_state(WorkerState.BUSY)
+        try:
+            return self.process_message(message)
+        finally:
+            self.ack_message(message)
+
+    def process_message(self, message: Message):
+        """Runs the task of an already de-serialized message."""
+        self.release_dedup_key(message)
         task_callable = TaskRegistry.fetch(message.task_name)
         if not task_callable:
-            self.logger(f"Got unregistered task `{message.task_name}`")
+            self.logger(f"Got unregistered task `{message.task_name}`", logging.ERROR)
             return 1
 
-        self.run_pre_hooks(message=message)
-
-        _task_result = None
         try:
-            self.logger(f"[{message.message_id}] [{message.task_name}]: Received.")
-            _task_result = task_callable(*message.args, **message.kwargs)
+            blob = self.load_arguments(message)
         except Exception as error:
-            # TODO: change logger
-            self.logger(str(error))
-            self.logger(f"[{message.message_id}] [{message.task_name}]: Error.")
-        else:
-            self.logger(f"[{message.message_id}] [{message.task_name}]: Finished.")
+            self.log_task(message, f"Error: {error}", logging.ERROR)
+            return 1
+
+        try:
+            self.run_pre_hooks(message=message)
+
+            _task_result = None
+            _task_error = None
+            retried = False
+            started = time.perf_counter()
+            try:
+                self.log_task(message, "Received.")
+                _task_result = task_callable(*message.args, **message.kwargs)
+                if inspect.isawaitable(_task_result):
+                    # `async def` task outside of the asyncio worker, run it to completion.
+                    _task_result = asyncio.run(_task_result)
+            except Exception as error:
+                self.record_task(message, started, failed=True)
+                _task_error = error
+                self.log_task(message, f"Error: {error}", logging.ERROR, error=error)
+                retried = self.retry_task(message, error)
+            else:
+                self.record_task(message, started)
+                self.log_task(message, "Finished.")
 
-        self.run_post_hooks(message=message, result=_task_result)
+            if not retried:
+                # the result of a retried task is the one of its last attempt.
+                self.save_result(message, result=_task_result, error=_task_error)
+
+            self.run_post_hooks(message=message, result=_task_result)
+        finally:
+            self.release_arguments(message, blob, retried=retried)
 
         return 0
 
+    def next_task(self) -> bytes | None:
+        """
+        Wait for the next task and return it.
+        Returns None if nothing arrived in `DEFAULT_IDLE_TIME`.
+        """
+        if self.broker:
+            if not self.prefetched:
+                for queue_name in self.scheduler.order():
+                    self.prefetched.extend(
+                        self.broker.pop_messages(
+                            count=self.capacity(queue_name),
+                            queue_name=queue_name,
+                        )
+                    )
+                    if self.prefetched:
+                        break
+            if self.prefetched:
+                return self.prefetched.popleft()
+            popped = self.broker.wait_message(
+                queue_names=self.scheduler.queue_names, timeout=DEFAULT_IDLE_TIME
+            )
+            return popped[1] if popped else None
+        try:
+            return self.task_queue.get(timeout=DEFAULT_IDLE_TIME)
+        except Empty:
+            return None
+
     def run(self):
         """Implements a worker's execution logic."""
-        self.logger(f"worker {self.name} started with pid: {self.pid}")
+        self.logger("started")
+
+        self.update_state(WorkerState.IDLE)
+        if self.concurrency_mode == ConcurrencyMode.THREADS:
+            return self.run_threaded()
 
         # Run the loop until this event is set by master or the worker itself.
-        while not self.shutdown_event.is_set():
+        while self.keep_running():
             try:
                 # task will be a message in bytes.
-                task = self.task_queue.get(block=False)
-            except Empty:
-                task = None
-            if task:
-                self.process_task(task)
-
-            try:
-                if not task:
-                    time.sleep(DEFAULT_IDLE_TIME)
+                # Blocks until a task arrives, the timeout only bounds how long
+                # it takes to notice the shutdown event.
+                task = self.next_task()
             except KeyboardInterrupt:
                 self.stop()
                 self.update_state(WorkerState.SHUTDOWN)
-            self.update_state(WorkerState.IDLE)
+                continue
+            if task is None:
+                continue
+            self.execute(task)
+
+    def execute(self, task: bytes):
+        """Runs the task in a slot, then gives back its credit to the master."""
+        self.occupy_slot()
+        try:
+            self.process_task(task)
+        finally:
+            # before giving back the credit, so the master sees a recycling worker in time.
+            self.count_task()
+            if self.consume_mode == ConsumeMode.RELAY:
+                self.release_credit()
+            self.free_slot()
+
+    def run_threaded(self):
+        """
+        Execution logic for the threads concurrency mode.
+        Up to `slots` tasks run at once, each in a thread of the pool.
+        A task is only taken when a slot is free.
+        """
+        free_slots = BoundedSemaphore(self.slots)
+
+        def execute_in_slot(task: bytes):
+            try:
+                self.execute(task)
+            finally:
+                free_slots.release()
+
+        # leaving the block waits for the running tasks to finish.
+        with ThreadPoolExecutor(
+            max_workers=self.slots, thread_name_prefix=self.name
+        ) as executor:
+            while self.keep_running():
+                try:
+                    if not free_slots.acquire(timeout=DEFAULT_IDLE_TIME):
+                        continue
+                    task = self.next_task()
+                except KeyboardInterrupt:
+                    self.stop()
+                    self.update_state(WorkerState.SHUTDOWN)
+                    continue
+                if task is None:
+                    free_slots.release()
+                    continue
+                executor.submit(execute_in_slot, task)